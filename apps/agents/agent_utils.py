@@ -1,6 +1,11 @@
 from pydantic import BaseModel
 from typing import List
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
+import queue
+import threading
+import time
+from apps.agents.tracing import span
 
 class QuestionProfile(BaseModel):
     topics: List[str]
@@ -24,16 +29,129 @@ class AgentException(Exception):
         super().__init__(message)
 
 
-def run_agent(agent : Agent, topics: List[str], question: str, details: str):
-    q_prof = QuestionProfile(
-        topics=topics,
-        question=question,
-        details=details
-    )
+class DeadlineExceeded(AgentException):
+    """Raised when a query runs past its deadline. `partial` holds any answer text streamed before it."""
+    def __init__(self, message: str, partial: str = ""):
+        super().__init__(message)
+        self.partial = partial
+
+
+def render_prompt(template, llm, inputs: dict, budget=None):
+    """Render the prompt, through the agent's PromptBudget if it has one. Returns (prompt, llm, predicted tokens, trimmed tokens)."""
+    with span("render prompt"):
+        if budget is None:
+            return template.invoke(inputs), llm, None, 0
+        return budget.prepare(template, llm, inputs)
+
+
+def _pump_stream(open_stream, events: "queue.Queue", stop: threading.Event) -> None:
+    """Read a model stream into `events` until it ends, fails or `stop` is set, then close it"""
+    stream = None
+    try:
+        stream = open_stream()
+        for chunk in stream:
+            if stop.is_set():
+                return
+            events.put(("chunk", chunk))
+        events.put(("done", None))
+    except Exception as e:
+        events.put(("error", e))
+    finally:
+        # Closing the generator closes the HTTP stream, so the provider stops generating
+        close = getattr(stream, "close", None)
+        if close:
+            close()
+
+
+def resolve_with_deadline(template, llm, inputs: dict, deadline: float, budget=None, breaker=None) -> str:
+    """
+    Stream an answer from `template | llm`, stopping at `deadline` (a time.monotonic() value).
+
+    The stream is read in a helper thread, so the deadline holds for the whole answer even when the
+    stream stalls between chunks; the client's per-read timeout, set to the remaining time, then ends
+    the abandoned request. Raises DeadlineExceeded with whatever text had arrived.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("The deadline passed before the model was called")
+
+    chunks = []
+    predicted = None
+    last = []
+    stop = threading.Event()
+    try:
+        prompt, llm, predicted, trimmed = render_prompt(template, llm, inputs, budget)
+        # Running into the caller's deadline is not an upstream failure; only its duration counts
+        guard = breaker.call(ignore=(DeadlineExceeded,)) if breaker is not None else nullcontext()
+        with span("llm stream", timeout=round(remaining, 3)), guard:
+            events = queue.Queue()
+            bound = llm.bind(timeout=remaining)
+            threading.Thread(
+                target=_pump_stream, args=(lambda: bound.stream(prompt), events, stop), name="llm-stream", daemon=True,
+            ).start()
+            while True:
+                try:
+                    kind, value = events.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    raise DeadlineExceeded("The deadline passed while the answer was streaming", "".join(chunks))
+                if kind == "done":
+                    break
+                if kind == "error":
+                    # The client timeout set from the deadline fired; converted here so the breaker ignores it
+                    if time.monotonic() >= deadline:
+                        raise DeadlineExceeded(f"The deadline passed while waiting for the model: {str(value)}", "".join(chunks)) from value
+                    raise value
+                chunks.append(value.content)
+                last[:] = [value]
+                if time.monotonic() >= deadline:
+                    raise DeadlineExceeded("The deadline passed while the answer was streaming", "".join(chunks))
+    except AgentException:
+        # DeadlineExceeded, or a prompt refused by the budget
+        raise
+    except Exception as e:
+        if time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"The deadline passed while waiting for the model: {str(e)}", "".join(chunks)) from e
+        raise AgentException(f"Error generating answer: {str(e)}") from e
+    finally:
+        # The helper thread closes the stream at its next chunk, or when the read timeout ends it
+        stop.set()
+        if predicted is not None:
+            # Usage, when the provider reports it, arrives with the last chunk
+            budget.record(predicted, trimmed, last)
+    return "".join(chunks)
+
+
+def invoke_chain(template, llm, inputs: dict, budget=None, breaker=None) -> str:
+    """
+    Render the prompt and call the model, as `(template | llm).invoke(inputs).content`, in separate trace spans.
+
+    With a CircuitBreaker, the model call is skipped with CircuitOpen while the breaker is open.
+    """
+    prompt, llm, predicted, trimmed = render_prompt(template, llm, inputs, budget)
+    with span("llm call"), (breaker.call() if breaker is not None else nullcontext()):
+        response = llm.invoke(prompt)
+    if budget is not None:
+        budget.record(predicted, trimmed, [response])
+    return response.content
+
+
+def run_agent(agent : Agent, topics: List[str], question: str, details: str, deadline: float = None):
+    """Resolve a question with an agent. `deadline` is an optional time.monotonic() value to answer by."""
+    with span("validate QuestionProfile"):
+        q_prof = QuestionProfile(
+            topics=topics,
+            question=question,
+            details=details
+        )
 
-    response = agent.resolve_query(q_prof)
+    with span("resolve_query", agent=type(agent).__name__):
+        if deadline is not None:
+            return agent.resolve_query(q_prof, deadline=deadline)
+        response = agent.resolve_query(q_prof)
     return response
 
 langchain_base_model = "llama3-70b-8192"
+# Faster model for easy questions when the model cascade is enabled
+langchain_small_model = "llama3-8b-8192"
 finetune_base_model_name = "Qwen/QwQ-32B"
 finetune_prefix = "llama3_finetuned"
\ No newline at end of file
@@ -0,0 +1,204 @@
+from apps.agents.agent_utils import Agent, AgentException, run_agent
+from apps.agents.rate_limit import RateLimiter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, Set
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+SHARD_PATTERN = "answers-{:05d}.jsonl"
+ERRORS_FILE = "errors.jsonl"
+
+# Question.subject enum value -> topic list passed to the agent
+SUBJECT_TOPICS = {
+    "MATH": ["Mathematics"],
+    "PHYSICS": ["Physics"],
+    "COMPUTER_SCIENCE": ["Computer Science"],
+}
+
+def default_agent_factories() -> Dict[str, Callable[[], Agent]]:
+    """Question.subject -> agent class; imported here so the module loads without the LLM stack"""
+    from apps.agents.math_agent_langchain import MathAgent
+    from apps.agents.physics_agent_langchain import PhysicsAgent
+    from apps.agents.compsci_agent_langchain import CompSciAgent
+    return {"MATH": MathAgent, "PHYSICS": PhysicsAgent, "COMPUTER_SCIENCE": CompSciAgent}
+
+def read_questions(path: str) -> Iterator[dict]:
+    """Stream Question records (id, subject, content, ...) from a JSONL dump, skipping blank lines"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number} of {path}: {e}", file=sys.stderr)
+
+def completed_ids(output_dir: str) -> Set[str]:
+    """
+    Ids already answered in the output shards, which double as the checkpoint.
+
+    A run killed mid-write can leave a partial last line; it is cut off here so the shard stays
+    valid JSONL and the question is answered again.
+    """
+    done = set()
+    for shard in sorted(glob.glob(os.path.join(output_dir, SHARD_PATTERN.replace("{:05d}", "*")))):
+        with open(shard, "r+b") as f:
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                f.truncate(complete)
+            for line in data[:complete].splitlines():
+                if line.strip():
+                    done.add(json.loads(line)["id"])
+    return done
+
+class ShardedWriter:
+    """Thread-safe JSONL writer that starts a new shard every `shard_size` records"""
+    def __init__(self, output_dir: str, shard_size: int):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        existing = glob.glob(os.path.join(output_dir, SHARD_PATTERN.replace("{:05d}", "*")))
+        # Resumed runs never append to an old shard
+        self._shard = max((int(os.path.basename(p)[len("answers-"):-len(".jsonl")]) for p in existing), default=-1) + 1
+        self._count = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._errors = open(os.path.join(output_dir, ERRORS_FILE), "a", encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        with self._lock:
+            if self._file is None or self._count >= self.shard_size:
+                if self._file:
+                    self._file.close()
+                self._file = open(os.path.join(self.output_dir, SHARD_PATTERN.format(self._shard)), "a", encoding="utf-8")
+                self._shard += 1
+                self._count = 0
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # Flushed per record: the shards are the checkpoint
+            self._file.flush()
+            self._count += 1
+
+    def write_error(self, record: dict) -> None:
+        with self._lock:
+            self._errors.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._errors.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file:
+                self._file.close()
+            self._errors.close()
+
+class BatchAnswerer:
+    """
+    Answers a question dump with the subject's agent under a concurrency and rate budget.
+
+    Agents are created once per subject and shared by the worker threads. Failed questions are
+    retried with exponential backoff, then logged to errors.jsonl and attempted again next run.
+    """
+    def __init__(self, writer: ShardedWriter, agent_factories: Dict[str, Callable[[], Agent]],
+                 concurrency: int = 4, rate_per_minute: float = 30.0, retries: int = 3):
+        self.writer = writer
+        self.agent_factories = agent_factories
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate_per_minute, per=60.0)
+        self.retries = retries
+        self._agents: Dict[str, Agent] = {}
+        self._agents_lock = threading.Lock()
+        self.stats = {"answered": 0, "failed": 0, "skipped": 0}
+        self._stats_lock = threading.Lock()
+
+    def _agent(self, subject: str) -> Agent:
+        with self._agents_lock:
+            if subject not in self._agents:
+                self._agents[subject] = self.agent_factories[subject]()
+            return self._agents[subject]
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def answer(self, question: dict) -> None:
+        subject = question.get("subject")
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                answer = run_agent(self._agent(subject), SUBJECT_TOPICS[subject], question["content"], "")
+                break
+            except AgentException as e:
+                if attempt == self.retries:
+                    self.writer.write_error({"id": question["id"], "subject": subject, "error": str(e), "attempts": attempt + 1})
+                    self._count("failed")
+                    return
+                time.sleep(2 ** attempt)
+
+        self.writer.write({
+            "id": question["id"],
+            "subject": subject,
+            "question": question["content"],
+            "answer": answer,
+            "elapsed_s": round(time.monotonic() - started, 3),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        self._count("answered")
+
+    def run(self, questions: Iterator[dict], done: Set[str], progress_every: int = 50) -> dict:
+        """Answer every question not in `done`, keeping at most 2 x concurrency in flight"""
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+
+        def task(question):
+            try:
+                self.answer(question)
+            except Exception as e:
+                self.writer.write_error({"id": question.get("id"), "subject": question.get("subject"), "error": str(e), "attempts": 1})
+                self._count("failed")
+            finally:
+                slots.release()
+                finished = self.stats["answered"] + self.stats["failed"]
+                if progress_every and finished % progress_every == 0:
+                    print(f"{self.stats['answered']} answered, {self.stats['failed']} failed, {self.stats['skipped']} skipped", file=sys.stderr)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for question in questions:
+                if question.get("id") in done or question.get("subject") not in self.agent_factories or not question.get("content"):
+                    self._count("skipped")
+                    continue
+                # Duplicates later in the dump are skipped too
+                done.add(question["id"])
+                slots.acquire()
+                pool.submit(task, question)
+        return self.stats
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate agent answers for a JSONL dump of Question records (id, subject, content).")
+    parser.add_argument("input", help="JSONL file with one Question per line")
+    parser.add_argument("output_dir", help="Directory for answer shards; rerunning with the same directory resumes")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered at the same time")
+    parser.add_argument("--rate", type=float, default=30.0, help="Upstream LLM requests per minute, retries included")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Answers per output file")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per question after a failed call")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    done = completed_ids(args.output_dir)
+    if done:
+        print(f"Resuming: {len(done)} questions already answered", file=sys.stderr)
+
+    writer = ShardedWriter(args.output_dir, args.shard_size)
+    try:
+        answerer = BatchAnswerer(writer, default_agent_factories(), args.concurrency, args.rate, args.retries)
+        stats = answerer.run(read_questions(args.input), done)
+    finally:
+        writer.close()
+    print(json.dumps(stats), file=sys.stderr)
+    return 0 if not stats["failed"] else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
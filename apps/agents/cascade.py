@@ -0,0 +1,150 @@
+from apps.agents.agent_utils import Agent, AgentException, DeadlineExceeded, QuestionProfile, langchain_base_model, langchain_small_model
+from apps.agents.circuit_breaker import CircuitOpen
+from collections import deque
+from typing import Callable, Dict, Tuple
+import re
+import threading
+import time
+
+# Words that signal a short factual answer or a long derivation
+EASY_PATTERNS = [r"^\s*(what is|what are|what's|define|who (is|was)|when (is|was|did)|name)\b", r"\bdefinition of\b", r"\bmeaning of\b"]
+HARD_PATTERNS = [r"\bprove\b", r"\bproof\b", r"\bderive\b", r"\bderivation\b", r"\bshow that\b", r"\bstep[- ]by[- ]step\b",
+                 r"\bcompare\b", r"\bwhy does\b", r"\boptimi[sz]e\b", r"\bcomplexity\b", r"\bdesign\b", r"\bimplement\b"]
+MATH_PATTERN = r"\\[a-zA-Z]+|\$|[∫∑∏√∂∇≤≥≠]|\^|[a-zA-Z0-9)]\s*[=<>]\s*[a-zA-Z0-9(]|\b(integral|derivative|eigen\w*|matrix|limit)\b"
+# Topics whose questions tend to need the large model
+ADVANCED_TOPICS = ["analysis", "topology", "abstract algebra", "quantum", "relativity", "electrodynamics", "field theory",
+                   "differential equations", "measure", "complexity theory", "compilers", "distributed", "cryptography", "machine learning"]
+
+DEFAULT_THRESHOLD = 0.35
+MIN_ANSWER_CHARACTERS = 40
+REFUSAL_PATTERNS = [r"\bI('m| am) not sure\b", r"\bI (cannot|can't|am unable to)\b", r"\bas an AI\b", r"\bI don't know\b"]
+
+def complexity_features(profile: QuestionProfile) -> Dict[str, float]:
+    """Cheap features of a question that correlate with how much model it needs"""
+    text = f"{profile.question} {profile.details}"
+    topics = " ".join(profile.topics).lower()
+    return {
+        "words": len(text.split()),
+        "math": len(re.findall(MATH_PATTERN, text, re.IGNORECASE)),
+        "easy": float(any(re.search(p, profile.question, re.IGNORECASE) for p in EASY_PATTERNS)),
+        "hard": sum(bool(re.search(p, text, re.IGNORECASE)) for p in HARD_PATTERNS),
+        "topics": len(profile.topics),
+        "advanced_topic": float(any(topic in topics for topic in ADVANCED_TOPICS)),
+        "questions": text.count("?"),
+    }
+
+def complexity_score(profile: QuestionProfile) -> Tuple[float, Dict[str, float]]:
+    """Complexity in [0, 1] as a weighted sum of the features, with the features themselves"""
+    f = complexity_features(profile)
+    score = (
+        0.25 * min(f["words"] / 80.0, 1.0)
+        + 0.25 * min(f["math"] / 4.0, 1.0)
+        + 0.40 * min(f["hard"], 1.0)
+        + 0.15 * f["advanced_topic"]
+        + 0.05 * min(max(f["topics"] - 1, 0) / 2.0, 1.0)
+        + 0.10 * min(max(f["questions"] - 1, 0) / 2.0, 1.0)
+        - 0.25 * f["easy"]
+    )
+    return min(max(score, 0.0), 1.0), f
+
+def answer_passes_checks(answer: str) -> bool:
+    """Basic sanity checks on a small-model answer before it is returned instead of escalated"""
+    if not answer or len(answer.strip()) < MIN_ANSWER_CHARACTERS:
+        return False
+    if any(re.search(p, answer, re.IGNORECASE) for p in REFUSAL_PATTERNS):
+        return False
+    # The page renders MathJax; unbalanced delimiters break the whole answer
+    unescaped = re.sub(r"\\\$", "", answer)
+    if unescaped.count("$") % 2 or answer.count("\\(") != answer.count("\\)") or answer.count("\\[") != answer.count("\\]"):
+        return False
+    return True
+
+class RoutingMetrics:
+    """Thread-safe counters and recent latencies of cascade routing decisions"""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._counts = {"small": 0, "large": 0, "escalated": 0, "failed_checks": 0}
+        self._latencies = {"small": deque(maxlen=window), "large": deque(maxlen=window), "escalated": deque(maxlen=window)}
+
+    def record(self, tier: str, seconds: float, failed_checks: bool = False) -> None:
+        """tier is the route taken: 'small', 'large' or 'escalated' (small, then large)"""
+        with self._lock:
+            self._counts[tier if tier != "escalated" else "small"] += 1
+            if tier == "escalated":
+                self._counts["escalated"] += 1
+            if failed_checks:
+                self._counts["failed_checks"] += 1
+            self._latencies[tier].append(seconds)
+
+    def snapshot(self) -> dict:
+        """Counts, mean/p50/p95 latency per route and the estimated time saved by the small model"""
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = {tier: sorted(values) for tier, values in self._latencies.items()}
+        summary = {}
+        for tier, values in latencies.items():
+            if values:
+                summary[tier] = {
+                    "count": len(values),
+                    "mean_s": round(sum(values) / len(values), 4),
+                    "p50_s": round(values[len(values) // 2], 4),
+                    "p95_s": round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+                }
+        saved = None
+        if "small" in summary and "large" in summary:
+            saved = round((summary["large"]["mean_s"] - summary["small"]["mean_s"]) * summary["small"]["count"], 3)
+        return {"counts": counts, "latency": summary, "estimated_seconds_saved": saved}
+
+class CascadeAgent(Agent):
+    """
+    Routes each question to a small or a large instance of the same agent class.
+
+    Questions scoring below `threshold` go to the small model. With `escalate`, a small-model
+    answer that fails answer_passes_checks (or errors) is asked again of the large model.
+    """
+    def __init__(self, agent_class: Callable[..., Agent], small_model: str = langchain_small_model,
+                 large_model: str = langchain_base_model, threshold: float = DEFAULT_THRESHOLD,
+                 escalate: bool = False, metrics: RoutingMetrics = None):
+        self.small = agent_class(model=small_model)
+        self.large = agent_class(model=large_model)
+        self.threshold = threshold
+        self.escalate = escalate
+        self.metrics = metrics or RoutingMetrics()
+
+    def route(self, user_profile: QuestionProfile) -> str:
+        score, _ = complexity_score(user_profile)
+        return "small" if score < self.threshold else "large"
+
+    def resolve_query(self, user_profile: QuestionProfile, deadline: float = None) -> str:
+        started = time.monotonic()
+        kwargs = {} if deadline is None else {"deadline": deadline}
+        if self.route(user_profile) == "large":
+            answer = self.large.resolve_query(user_profile, **kwargs)
+            self.metrics.record("large", time.monotonic() - started)
+            return answer
+
+        try:
+            answer = self.small.resolve_query(user_profile, **kwargs)
+            passed = answer_passes_checks(answer)
+        except DeadlineExceeded:
+            # No time is left to escalate
+            raise
+        except CircuitOpen:
+            # The small model is down: the large one answers, whether or not escalation is on
+            answer = self.large.resolve_query(user_profile, **kwargs)
+            self.metrics.record("escalated", time.monotonic() - started, failed_checks=False)
+            return answer
+        except AgentException:
+            if not self.escalate:
+                raise
+            answer, passed = None, False
+        if passed or not self.escalate:
+            self.metrics.record("small", time.monotonic() - started, failed_checks=not passed)
+            return answer
+
+        answer = self.large.resolve_query(user_profile, **kwargs)
+        self.metrics.record("escalated", time.monotonic() - started, failed_checks=True)
+        return answer
+
+    def finetune(self):
+        """Placeholder, as for the wrapped agents"""
@@ -0,0 +1,178 @@
+from apps.agents.agent_utils import AgentException
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import re
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Defaults for every breaker, overridable per deployment
+WINDOW_SECONDS = float(os.getenv("ASK_BREAKER_WINDOW_SECONDS", 60))
+MIN_CALLS = int(os.getenv("ASK_BREAKER_MIN_CALLS", 10))
+ERROR_RATE = float(os.getenv("ASK_BREAKER_ERROR_RATE", 0.5))
+SLOW_CALL_SECONDS = float(os.getenv("ASK_BREAKER_SLOW_SECONDS", 30))
+SLOW_RATE = float(os.getenv("ASK_BREAKER_SLOW_RATE", 0.5))
+OPEN_SECONDS = float(os.getenv("ASK_BREAKER_OPEN_SECONDS", 30))
+HALF_OPEN_PROBES = 1
+
+class CircuitOpen(AgentException):
+    """Raised instead of calling an upstream whose breaker is open. `retry_after` is in seconds."""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that is failing or slow, and probes it to find out when it recovers.
+
+    Closed: calls go through and their outcomes are kept for `window_seconds`. Once at least
+    `min_calls` are in the window, an error rate of `error_rate` or a rate of `slow_rate` calls
+    slower than `slow_call_seconds` opens the breaker. Open: calls fail at once with CircuitOpen
+    for `open_seconds`. Half-open: `half_open_probes` calls are let through; success closes the
+    breaker, failure opens it again.
+    """
+    def __init__(self, name: str, window_seconds: float = WINDOW_SECONDS, min_calls: int = MIN_CALLS,
+                 error_rate: float = ERROR_RATE, slow_call_seconds: float = SLOW_CALL_SECONDS,
+                 slow_rate: float = SLOW_RATE, open_seconds: float = OPEN_SECONDS, half_open_probes: int = HALF_OPEN_PROBES):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (finished at, failed, slow) of recent calls
+        self._outcomes: deque = deque()
+        self._counts = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+        self._lock = threading.Lock()
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._probes = 0
+        self._outcomes.clear()
+        self._counts["opened"] += 1
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpen"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            self._counts["rejected"] += 1
+            retry_after = max(self.open_seconds - (now - self._opened_at), 1.0)
+        raise CircuitOpen(f"The {self.name} model is unavailable after repeated failures; retry in {retry_after:.0f}s", retry_after)
+
+    def record(self, failed: bool, seconds: float) -> None:
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            self._counts["calls"] += 1
+            self._counts["failures"] += failed
+            self._counts["slow"] += slow
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self.state == OPEN:
+                # A call admitted before the breaker opened
+                return
+            self._outcomes.append((now, failed, slow))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            if calls >= self.min_calls:
+                failures = sum(1 for _, f, _ in self._outcomes if f)
+                slow_calls = sum(1 for _, _, s in self._outcomes if s)
+                if failures / calls >= self.error_rate or slow_calls / calls >= self.slow_rate:
+                    self._open(now)
+
+    @contextmanager
+    def call(self, ignore: Tuple[type, ...] = ()):
+        """
+        Guard one upstream call. Exceptions in `ignore` (the caller's own, such as DeadlineExceeded)
+        are not failures; only the call's duration counts for them.
+        """
+        self.before_call()
+        started = time.monotonic()
+        try:
+            yield
+        except ignore:
+            self.record(False, time.monotonic() - started)
+            raise
+        except Exception:
+            self.record(True, time.monotonic() - started)
+            raise
+        self.record(False, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {"state": self.state, **self._counts, "window_calls": len(self._outcomes)}
+            if self.state != CLOSED:
+                snapshot["open_for_s"] = round(time.monotonic() - self._opened_at, 1)
+            return snapshot
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def circuit_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for an upstream (a model name), shared by every agent that calls it"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def breaker_states() -> Dict[str, dict]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+def normalize_question(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().rstrip("?.!").lower()
+
+class AnswerCache:
+    """
+    The most recent answer per agent and question, kept for serving while the upstream is down.
+
+    Questions match after normalizing case, whitespace and trailing punctuation; topics and details
+    must match too. Least recently stored entries are dropped beyond `max_entries`.
+    """
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(agent: str, topics: List[str], question: str, details: str) -> str:
+        parts = [agent, "|".join(sorted(t.strip().lower() for t in topics)), normalize_question(question), details.strip()]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def store(self, agent: str, topics: List[str], question: str, details: str, answer: str) -> None:
+        key = self.key(agent, topics, question, details)
+        with self._lock:
+            self._entries[key] = (answer, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, agent: str, topics: List[str], question: str, details: str) -> Optional[Tuple[str, float]]:
+        """(answer, time.time() it was stored) or None"""
+        with self._lock:
+            return self._entries.get(self.key(agent, topics, question, details))
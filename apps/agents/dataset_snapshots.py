@@ -0,0 +1,303 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+# A chunk ends after a record whose hash is 0 modulo this, so about this many records per chunk;
+# boundaries depend only on the records around them, and appended or edited records change only
+# the chunks they fall into
+CHUNK_RECORDS = 256
+MAX_CHUNK_RECORDS = 4 * CHUNK_RECORDS
+
+def canonical_record(question: str, answer: str) -> bytes:
+    return json.dumps({"question": question, "answer": answer}, sort_keys=True, ensure_ascii=False).encode("utf-8") + b"\n"
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def chunk_records(records: Iterable[bytes]) -> Iterator[List[bytes]]:
+    """Split canonical records into content-defined chunks"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if int(sha256(record)[:8], 16) % CHUNK_RECORDS == 0 or len(chunk) >= MAX_CHUNK_RECORDS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class DatasetDiff:
+    """Chunks added and removed per agent between two snapshots; computed from the manifests alone"""
+    def __init__(self, added: Dict[str, List[str]], removed: Dict[str, List[str]]):
+        self.added = added
+        self.removed = removed
+
+    def to_dict(self) -> dict:
+        return {"added": self.added, "removed": self.removed}
+
+class SnapshotStore:
+    """
+    Versioned snapshots of the per-agent fine-tuning corpus, stored as deduplicated chunks.
+
+    Layout under `root`:
+
+    chunks/<hash[:2]>/<hash>.jsonl.gz: canonical {question, answer} lines, named by the SHA-256 of
+        their uncompressed bytes, so identical chunks are stored once
+    snapshots/<id>.json: the manifest, i.e. each agent's chunk hashes and record counts in order,
+        with the parent snapshot; the id is a hash of the chunk lists
+    refs/<name>: a snapshot id under a name, such as the last one a model was fine-tuned on
+
+    A new snapshot writes only the chunks that are not stored yet, and the diff of two snapshots
+    compares their chunk lists without reading any chunk. The delta reads only the changed chunks.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        for directory in ("chunks", "snapshots", "refs"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.root, "chunks", digest[:2], f"{digest}.jsonl.gz")
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def _put_chunk(self, records: List[bytes]) -> Tuple[str, bool]:
+        """Store a chunk unless it exists; returns its hash and whether it was written"""
+        data = b"".join(records)
+        digest = sha256(data)
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        # mtime=0 keeps the compressed bytes reproducible
+        self._write_atomic(path, gzip.compress(data, mtime=0))
+        return digest, True
+
+    def read_chunk(self, digest: str) -> List[dict]:
+        with gzip.open(self._chunk_path(digest), "rb") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _store_records(self, records: List[bytes]) -> Tuple[List[dict], int]:
+        """Chunk and store records; returns the chunk list and how many chunks were written"""
+        chunks, written = [], 0
+        for chunk in chunk_records(records):
+            digest, new = self._put_chunk(chunk)
+            chunks.append({"hash": digest, "records": len(chunk)})
+            written += new
+        return chunks, written
+
+    def _save_manifest(self, agents: Dict[str, List[dict]], source: Optional[str], parent_id: Optional[str], written: int) -> dict:
+        snapshot_id = sha256(json.dumps(agents, sort_keys=True).encode("utf-8"))[:16]
+        path = os.path.join(self.root, "snapshots", f"{snapshot_id}.json")
+        if os.path.exists(path):
+            manifest = self.load(snapshot_id)
+        else:
+            manifest = {
+                "id": snapshot_id,
+                "parent": parent_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "source": source,
+                "records": sum(chunk["records"] for chunks in agents.values() for chunk in chunks),
+                "agents": agents,
+            }
+            self._write_atomic(path, json.dumps(manifest, indent=1).encode("utf-8"))
+        self.tag("latest", snapshot_id)
+        return dict(manifest, written_chunks=written)
+
+    def commit(self, corpus: Dict[str, List[dict]], source: str = None, parent: str = "latest") -> dict:
+        """
+        Snapshot `corpus` (agent name -> list of {question, answer}, as in agent_finetune_data.json).
+
+        Duplicate pairs of an agent are kept once. An unchanged corpus returns the existing snapshot.
+        The result is the manifest, with "written_chunks" added.
+        """
+        parent_id = self.resolve(parent) if parent else None
+        agents, written = {}, 0
+        for agent in sorted(corpus):
+            seen, records = set(), []
+            for pair in corpus[agent]:
+                record = canonical_record(pair.get("question", ""), pair.get("answer", ""))
+                if record not in seen:
+                    seen.add(record)
+                    records.append(record)
+            agents[agent], new = self._store_records(records)
+            written += new
+        return self._save_manifest(agents, source, parent_id, written)
+
+    def append(self, additions: Dict[str, List[dict]], source: str = None, parent: str = "latest") -> dict:
+        """
+        Snapshot `parent` with pairs appended to the end of agents' lists, as commit() of the grown
+        corpus would, but reading and rewriting only each changed agent's last chunk.
+
+        Chunk boundaries depend only on the records before them, so every chunk but the last is
+        unchanged. Callers pass pairs not already in `parent`; duplicates among them are kept once.
+        """
+        parent_id = self.resolve(parent) if parent else None
+        agents = dict(self.load(parent_id)["agents"]) if parent_id else {}
+        written = 0
+        for agent in sorted(additions):
+            chunks = list(agents.get(agent, []))
+            tail = [canonical_record(r["question"], r["answer"]) for r in self.read_chunk(chunks.pop()["hash"])] if chunks else []
+            seen, records = set(tail), list(tail)
+            for pair in additions[agent]:
+                record = canonical_record(pair.get("question", ""), pair.get("answer", ""))
+                if record not in seen:
+                    seen.add(record)
+                    records.append(record)
+            if len(records) == len(tail):
+                continue
+            new_chunks, new = self._store_records(records)
+            agents[agent] = chunks + new_chunks
+            written += new
+        return self._save_manifest({agent: agents[agent] for agent in sorted(agents)}, source, parent_id, written)
+
+    def load(self, snapshot_id: str) -> dict:
+        with open(os.path.join(self.root, "snapshots", f"{snapshot_id}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def tag(self, name: str, snapshot_id: str) -> None:
+        self._write_atomic(os.path.join(self.root, "refs", name), snapshot_id.encode("utf-8"))
+
+    def resolve(self, name: Optional[str]) -> Optional[str]:
+        """Snapshot id of a ref name or id; None for None or a ref that does not exist yet"""
+        if not name:
+            return None
+        ref = os.path.join(self.root, "refs", name)
+        if os.path.exists(ref):
+            with open(ref, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        if os.path.exists(os.path.join(self.root, "snapshots", f"{name}.json")):
+            return name
+        return None
+
+    def snapshots(self) -> List[dict]:
+        """Every manifest without its chunk lists, oldest first"""
+        summaries = []
+        for name in os.listdir(os.path.join(self.root, "snapshots")):
+            if name.endswith(".json"):
+                manifest = self.load(name[:-len(".json")])
+                manifest.pop("agents")
+                summaries.append(manifest)
+        return sorted(summaries, key=lambda manifest: manifest["created_at"])
+
+    def diff(self, old: Optional[str], new: str) -> DatasetDiff:
+        """Chunks of `new` that `old` lacks and the reverse, per agent; `old` None diffs against nothing"""
+        old_id = self.resolve(old)
+        old_agents = self.load(old_id)["agents"] if old_id else {}
+        new_agents = self.load(self.resolve(new))["agents"]
+        added, removed = {}, {}
+        for agent in sorted(set(old_agents) | set(new_agents)):
+            before = [chunk["hash"] for chunk in old_agents.get(agent, [])]
+            after = [chunk["hash"] for chunk in new_agents.get(agent, [])]
+            before_set, after_set = set(before), set(after)
+            new_chunks = [digest for digest in after if digest not in before_set]
+            old_chunks = [digest for digest in before if digest not in after_set]
+            if new_chunks:
+                added[agent] = new_chunks
+            if old_chunks:
+                removed[agent] = old_chunks
+        return DatasetDiff(added, removed)
+
+    def count_new(self, old: Optional[str], new: str) -> int:
+        """
+        Number of pairs `new` has beyond `old`, from the manifests' record counts without reading
+        any chunk: per agent, the records of added chunks less those of removed ones. Exact when
+        the corpus only grew, as with the finetune endpoint; with no `old`, every pair of `new`.
+        """
+        changes = self.diff(old, new)
+        counts = {}
+        for snapshot_id in (self.resolve(old), self.resolve(new)):
+            if snapshot_id:
+                for chunks in self.load(snapshot_id)["agents"].values():
+                    counts.update((chunk["hash"], chunk["records"]) for chunk in chunks)
+        return sum(
+            max(sum(counts[h] for h in changes.added.get(agent, [])) - sum(counts[h] for h in changes.removed.get(agent, [])), 0)
+            for agent in set(changes.added) | set(changes.removed)
+        )
+
+    def delta(self, old: Optional[str], new: str) -> Iterator[dict]:
+        """
+        Pairs in `new` that are not in `old`, as {agent_name, question, answer}, reading only the
+        changed chunks; with no `old`, every pair of `new`.
+        """
+        changes = self.diff(old, new)
+        for agent, chunks in changes.added.items():
+            known = {canonical_record(r["question"], r["answer"]) for h in changes.removed.get(agent, []) for r in self.read_chunk(h)}
+            for digest in chunks:
+                for record in self.read_chunk(digest):
+                    if canonical_record(record["question"], record["answer"]) not in known:
+                        yield {"agent_name": agent, **record}
+
+    def gc(self) -> int:
+        """Delete chunks no snapshot refers to; returns how many"""
+        referenced = set()
+        for name in os.listdir(os.path.join(self.root, "snapshots")):
+            if name.endswith(".json"):
+                for chunks in self.load(name[:-len(".json")])["agents"].values():
+                    referenced.update(chunk["hash"] for chunk in chunks)
+        removed = 0
+        for directory, _, files in os.walk(os.path.join(self.root, "chunks")):
+            for name in files:
+                if name.endswith(".jsonl.gz") and name[:-len(".jsonl.gz")] not in referenced:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+        return removed
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Versioned, deduplicated snapshots of the fine-tuning corpus.")
+    parser.add_argument("--dir", default=os.getenv("ASK_DATASET_DIR", "datasets"), help="Snapshot store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commit = commands.add_parser("commit", help="Snapshot an agent_finetune_data.json file")
+    commit.add_argument("data")
+    commands.add_parser("list", help="List snapshots")
+    diff = commands.add_parser("diff", help="Changed chunks between two snapshots or refs")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    export = commands.add_parser("export", help="Write a snapshot's pairs, or only those since another, as JSONL")
+    export.add_argument("snapshot", nargs="?", default="latest")
+    export.add_argument("--since", help="Snapshot or ref already trained on, e.g. finetuned")
+    export.add_argument("--output", required=True)
+    tag = commands.add_parser("tag", help="Name a snapshot, e.g. after fine-tuning on it")
+    tag.add_argument("name")
+    tag.add_argument("snapshot", nargs="?", default="latest")
+    commands.add_parser("gc", help="Delete chunks no snapshot refers to")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.dir)
+    if args.command == "commit":
+        with open(args.data, "r", encoding="utf-8") as f:
+            manifest = store.commit(json.load(f), source=os.path.basename(args.data))
+        print(f"snapshot {manifest['id']}: {manifest['records']} pairs, {manifest['written_chunks']} new chunks")
+    elif args.command == "list":
+        for manifest in store.snapshots():
+            print(f"{manifest['id']}  {manifest['created_at']}  {manifest['records']:>8} pairs  parent {manifest['parent']}")
+    elif args.command == "diff":
+        print(json.dumps(store.diff(args.old, args.new).to_dict(), indent=2))
+    elif args.command == "export":
+        if store.resolve(args.snapshot) is None:
+            print(f"Unknown snapshot {args.snapshot}", file=sys.stderr)
+            return 1
+        count = 0
+        with open(args.output, "w", encoding="utf-8") as f:
+            for record in store.delta(args.since, args.snapshot):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        print(f"{count} pairs written to {args.output}")
+    elif args.command == "tag":
+        if store.resolve(args.snapshot) is None:
+            print(f"Unknown snapshot {args.snapshot}", file=sys.stderr)
+            return 1
+        store.tag(args.name, store.resolve(args.snapshot))
+    elif args.command == "gc":
+        print(f"{store.gc()} unreferenced chunks deleted")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
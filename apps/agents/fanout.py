@@ -0,0 +1,161 @@
+from apps.agents.agent_utils import (Agent, AgentException, DeadlineExceeded, QuestionProfile, invoke_chain,
+                                     langchain_base_model, resolve_with_deadline)
+from apps.agents.token_budget import MODEL_CONTEXT_TOKENS, DEFAULT_CONTEXT_TOKENS, SAFETY_MARGIN, token_counter
+from apps.agents.tracing import span
+from apps.agents.circuit_breaker import circuit_breaker
+from concurrent.futures import FIRST_COMPLETED, Executor, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Dict, Iterator, List
+import os
+import time
+
+# Seconds of a shared deadline kept back for the merge step
+MERGE_RESERVE_SECONDS = 5.0
+MERGE_ANSWER_TOKENS = 1536
+MERGE_PROMPT = """Several subject experts answered the same student question from their own discipline.
+Combine their answers into one coherent answer for an undergraduate student: keep each expert's correct
+content, connect the parts that depend on each other, remove repetition, and point out any disagreement
+instead of hiding it. Keep the formulas, code and references they gave. Answer in Markdown.
+
+Question: {question}
+Additional details: {details}
+
+{answers}"""
+
+class FanOutResult:
+    """One agent's outcome: an answer (possibly cut off by the deadline) or an error"""
+    def __init__(self, name: str, answer: str = None, error: str = None, truncated: bool = False, elapsed: float = 0.0):
+        self.name = name
+        self.answer = answer
+        self.error = error
+        self.truncated = truncated
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.answer is not None
+
+    def to_dict(self) -> dict:
+        result = {"agent": self.name, "elapsed_s": round(self.elapsed, 3)}
+        if self.ok:
+            result.update(answer=self.answer, truncated=self.truncated)
+        else:
+            result["error"] = self.error
+        return result
+
+def _resolve(name: str, agent: Agent, profile: QuestionProfile, deadline: float, started: float) -> FanOutResult:
+    try:
+        with span("resolve_query", agent=type(agent).__name__, fan_out=name):
+            if deadline is not None:
+                answer = agent.resolve_query(profile, deadline=deadline)
+            else:
+                answer = agent.resolve_query(profile)
+        return FanOutResult(name, answer=answer, elapsed=time.monotonic() - started)
+    except DeadlineExceeded as e:
+        if e.partial:
+            return FanOutResult(name, answer=e.partial, truncated=True, elapsed=time.monotonic() - started)
+        return FanOutResult(name, error=str(e), elapsed=time.monotonic() - started)
+    except AgentException as e:
+        return FanOutResult(name, error=str(e), elapsed=time.monotonic() - started)
+
+def fan_out(agents: Dict[str, Agent], profile: QuestionProfile, deadline: float = None,
+            executor: Executor = None) -> Iterator[FanOutResult]:
+    """
+    Ask every agent the same question concurrently and yield their results as they complete.
+
+    All agents share `deadline` (a time.monotonic() value) and stream so they can stop at it;
+    an agent still running when it passes is reported as an error without waiting for it.
+    Wall-clock time is that of the slowest agent.
+    """
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=len(agents), thread_name_prefix="fan-out")
+    started = time.monotonic()
+    # Each call runs in a copy of this context, so its spans join the request's trace
+    pending = {
+        executor.submit(copy_context().run, _resolve, name, agent, profile, deadline, started): name
+        for name, agent in agents.items()
+    }
+    try:
+        while pending:
+            timeout = None
+            if deadline is not None:
+                # A little grace for agents to return the partial answer they hold at the deadline
+                timeout = max(deadline - time.monotonic(), 0.0) + 1.0
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                for future, name in pending.items():
+                    future.cancel()
+                    yield FanOutResult(name, error="The deadline passed before the agent answered", elapsed=time.monotonic() - started)
+                return
+            for future in done:
+                pending.pop(future)
+                yield future.result()
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+
+class AnswerMerger:
+    """Combines the answers of several agents into one with a single model call"""
+    def __init__(self, model: str = langchain_base_model):
+        # Imported here so that fan-out works without the LLM stack when answers are not merged
+        from langchain.prompts import ChatPromptTemplate
+        from langchain_groq import ChatGroq
+        self.model = model
+        self.template = ChatPromptTemplate.from_messages([("human", MERGE_PROMPT)])
+        self.llm = ChatGroq(model_name=model, api_key=os.getenv("GROQ_API_KEY"))
+        self.breaker = circuit_breaker(model)
+
+    def _answers_block(self, profile: QuestionProfile, results: List[FanOutResult]) -> str:
+        # Each answer gets an equal share of the context left after the question and the merged answer
+        counter = token_counter(self.model)
+        context = int(MODEL_CONTEXT_TOKENS.get(self.model, DEFAULT_CONTEXT_TOKENS) * (1 - SAFETY_MARGIN))
+        fixed = counter.count(MERGE_PROMPT) + counter.count(profile.question) + counter.count(profile.details)
+        share = max((context - MERGE_ANSWER_TOKENS - fixed) // max(len(results), 1), 128)
+        return "\n\n".join(
+            f"Answer from the {result.name} expert{' (cut off at the deadline)' if result.truncated else ''}:\n"
+            f"{counter.trim(result.answer, share)}"
+            for result in results
+        )
+
+    def merge(self, profile: QuestionProfile, results: List[FanOutResult], deadline: float = None) -> str:
+        answered = [result for result in results if result.ok]
+        if not answered:
+            raise AgentException("No agent answered, so there is nothing to merge")
+        if len(answered) == 1:
+            return answered[0].answer
+        inputs = {"question": profile.question, "details": profile.details or "None", "answers": self._answers_block(profile, answered)}
+        llm = self.llm.bind(max_tokens=MERGE_ANSWER_TOKENS)
+        with span("merge answers", answers=len(answered)):
+            if deadline is not None:
+                return resolve_with_deadline(self.template, llm, inputs, deadline, breaker=self.breaker)
+            try:
+                return invoke_chain(self.template, llm, inputs, breaker=self.breaker)
+            except AgentException:
+                raise
+            except Exception as e:
+                raise AgentException(f"Error merging answers: {str(e)}") from e
+
+def agent_deadline(deadline: float, merging: bool) -> float:
+    """Deadline for the agents: with a merge to follow, MERGE_RESERVE_SECONDS (at most half the time left) earlier"""
+    if deadline is None or not merging:
+        return deadline
+    return deadline - min(MERGE_RESERVE_SECONDS, (deadline - time.monotonic()) / 2)
+
+def merge_results(merger: AnswerMerger, profile: QuestionProfile, results: List[FanOutResult], deadline: float = None) -> dict:
+    """The merged answer as response fields: "merged", plus "merge_truncated" or "merge_error" when it fell short"""
+    try:
+        return {"merged": merger.merge(profile, results, deadline)}
+    except DeadlineExceeded as e:
+        return {"merged": e.partial or None, "merge_truncated": True}
+    except AgentException as e:
+        return {"merged": None, "merge_error": str(e)}
+
+def run_agents(agents: Dict[str, Agent], topics: List[str], question: str, details: str, deadline: float = None,
+               merger: AnswerMerger = None, executor: Executor = None) -> dict:
+    """run_agent for several agents at once: every agent's result and, with a merger, the combined answer"""
+    profile = QuestionProfile(topics=topics, question=question, details=details)
+    results = list(fan_out(agents, profile, agent_deadline(deadline, merger is not None), executor))
+    response = {"answers": [result.to_dict() for result in results]}
+    if merger is not None:
+        response.update(merge_results(merger, profile, results, deadline))
+    return response
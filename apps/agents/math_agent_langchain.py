@@ -2,17 +2,16 @@ from langchain.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 
 from apps.agents.agent_utils import *
+from apps.agents.token_budget import BudgetPolicy, PromptBudget
+from apps.agents.circuit_breaker import circuit_breaker
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-class MathAgent(Agent):
-    def __init__(self, model=langchain_base_model):
-        self.llm = ChatGroq(model_name=model, api_key=os.getenv("GROQ_API_KEY"))
-
-        self.math_template = ChatPromptTemplate.from_messages([
-            ("system", """You are a university mathematics professor that is suited to help undergraduate students with their 
+# Built once at import so that pre-forked server workers share it
+MATH_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", """You are a university mathematics professor that is suited to help undergraduate students with their 
              mathematics-related questions. Make sure to use known and proven theorems while providing answers uniquely tailored to the student's query. 
              Make sure to not give too simplistic answers and make sure to not give too advanced answers. You can keep the answer as long as you like but adjust it to the length appropriate for the complexity of the question asked.
 
@@ -22,20 +21,38 @@ class MathAgent(Agent):
 
              You are now an expert in the following topics: {topics}
              """),
-            ("human", "Question: {question}, Additional details: {details}")
-        ])
+    ("human", "Question: {question}, Additional details: {details}")
+])
+
+# Long details are usually working the student has tried; its start states the problem
+MATH_BUDGET = BudgetPolicy(max_detail_tokens=1500, keep="middle", max_answer_tokens=2048)
+
+
+class MathAgent(Agent):
+    def __init__(self, model=langchain_base_model):
+        self.llm = ChatGroq(model_name=model, api_key=os.getenv("GROQ_API_KEY"))
+
+        self.math_template = MATH_TEMPLATE
 
         self.query_chain = self.math_template | self.llm
+        self.budget = PromptBudget(model, MATH_BUDGET)
+        # Shared with every other agent calling the same model
+        self.breaker = circuit_breaker(model)
 
-    def resolve_query(self, user_profile: QuestionProfile) -> str:
-        """Provide the question profile which includes topics of the question, the actual question, and any additional details from the asker."""
+    def resolve_query(self, user_profile: QuestionProfile, deadline: float = None) -> str:
+        """Provide the question profile which includes topics of the question, the actual question, and any additional details from the asker.
+        With a deadline (a time.monotonic() value) the answer is streamed and cut off when it passes, raising DeadlineExceeded."""
+        inputs = {
+            "topics": user_profile.topics,
+            "question": user_profile.question,
+            "details": user_profile.details
+        }
+        if deadline is not None:
+            return resolve_with_deadline(self.math_template, self.llm, inputs, deadline, self.budget, self.breaker)
         try:
-            response = self.query_chain.invoke({
-                "topics": user_profile.topics,
-                "question": user_profile.question,
-                "details": user_profile.details
-            })
-            return response.content
+            return invoke_chain(self.math_template, self.llm, inputs, self.budget, self.breaker)
+        except AgentException:
+            raise
         except Exception as e:
             raise AgentException(f"Error generating answer: {str(e)}") from e
         
@@ -2,17 +2,16 @@ from langchain.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 
 from apps.agents.agent_utils import *
+from apps.agents.token_budget import BudgetPolicy, PromptBudget
+from apps.agents.circuit_breaker import circuit_breaker
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-class PhysicsAgent(Agent):
-    def __init__(self, model=langchain_base_model):
-        self.llm = ChatGroq(model_name=model, api_key=os.getenv("GROQ_API_KEY"))
-
-        self.phys_template = ChatPromptTemplate.from_messages([
-            ("system", """You are a university physics professor that is suited to help undergraduate students with their 
+# Built once at import so that pre-forked server workers share it
+PHYSICS_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", """You are a university physics professor that is suited to help undergraduate students with their 
              physics-related questions. Make sure to use known and proven theorems while providing answers uniquely tailored to the student's query. 
              Try your best to give simple answers as complexity is NOT favored but be thoroughly explicit in any prerequisites. 
              You can keep the answer as long as you like but try to convey a chronological explanation/story if you're leading upto some kind of conclusion so that its more human-intuitive.
@@ -22,20 +21,37 @@ class PhysicsAgent(Agent):
              When stating theorems, please quote in full with proper mathjax equations written out. If it makes the answer too verbose, provide a link towards the end of the answer
              You are now an expert in the following topics: {topics}
              """),
-            ("human", "Question: {question}, Additional details: {details}")
-        ])
+    ("human", "Question: {question}, Additional details: {details}")
+])
+
+PHYSICS_BUDGET = BudgetPolicy(max_detail_tokens=1500, keep="middle", max_answer_tokens=2048)
+
+
+class PhysicsAgent(Agent):
+    def __init__(self, model=langchain_base_model):
+        self.llm = ChatGroq(model_name=model, api_key=os.getenv("GROQ_API_KEY"))
+
+        self.phys_template = PHYSICS_TEMPLATE
 
         self.query_chain = self.phys_template | self.llm
+        self.budget = PromptBudget(model, PHYSICS_BUDGET)
+        # Shared with every other agent calling the same model
+        self.breaker = circuit_breaker(model)
 
-    def resolve_query(self, user_profile: QuestionProfile) -> str:
-        """Provide the question profile which includes topics of the question, the actual question, and any additional details from the asker."""
+    def resolve_query(self, user_profile: QuestionProfile, deadline: float = None) -> str:
+        """Provide the question profile which includes topics of the question, the actual question, and any additional details from the asker.
+        With a deadline (a time.monotonic() value) the answer is streamed and cut off when it passes, raising DeadlineExceeded."""
+        inputs = {
+            "topics": user_profile.topics,
+            "question": user_profile.question,
+            "details": user_profile.details
+        }
+        if deadline is not None:
+            return resolve_with_deadline(self.phys_template, self.llm, inputs, deadline, self.budget, self.breaker)
         try:
-            response = self.query_chain.invoke({
-                "topics": user_profile.topics,
-                "question": user_profile.question,
-                "details": user_profile.details
-            })
-            return response.content
+            return invoke_chain(self.phys_template, self.llm, inputs, self.budget, self.breaker)
+        except AgentException:
+            raise
         except Exception as e:
             raise AgentException(f"Error generating answer: {str(e)}") from e
         
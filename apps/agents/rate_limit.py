@@ -0,0 +1,44 @@
+import threading
+import time
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: on average at most `rate` calls per `per` seconds.
+
+    Up to `burst` calls (default: one) may go through back to back after an idle period.
+    """
+    def __init__(self, rate: float, per: float = 60.0, burst: int = 1):
+        self.interval = per / rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available, without waiting"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Wait for a token; returns False if none became available within `timeout` seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) * self.interval
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from functools import lru_cache
+from html import escape
+import hashlib
+import re
+import threading
+import xml.etree.ElementTree as ElementTree
+
+# Part of the cache key: bump when the output changes so stale HTML is not served
+RENDER_VERSION = "2"
+MAX_CACHED_RENDERS = 2048
+CODE_STYLE = "monokai"
+
+# Fenced code blocks and inline code, inside which dollar signs are not math
+CODE_PATTERN = re.compile(r"(```[\s\S]*?(?:```|$)|~~~[\s\S]*?(?:~~~|$)|`[^`\n]+`)")
+# The delimiters the web app configures for MathJax: $$..$$ and \[..\] display, $..$ and \(..\) inline.
+# A single $ must hug its content and not be followed by a digit, so "$5 and $10" stays text
+MATH_PATTERN = re.compile(
+    r"\$\$(?P<d1>.+?)\$\$|\\\[(?P<d2>.+?)\\\]|\\\((?P<i1>.+?)\\\)|(?<![\\$])\$(?=\S)(?P<i2>[^$\n]+?)(?<=\S)\$(?!\d)",
+    re.DOTALL,
+)
+PLACEHOLDER = "MATHPLACEHOLDER{}X"
+PLACEHOLDER_PATTERN = re.compile(r"MATHPLACEHOLDER(\d+)X")
+
+def _highlight(code: str, lang: str, attrs) -> str:
+    """Highlight a fenced block with Pygments, with inline styles so no stylesheet is needed"""
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+    try:
+        lexer = get_lexer_by_name(lang) if lang else None
+    except ClassNotFound:
+        lexer = None
+    if lexer is None:
+        # Left to markdown-it, which escapes it into a plain <pre><code>
+        return ""
+    body = highlight(code, lexer, HtmlFormatter(nowrap=True, noclasses=True, style=CODE_STYLE))
+    # data-highlighted stops highlight.js from highlighting the block again in the browser
+    return f'<pre><code class="language-{escape(lang)}" data-highlighted="yes">{body}</code></pre>\n'
+
+@lru_cache(maxsize=None)
+def _markdown():
+    """CommonMark with tables and strikethrough; raw HTML in answers is escaped, not passed through"""
+    from markdown_it import MarkdownIt
+    return MarkdownIt("commonmark", {"html": False, "highlight": _highlight}).enable(["table", "strikethrough"])
+
+MATHML_NS = "http://www.w3.org/1998/Math/MathML"
+# Presentation MathML kept in rendered answers; anything else (\href links, HTML that \text{} let through) is dropped
+MATHML_TAGS = frozenset((
+    "math mrow mi mn mo ms mtext mspace msub msup msubsup mfrac msqrt mroot mover munder munderover "
+    "mmultiscripts mprescripts none mtable mtr mtd mlabeledtr mstyle mpadded mphantom menclose mfenced "
+    "merror semantics annotation"
+).split())
+MATHML_ATTRIBUTES = frozenset((
+    "display displaystyle scriptlevel mathvariant mathsize mathcolor mathbackground stretchy fence separator "
+    "separators open close lspace rspace form largeop movablelimits symmetric minsize maxsize accent accentunder "
+    "width height depth voffset linethickness notation columnalign rowalign columnlines rowlines columnspacing "
+    "rowspacing columnspan rowspan frame framespacing equalrows equalcolumns encoding"
+).split())
+
+class UnsafeMathML(ValueError):
+    """latex2mathml output that is not well-formed MathML"""
+
+def _sanitize(element) -> None:
+    for attribute in list(element.attrib):
+        if attribute not in MATHML_ATTRIBUTES:
+            del element.attrib[attribute]
+    for child in list(element):
+        tag = child.tag.split("}", 1)[-1] if isinstance(child.tag, str) else None
+        if tag not in MATHML_TAGS:
+            element.remove(child)
+            continue
+        child.tag = tag
+        _sanitize(child)
+
+def sanitize_mathml(mathml: str) -> str:
+    """
+    Keep only allowlisted MathML elements and attributes. latex2mathml copies parts of its input
+    verbatim (\\text{} contents, \\href targets), so its output is untrusted. Raises UnsafeMathML
+    when the output does not parse as XML, which is what HTML smuggled through \\text{} looks like.
+    """
+    if "<!" in mathml or "<?" in mathml:
+        raise UnsafeMathML("declarations are not allowed")
+    try:
+        root = ElementTree.fromstring(mathml)
+    except ElementTree.ParseError as e:
+        raise UnsafeMathML(str(e)) from e
+    if root.tag != f"{{{MATHML_NS}}}math":
+        raise UnsafeMathML("not a math element")
+    root.tag = "math"
+    _sanitize(root)
+    root.set("xmlns", MATHML_NS)
+    return ElementTree.tostring(root, encoding="unicode")
+
+def _tex_to_mathml(tex: str, display: bool) -> str:
+    from latex2mathml.converter import convert
+    return sanitize_mathml(convert(tex.strip(), display="block" if display else "inline"))
+
+def extract_math(markdown: str):
+    """Replace math outside code with placeholders; returns the text and the (tex, display) list"""
+    formulas = []
+
+    def stash(match):
+        display = match.group("d1") is not None or match.group("d2") is not None
+        tex = next(group for group in match.group("d1", "d2", "i1", "i2") if group is not None)
+        formulas.append((tex, display, match.group(0)))
+        return PLACEHOLDER.format(len(formulas) - 1)
+
+    parts = CODE_PATTERN.split(markdown)
+    # split() with one group alternates text and code
+    for i in range(0, len(parts), 2):
+        parts[i] = MATH_PATTERN.sub(stash, parts[i])
+    return "".join(parts), formulas
+
+def render_markdown(markdown: str) -> str:
+    """
+    Markdown answer to static HTML: math becomes MathML, code is highlighted.
+
+    A formula latex2mathml cannot convert, or whose MathML fails sanitize_mathml, is left as its
+    escaped TeX source, delimiters included, so MathJax can still typeset it in the browser.
+    """
+    text, formulas = extract_math(markdown)
+    html = _markdown().render(text)
+
+    def restore(match):
+        tex, display, source = formulas[int(match.group(1))]
+        try:
+            return _tex_to_mathml(tex, display)
+        except Exception:
+            return escape(source)
+
+    return PLACEHOLDER_PATTERN.sub(restore, html)
+
+def content_hash(markdown: str) -> str:
+    return hashlib.sha256(f"{RENDER_VERSION}\0{markdown}".encode("utf-8")).hexdigest()
+
+class RenderCache:
+    """Rendered HTML by content hash, least recently used out first, shared by the threads of a process"""
+    def __init__(self, max_entries: int = MAX_CACHED_RENDERS):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, markdown: str) -> str:
+        key = content_hash(markdown)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        # Rendered outside the lock; two threads racing on one answer both render it once
+        html = render_markdown(markdown)
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+render_cache = RenderCache()
+
+def render_answer(markdown: str) -> str:
+    """Cached render_markdown"""
+    return render_cache.render(markdown)
@@ -0,0 +1,235 @@
+from apps.agents.agent_utils import Agent, AgentException, DeadlineExceeded, QuestionProfile
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Priority classes, most urgent first
+INTERACTIVE, HIGH_VALUE, BACKGROUND = 0, 1, 2
+CLASS_NAMES = {INTERACTIVE: "interactive", HIGH_VALUE: "high_value", BACKGROUND: "background"}
+PRIORITY_HEADER = "X-Request-Priority"
+
+# A question is high-value at this reward or when its reward deadline is this close
+HIGH_REWARD = float(os.getenv("ASK_HIGH_REWARD", 1.0))
+NEAR_DEADLINE_SECONDS = float(os.getenv("ASK_NEAR_DEADLINE_HOURS", 24)) * 3600
+# Longest wait for a slot per class when the request sets no deadline of its own
+MAX_WAIT_SECONDS = {INTERACTIVE: 30.0, HIGH_VALUE: 120.0, BACKGROUND: 600.0}
+
+class Saturated(AgentException):
+    """Raised when a request is shed because an agent's queue is full. `retry_after` is in seconds."""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _parse_time(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def classify(data: dict, headers=None) -> Tuple[int, float]:
+    """
+    Priority class and in-class score (higher first) of an ask request.
+
+    An explicit "priority" field or X-Request-Priority header wins. Otherwise requests for a posted
+    Question (with "reward" or "rewardAt") are high-value when the reward is at least HIGH_REWARD
+    or rewardAt is within NEAR_DEADLINE_SECONDS, and background backfill when not; anything else
+    is an interactive page request.
+    """
+    reward = float(data.get("reward") or 0.0)
+    reward_at = _parse_time(data.get("rewardAt"))
+    seconds_left = reward_at - time.time() if reward_at is not None else None
+    # Larger rewards first, then the ones whose deadline is closest
+    score = reward + (1.0 / max(seconds_left / 3600, 0.01) if seconds_left is not None else 0.0)
+
+    requested = (headers.get(PRIORITY_HEADER) if headers is not None else None) or data.get("priority")
+    by_name = {name: cls for cls, name in CLASS_NAMES.items()}
+    if requested in by_name:
+        return by_name[requested], score
+    if "reward" in data or reward_at is not None:
+        near = seconds_left is not None and seconds_left <= NEAR_DEADLINE_SECONDS
+        return (HIGH_VALUE if reward >= HIGH_REWARD or near else BACKGROUND), score
+    return INTERACTIVE, score
+
+class _Waiter:
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.shed = False
+
+class AgentScheduler:
+    """
+    Admission control and priority queueing in front of the agents of one process.
+
+    Each agent runs at most `concurrency` requests at once, and background work at most
+    `background_share` of them, so interactive and high-value requests always find a slot soon.
+    Waiting requests are served by class, then score, then arrival. An agent's queue holds
+    `max_queue` requests; when it is full, a newcomer displaces the least urgent waiter if it
+    outranks it and is shed with Saturated otherwise.
+    """
+    def __init__(self, concurrency: int = 16, max_queue: int = 64, background_share: float = 0.5, window: int = 1000):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.background_limit = max(1, int(concurrency * background_share))
+        self._lock = threading.Lock()
+        self._active: Dict[str, int] = {}
+        self._active_background: Dict[str, int] = {}
+        self._queues: Dict[str, list] = {}
+        self._sequence = itertools.count()
+        # Mean service time per agent, for Retry-After estimates
+        self._service_seconds: Dict[str, float] = {}
+        self._shed = {name: 0 for name in CLASS_NAMES.values()}
+        self._waits = {cls: deque(maxlen=window) for cls in CLASS_NAMES}
+
+    def _can_run(self, agent: str, priority: int) -> bool:
+        if self._active.get(agent, 0) >= self.concurrency:
+            return False
+        return priority != BACKGROUND or self._active_background.get(agent, 0) < self.background_limit
+
+    def _start(self, agent: str, priority: int) -> None:
+        self._active[agent] = self._active.get(agent, 0) + 1
+        if priority == BACKGROUND:
+            self._active_background[agent] = self._active_background.get(agent, 0) + 1
+
+    def _retry_after(self, agent: str) -> float:
+        queued = len(self._queues.get(agent, ()))
+        return max(1.0, self._service_seconds.get(agent, 5.0) * (queued + 1) / self.concurrency)
+
+    def _shed_waiter(self, waiter: _Waiter) -> None:
+        waiter.shed = True
+        self._shed[CLASS_NAMES[waiter.priority]] += 1
+        waiter.event.set()
+
+    def _grant_next(self, agent: str) -> None:
+        """Start the best waiters that can run now; a background head may not block a slot the others could use"""
+        queue = self._queues.get(agent, [])
+        skipped = []
+        while queue and self._active.get(agent, 0) < self.concurrency:
+            entry = heapq.heappop(queue)
+            waiter = entry[-1]
+            if waiter.event.is_set():
+                continue
+            if not self._can_run(agent, waiter.priority):
+                skipped.append(entry)
+                continue
+            self._start(agent, waiter.priority)
+            waiter.granted = True
+            waiter.event.set()
+        for entry in skipped:
+            heapq.heappush(queue, entry)
+
+    def acquire(self, agent: str, priority: int = INTERACTIVE, score: float = 0.0, deadline: float = None) -> None:
+        """
+        Wait for a slot on `agent`. Raises Saturated when shed, and DeadlineExceeded when
+        `deadline` (a time.monotonic() value) or the class's MAX_WAIT_SECONDS passes first.
+        """
+        started = time.monotonic()
+        with self._lock:
+            queue = self._queues.setdefault(agent, [])
+            ahead = any(e[0] <= priority and not e[-1].event.is_set() for e in queue)
+            if not ahead and self._can_run(agent, priority):
+                self._start(agent, priority)
+                self._waits[priority].append(0.0)
+                return
+            waiter = _Waiter(priority)
+            entry = (priority, -score, next(self._sequence), waiter)
+            if len(queue) >= self.max_queue:
+                worst = max(queue)
+                if worst[:3] <= entry[:3]:
+                    self._shed[CLASS_NAMES[priority]] += 1
+                    retry_after = self._retry_after(agent)
+                    raise Saturated(f"The {agent} agent is at capacity; retry in {retry_after:.0f}s", retry_after)
+                queue.remove(worst)
+                heapq.heapify(queue)
+                self._shed_waiter(worst[-1])
+            heapq.heappush(queue, entry)
+
+        limit = started + MAX_WAIT_SECONDS[priority]
+        if deadline is not None:
+            limit = min(limit, deadline)
+        waiter.event.wait(max(limit - time.monotonic(), 0.0))
+        with self._lock:
+            if waiter.granted:
+                self._waits[priority].append(time.monotonic() - started)
+                return
+            if not waiter.shed:
+                # Timed out: mark it so it is skipped when reached
+                waiter.event.set()
+                queue = self._queues.get(agent, [])
+                self._queues[agent] = [e for e in queue if e[-1] is not waiter]
+                heapq.heapify(self._queues[agent])
+            retry_after = self._retry_after(agent)
+        if waiter.shed:
+            raise Saturated(f"The {agent} agent is at capacity and this request was displaced by more urgent ones; "
+                            f"retry in {retry_after:.0f}s", retry_after)
+        raise DeadlineExceeded(f"No {agent} agent slot became free in time")
+
+    def release(self, agent: str, priority: int, seconds: float) -> None:
+        with self._lock:
+            self._active[agent] -= 1
+            if priority == BACKGROUND:
+                self._active_background[agent] -= 1
+            previous = self._service_seconds.get(agent)
+            self._service_seconds[agent] = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+            self._grant_next(agent)
+
+    def busy(self, agent: str) -> bool:
+        """Whether requests are waiting for a slot on `agent`"""
+        with self._lock:
+            return any(not entry[-1].event.is_set() for entry in self._queues.get(agent, ()))
+
+    @contextmanager
+    def slot(self, agent: str, priority: int = INTERACTIVE, score: float = 0.0, deadline: float = None):
+        self.acquire(agent, priority, score, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(agent, priority, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        """Running and queued requests per agent, shed counts and queue waits per class"""
+        with self._lock:
+            agents = {}
+            for agent in set(self._active) | set(self._queues):
+                queued = {name: 0 for name in CLASS_NAMES.values()}
+                for entry in self._queues.get(agent, []):
+                    if not entry[-1].event.is_set():
+                        queued[CLASS_NAMES[entry[0]]] += 1
+                agents[agent] = {"running": self._active.get(agent, 0), "running_background": self._active_background.get(agent, 0), "queued": queued}
+            waits = {CLASS_NAMES[cls]: sorted(values) for cls, values in self._waits.items()}
+            shed = dict(self._shed)
+        wait_summary = {
+            name: {"count": len(values), "p50_s": round(values[len(values) // 2], 4), "p95_s": round(values[min(len(values) - 1, int(len(values) * 0.95))], 4)}
+            for name, values in waits.items() if values
+        }
+        return {"concurrency": self.concurrency, "max_queue": self.max_queue, "agents": agents, "shed": shed, "wait": wait_summary}
+
+class ScheduledAgent(Agent):
+    """Runs an agent's queries through an AgentScheduler slot for one request's priority"""
+    def __init__(self, agent: Agent, scheduler: AgentScheduler, name: str, priority: int = INTERACTIVE, score: float = 0.0):
+        self.agent = agent
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = priority
+        self.score = score
+
+    def resolve_query(self, user_profile: QuestionProfile, deadline: float = None) -> str:
+        with self.scheduler.slot(self.name, self.priority, self.score, deadline):
+            if deadline is not None:
+                return self.agent.resolve_query(user_profile, deadline=deadline)
+            return self.agent.resolve_query(user_profile)
+
+    def finetune(self):
+        """Placeholder, as for the wrapped agents"""
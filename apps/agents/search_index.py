@@ -0,0 +1,516 @@
+from apps.agents.circuit_breaker import normalize_question
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import fcntl
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Term-frequency components are stored quantized to 16 bits
+IMPACT_SCALE = 65535 / (K1 + 1)
+# Postings read per query term over all segments, highest impact first; bounds query time on very common terms
+MAX_POSTINGS = 2000
+# Documents buffered in memory before they are written as a segment, and longest they wait
+FLUSH_DOCS = 1000
+FLUSH_SECONDS = 60.0
+# More segments than this and the smallest MERGE_FACTOR are merged into one
+MAX_SEGMENTS = 10
+MERGE_FACTOR = 4
+SNIPPET_WORDS = 30
+# Recently indexed documents remembered per index, so repeated answers are not indexed twice
+RECENT_IDS = 10000
+
+MANIFEST = "manifest.json"
+LOCK_FILE = ".lock"
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or that the this to was what when "
+    "where which who why will with you your".split()
+)
+
+# Index names of the agents whose names differ between the finetune data and the ask routes
+AGENT_ALIASES = {"computer_science": "compsci"}
+AGENT_NAME_RE = re.compile(r"[a-z][a-z0-9_]*")
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def document_id(question: str, answer: str) -> str:
+    return hashlib.sha1(f"{normalize_question(question)}\0{answer.strip()}".encode("utf-8")).hexdigest()[:16]
+
+def impact(tf: int, length: int, average_length: float) -> int:
+    """BM25 term-frequency component of one posting, quantized"""
+    norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length))
+    return max(1, round(norm * IMPACT_SCALE))
+
+def snippet(text: str, terms: Iterable[str], words: int = SNIPPET_WORDS) -> str:
+    """The `words`-word window of `text` holding the most query terms"""
+    tokens = text.split()
+    if len(tokens) <= words:
+        return " ".join(tokens)
+    wanted = set(terms)
+    hits = [1 if wanted.intersection(tokenize(token)) else 0 for token in tokens]
+    current = best = sum(hits[:words])
+    best_start = 0
+    for start in range(1, len(tokens) - words + 1):
+        current += hits[start + words - 1] - hits[start - 1]
+        if current > best:
+            best, best_start = current, start
+    prefix = "… " if best_start else ""
+    suffix = " …" if best_start + words < len(tokens) else ""
+    return prefix + " ".join(tokens[best_start:best_start + words]) + suffix
+
+class MemorySegment:
+    """Documents added since the last flush, searchable before they are written"""
+    def __init__(self):
+        self.documents: List[dict] = []
+        self.term_counts: List[Counter] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[int]] = {}
+        self.total_length = 0
+        self.created = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.documents)
+
+    def add(self, document: dict, tokens: List[str]) -> None:
+        local = len(self.documents)
+        counts = Counter(tokens)
+        self.documents.append(document)
+        self.term_counts.append(counts)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        for term in counts:
+            self.postings.setdefault(term, []).append(local)
+
+    def df(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def top_postings(self, term: str, limit: int) -> List[Tuple[int, int]]:
+        average = self.total_length / self.size
+        scored = [(impact(self.term_counts[doc][term], self.lengths[doc], average), doc) for doc in self.postings.get(term, ())]
+        return [(doc, value) for value, doc in heapq.nlargest(limit, scored)]
+
+    def document(self, local: int) -> dict:
+        return self.documents[local]
+
+def _map(path: str, typecode: str) -> memoryview:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(array(typecode))
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
+
+class DiskSegment:
+    """
+    An immutable segment, memory-mapped. Its files:
+
+    terms.bin / terms.idx: the sorted terms, UTF-8, and their uint64 start offsets (one extra at the end)
+    postings.idx: uint64 start of each term's postings (one extra at the end)
+    docs.bin / impacts.bin: uint32 local document numbers and uint16 impacts, each term's highest impact first
+    store.jsonl / store.idx: the documents and their uint64 start offsets
+    meta.json: document count and total length in tokens
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.size = meta["docs"]
+        self.total_length = meta["length"]
+        self._terms = _map(os.path.join(path, "terms.bin"), "B")
+        self._term_offsets = _map(os.path.join(path, "terms.idx"), "Q")
+        self._posting_offsets = _map(os.path.join(path, "postings.idx"), "Q")
+        self._docs = _map(os.path.join(path, "docs.bin"), "I")
+        self._impacts = _map(os.path.join(path, "impacts.bin"), "H")
+        self._store = _map(os.path.join(path, "store.jsonl"), "B")
+        self._store_offsets = _map(os.path.join(path, "store.idx"), "Q")
+
+    def _term(self, index: int) -> bytes:
+        return self._terms[self._term_offsets[index]:self._term_offsets[index + 1]].tobytes()
+
+    def _find(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        low, high = 0, len(self._term_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._term_offsets) - 1 and self._term(low) == key:
+            return low
+        return None
+
+    def df(self, term: str) -> int:
+        index = self._find(term)
+        return 0 if index is None else self._posting_offsets[index + 1] - self._posting_offsets[index]
+
+    def top_postings(self, term: str, limit: int) -> List[Tuple[int, int]]:
+        index = self._find(term)
+        if index is None:
+            return []
+        start = self._posting_offsets[index]
+        end = min(self._posting_offsets[index + 1], start + limit)
+        return list(zip(self._docs[start:end], self._impacts[start:end]))
+
+    def document(self, local: int) -> dict:
+        return json.loads(self._store[self._store_offsets[local]:self._store_offsets[local + 1]].tobytes())
+
+    def documents(self) -> Iterable[dict]:
+        for local in range(self.size):
+            yield self.document(local)
+
+def write_segment(path: str, segment: MemorySegment) -> None:
+    """Write a MemorySegment in the DiskSegment format, into a temporary directory renamed into place"""
+    temporary = path + ".tmp"
+    os.makedirs(temporary)
+    average = segment.total_length / segment.size
+    terms, term_offsets, posting_offsets = bytearray(), array("Q", [0]), array("Q", [0])
+    docs, impacts = array("I"), array("H")
+    for term in sorted(segment.postings, key=lambda t: t.encode("utf-8")):
+        ranked = sorted(
+            ((impact(segment.term_counts[doc][term], segment.lengths[doc], average), doc) for doc in segment.postings[term]),
+            key=lambda item: (-item[0], item[1]),
+        )
+        terms += term.encode("utf-8")
+        term_offsets.append(len(terms))
+        docs.extend(doc for _, doc in ranked)
+        impacts.extend(value for value, _ in ranked)
+        posting_offsets.append(len(docs))
+    store, store_offsets = bytearray(), array("Q", [0])
+    for document in segment.documents:
+        store += (json.dumps(document, ensure_ascii=False) + "\n").encode("utf-8")
+        store_offsets.append(len(store))
+
+    def save(name: str, data) -> None:
+        with open(os.path.join(temporary, name), "wb") as f:
+            if isinstance(data, array):
+                data.tofile(f)
+            else:
+                f.write(data)
+
+    save("terms.bin", bytes(terms))
+    save("terms.idx", term_offsets)
+    save("postings.idx", posting_offsets)
+    save("docs.bin", docs)
+    save("impacts.bin", impacts)
+    save("store.jsonl", bytes(store))
+    save("store.idx", store_offsets)
+    save("meta.json", json.dumps({"docs": segment.size, "length": segment.total_length}).encode("utf-8"))
+    os.rename(temporary, path)
+
+class SearchIndex:
+    """
+    BM25 full-text index of question/answer pairs in a directory, updated incrementally.
+
+    Added documents are searchable at once from memory and written as a new immutable segment
+    every `flush_docs` documents or `flush_seconds`, in a background thread; small segments are
+    merged as they accumulate. Several processes may share the directory: segment changes are
+    serialized with a file lock and each process picks them up on its next search, while a
+    process's unflushed documents are only visible to itself.
+
+    Postings are stored highest impact first and a query reads at most about `max_postings` of them
+    per term, shared by the segments, so very common terms cost bounded time at the price of possibly missing
+    low-scoring matches. Impacts use the average document length of their own segment.
+    """
+    def __init__(self, path: str, flush_docs: int = FLUSH_DOCS, flush_seconds: float = FLUSH_SECONDS,
+                 max_segments: int = MAX_SEGMENTS, max_postings: int = MAX_POSTINGS):
+        self.path = path
+        self.flush_docs = flush_docs
+        self.flush_seconds = flush_seconds
+        self.max_segments = max_segments
+        self.max_postings = max_postings
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._buffer = MemorySegment()
+        # Buffers being written, still searched until their segment is loaded
+        self._flushing: List[MemorySegment] = []
+        self._segments: Dict[str, DiskSegment] = {}
+        self._manifest_version = None
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+        self._refresh()
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def _read_manifest(self) -> List[str]:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)["segments"]
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self, segments: List[str]) -> None:
+        temporary = self._manifest_path() + f".{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"segments": segments}, f)
+        os.replace(temporary, self._manifest_path())
+
+    def _exclusive(self):
+        """Open and lock the directory's lock file; closing the returned file unlocks it"""
+        handle = open(os.path.join(self.path, LOCK_FILE), "a")
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _refresh(self) -> None:
+        """Load the segments listed in the manifest if it changed since the last look"""
+        try:
+            stat = os.stat(self._manifest_path())
+            version = (stat.st_mtime_ns, stat.st_ino)
+        except FileNotFoundError:
+            version = None
+        if version == self._manifest_version:
+            return
+        for attempt in range(3):
+            names = self._read_manifest()
+            try:
+                segments = {name: self._segments.get(name) or DiskSegment(os.path.join(self.path, name)) for name in names}
+                break
+            except FileNotFoundError:
+                # Merged away by another process between reading the manifest and opening it
+                if attempt == 2:
+                    raise
+        with self._lock:
+            self._segments = segments
+            self._manifest_version = version
+
+    def add(self, question: str, answer: str, source: str = "ask") -> bool:
+        """Index one question/answer pair; False if it was indexed recently or has no searchable words"""
+        tokens = tokenize(f"{question}\n{answer}")
+        if not tokens:
+            return False
+        doc_id = document_id(question, answer)
+        document = {"id": doc_id, "question": question, "answer": answer, "source": source,
+                    "time": datetime.now(timezone.utc).isoformat()}
+        with self._lock:
+            if doc_id in self._recent:
+                return False
+            self._recent[doc_id] = None
+            if len(self._recent) > RECENT_IDS:
+                self._recent.popitem(last=False)
+            self._buffer.add(document, tokens)
+            if self._buffer.size == 1:
+                # Written after flush_seconds even if no further document arrives
+                timer = threading.Timer(self.flush_seconds, self._flush_expired, args=(self._buffer,))
+                timer.daemon = True
+                timer.start()
+            due = self._buffer.size >= self.flush_docs or time.monotonic() - self._buffer.created >= self.flush_seconds
+            if due:
+                buffer = self._take_buffer()
+        if due:
+            self._writer.submit(self._write, buffer)
+        return True
+
+    def _take_buffer(self) -> MemorySegment:
+        buffer, self._buffer = self._buffer, MemorySegment()
+        self._flushing.append(buffer)
+        return buffer
+
+    def _flush_expired(self, buffer: MemorySegment) -> None:
+        with self._lock:
+            if buffer is not self._buffer or not buffer.size:
+                return
+            self._take_buffer()
+        self._writer.submit(self._write, buffer)
+
+    def flush(self) -> None:
+        """Write the buffered documents now and wait for every pending write"""
+        with self._lock:
+            buffer = self._take_buffer() if self._buffer.size else None
+        if buffer is not None:
+            self._writer.submit(self._write, buffer)
+        self._writer.submit(lambda: None).result()
+
+    def _write(self, buffer: MemorySegment) -> None:
+        name = f"seg-{time.time_ns():x}-{os.getpid()}"
+        try:
+            write_segment(os.path.join(self.path, name), buffer)
+            with self._exclusive():
+                self._write_manifest(self._read_manifest() + [name])
+            self._refresh()
+            if len(self._segments) > self.max_segments:
+                self._merge()
+        finally:
+            with self._lock:
+                self._flushing.remove(buffer)
+
+    def _merge(self) -> None:
+        """Merge the MERGE_FACTOR smallest segments into one by indexing their documents again"""
+        with self._exclusive():
+            names = self._read_manifest()
+            if len(names) <= self.max_segments:
+                return
+            segments = sorted((DiskSegment(os.path.join(self.path, name)) for name in names), key=lambda s: s.size)
+            merging = segments[:MERGE_FACTOR]
+            merged = MemorySegment()
+            for segment in merging:
+                for document in segment.documents():
+                    merged.add(document, tokenize(f"{document['question']}\n{document['answer']}"))
+            name = f"seg-{time.time_ns():x}-{os.getpid()}"
+            write_segment(os.path.join(self.path, name), merged)
+            removed = {segment.name for segment in merging}
+            self._write_manifest([n for n in names if n not in removed] + [name])
+        for segment in merging:
+            # Processes still mapping these files keep them until they refresh
+            shutil.rmtree(segment.path, ignore_errors=True)
+        self._refresh()
+
+    def search(self, query: str, k: int = 10) -> List[dict]:
+        """The `k` best matches: score, document fields and a snippet of the answer"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self._refresh()
+        with self._lock:
+            segments = list(self._segments.values()) + self._flushing + ([self._buffer] if self._buffer.size else [])
+        total_docs = sum(segment.size for segment in segments)
+        if not total_docs:
+            return []
+        scores: Dict[Tuple[int, int], float] = {}
+        for term in terms:
+            dfs = [segment.df(term) for segment in segments]
+            df = sum(dfs)
+            if not df:
+                continue
+            weight = math.log(1 + (total_docs - df + 0.5) / (df + 0.5)) / IMPACT_SCALE
+            for number, segment in enumerate(segments):
+                if not dfs[number]:
+                    continue
+                # The term's postings budget, shared by the segments in proportion to their matches
+                limit = -(-self.max_postings * dfs[number] // df)
+                for local, value in segment.top_postings(term, limit):
+                    key = (number, local)
+                    scores[key] = scores.get(key, 0.0) + weight * value
+        results = []
+        for (number, local), score in heapq.nlargest(k, scores.items(), key=lambda item: item[1]):
+            document = segments[number].document(local)
+            results.append({
+                "id": document["id"], "score": round(score, 4), "question": document["question"],
+                "snippet": snippet(document["answer"], terms), "source": document["source"], "time": document["time"],
+            })
+        return results
+
+    def stats(self) -> dict:
+        self._refresh()
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "documents": sum(segment.size for segment in self._segments.values()),
+                "buffered": self._buffer.size + sum(buffer.size for buffer in self._flushing),
+            }
+
+class UnknownAgent(ValueError):
+    """An agent name that has no index and may not get one"""
+
+class SearchIndexes:
+    """
+    One SearchIndex per agent, in subdirectories of `root`, created on first use.
+
+    Only the `agents` given (after AGENT_ALIASES) may get a new index; other names are accepted
+    only if their index already exists. Names are used as directory names, so anything but
+    lowercase letters, digits and underscores is refused.
+    """
+    def __init__(self, root: str, agents: Iterable[str] = (), **options):
+        self.root = root
+        self.known = frozenset(AGENT_ALIASES.get(agent, agent) for agent in agents)
+        self.options = options
+        self._indexes: Dict[str, SearchIndex] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def knows(self, agent: str) -> bool:
+        agent = AGENT_ALIASES.get(agent, agent)
+        if not AGENT_NAME_RE.fullmatch(agent):
+            return False
+        return agent in self.known or agent in self.agents()
+
+    def get(self, agent: str) -> SearchIndex:
+        """The agent's index; raises UnknownAgent for a name it may not have"""
+        if not self.knows(agent):
+            raise UnknownAgent(f"No search index for agent {agent!r}")
+        agent = AGENT_ALIASES.get(agent, agent)
+        with self._lock:
+            # Background writers do not survive a fork; a forked worker opens its own indexes
+            if self._pid != os.getpid():
+                self._indexes = {}
+                self._pid = os.getpid()
+            if agent not in self._indexes:
+                self._indexes[agent] = SearchIndex(os.path.join(self.root, agent), **self.options)
+            return self._indexes[agent]
+
+    def agents(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if AGENT_NAME_RE.fullmatch(name) and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def search(self, query: str, agents: List[str] = None, k: int = 10) -> List[dict]:
+        """Top `k` over the given agents' indexes (default: all), each result tagged with its agent"""
+        results = []
+        for agent in agents or self.agents():
+            results += [dict(result, agent=AGENT_ALIASES.get(agent, agent)) for result in self.get(agent).search(query, k)]
+        return heapq.nlargest(k, results, key=lambda result: result["score"])
+
+    def flush(self) -> None:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            index.flush()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the per-agent question/answer search indexes.")
+    parser.add_argument("--dir", default=os.getenv("ASK_SEARCH_DIR", "search_index"), help="Index root directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Index the pairs of an agent_finetune_data.json file")
+    ingest.add_argument("data", help="JSON of agent name -> list of {question, answer}")
+    query = commands.add_parser("query", help="Search the indexes")
+    query.add_argument("text")
+    query.add_argument("--agent", action="append", help="Agent to search (repeatable; default: all)")
+    query.add_argument("-k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        with open(args.data, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        indexes = SearchIndexes(args.dir, agents=[agent for agent in data if AGENT_NAME_RE.fullmatch(agent)], flush_docs=50000)
+        for agent, pairs in data.items():
+            if not indexes.knows(agent):
+                print(f"{agent}: skipped, not a valid agent name", file=sys.stderr)
+                continue
+            added = sum(indexes.get(agent).add(pair["question"], pair["answer"], source="finetune") for pair in pairs)
+            print(f"{agent}: {added} of {len(pairs)} pairs indexed")
+        indexes.flush()
+        return 0
+    indexes = SearchIndexes(args.dir)
+    unknown = [agent for agent in args.agent or [] if not indexes.knows(agent)]
+    if unknown:
+        print(f"No index for {', '.join(unknown)}", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    results = indexes.search(args.text, args.agent, args.k)
+    for result in results:
+        print(f"{result['score']:8.3f}  [{result['agent']}] {result['question']}\n          {result['snippet']}")
+    print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
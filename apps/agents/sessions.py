@@ -0,0 +1,192 @@
+from apps.agents.agent_utils import QuestionProfile, langchain_small_model
+from apps.agents.token_budget import count_tokens, token_counter
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import os
+import threading
+import time
+import uuid
+
+# Prompt tokens spent on conversation context: the running summary and the verbatim recent turns
+SUMMARY_TOKEN_BUDGET = 300
+RECENT_TOKEN_BUDGET = 1200
+MAX_RECENT_TURNS = 4
+MAX_SESSIONS = 10000
+SESSION_IDLE_SECONDS = 30 * 60
+
+SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation between a student and an assistant.
+Update the summary with the new exchanges below. Keep what the student is working on, what they already understood,
+definitions, results and notation that later questions may refer to, and anything they asked to be done differently.
+Use at most {words} words. Reply with the summary only.
+
+Current summary:
+{summary}
+
+New exchanges:
+{turns}"""
+
+def clip_to_tokens(text: str, budget: int) -> str:
+    """Keep the end of `text`, which holds the most recent content, within about `budget` tokens"""
+    return token_counter().trim(text, budget, keep="tail")
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"Student: {question}\nAssistant: {answer}" for question, answer in turns)
+
+def extractive_summary(summary: str, turns: List[Tuple[str, str]], budget: int) -> str:
+    """Summary without a model: the earlier questions, oldest dropped first once over budget"""
+    lines = [summary] if summary else []
+    lines += [f"Student asked: {question}" for question, _ in turns]
+    return clip_to_tokens("\n".join(lines), budget)
+
+class LLMSummarizer:
+    """Folds old turns into the running summary with the small model; falls back to extractive_summary"""
+    def __init__(self, model: str = langchain_small_model):
+        # Imported here so that sessions can be used and tested without the LLM stack
+        from langchain.prompts import ChatPromptTemplate
+        from langchain_groq import ChatGroq
+        self.template = ChatPromptTemplate.from_messages([("human", SUMMARY_PROMPT)])
+        self.llm = ChatGroq(model_name=model, api_key=os.getenv("GROQ_API_KEY"))
+
+    def __call__(self, summary: str, turns: List[Tuple[str, str]], budget: int) -> str:
+        try:
+            # About three words per four tokens, with headroom for the reply to run over
+            llm = self.llm.bind(max_tokens=budget)
+            response = (self.template | llm).invoke({
+                "summary": summary or "(none yet)",
+                "turns": format_turns(turns),
+                "words": int(budget * 0.6),
+            })
+            return clip_to_tokens(response.content.strip(), budget)
+        except Exception:
+            return extractive_summary(summary, turns, budget)
+
+class Session:
+    """
+    One conversation: recent turns kept verbatim and older turns compacted into a running summary.
+
+    The context handed to the agent is bounded by SUMMARY_TOKEN_BUDGET + RECENT_TOKEN_BUDGET
+    however long the conversation gets.
+    """
+    def __init__(self, session_id: str, topics: List[str]):
+        self.id = session_id
+        self.topics = topics
+        self.summary = ""
+        self.recent: deque = deque()
+        self.pending: List[Tuple[str, str]] = []
+        self.turn_count = 0
+        self.last_used = time.monotonic()
+        # Guards the summary and turns, which the summarizer thread updates
+        self.lock = threading.Lock()
+
+    def context(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the conversation so far:\n{self.summary}")
+        if self.pending:
+            # Turns waiting to be summarized, shown by their questions only
+            parts.append("Earlier questions:\n" + "\n".join(f"Student asked: {q}" for q, _ in self.pending))
+        if self.recent:
+            parts.append(f"Most recent exchanges:\n{format_turns(list(self.recent))}")
+        return "\n\n".join(parts)
+
+    def profile(self, question: str, topics: List[str] = None, details: str = "") -> QuestionProfile:
+        """The question with the conversation context prepended to its details"""
+        with self.lock:
+            context = self.context()
+        if context:
+            details = f"{context}\n\nThis is a follow-up question in the conversation above. {details}".strip()
+        return QuestionProfile(topics=topics or self.topics, question=question, details=details)
+
+    def add_turn(self, question: str, answer: str) -> bool:
+        """Record an exchange; returns True when older turns are waiting to be summarized"""
+        self.recent.append((question, clip_to_tokens(answer, RECENT_TOKEN_BUDGET // 2)))
+        self.turn_count += 1
+        while len(self.recent) > 1 and (
+            len(self.recent) > MAX_RECENT_TURNS or count_tokens(format_turns(list(self.recent))) > RECENT_TOKEN_BUDGET
+        ):
+            self.pending.append(self.recent.popleft())
+        return bool(self.pending)
+
+    def compact(self, summarizer: Callable[[str, List[Tuple[str, str]], int], str]) -> None:
+        """
+        Fold pending turns into the summary.
+
+        The summarizer runs without the lock; the pending turns stay in the context until the new
+        summary replaces them.
+        """
+        with self.lock:
+            turns, summary = list(self.pending), self.summary
+        if not turns:
+            return
+        summary = summarizer(summary, turns, SUMMARY_TOKEN_BUDGET)
+        with self.lock:
+            self.summary = summary
+            del self.pending[:len(turns)]
+
+class SessionStore:
+    """
+    In-memory sessions of one process, least recently used first out.
+
+    Sessions idle for `idle_seconds` are dropped, and the least recently used one is dropped when
+    more than `max_sessions` exist. Summaries are updated on a background thread after a turn is
+    answered, so they never add to response time.
+    """
+    def __init__(self, summarizer: Callable = None, max_sessions: int = MAX_SESSIONS,
+                 idle_seconds: float = SESSION_IDLE_SECONDS):
+        self._summarizer = summarizer
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-summary")
+
+    @property
+    def summarizer(self) -> Callable:
+        # Created on first use, so that no LLM client exists before a server forks
+        if self._summarizer is None:
+            self._summarizer = LLMSummarizer()
+        return self._summarizer
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+    def create(self, topics: List[str]) -> Session:
+        session = Session(uuid.uuid4().hex, topics)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict(session.last_used)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """The session, marked as used, or None if it does not exist or has expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def record(self, session: Session, question: str, answer: str) -> None:
+        """Add an answered turn and, if turns overflowed the recent window, summarize them in the background"""
+        with session.lock:
+            overflowed = session.add_turn(question, answer)
+        if overflowed:
+            self._executor.submit(self._compact, session)
+
+    def _compact(self, session: Session) -> None:
+        session.compact(self.summarizer)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
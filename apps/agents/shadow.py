@@ -0,0 +1,129 @@
+from apps.agents.agent_utils import AgentException, DeadlineExceeded, run_agent
+from apps.agents.rate_limit import RateLimiter
+from apps.agents.token_budget import count_tokens
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, List
+import json
+import os
+import random
+import threading
+import time
+
+# Candidate model (a new base model or a fine-tuned one) and the share of ask requests it shadows;
+# no model or a zero sample disables shadowing
+SHADOW_MODEL = os.getenv("ASK_SHADOW_MODEL", "")
+SHADOW_SAMPLE = float(os.getenv("ASK_SHADOW_SAMPLE", "0"))
+SHADOW_LOG = os.getenv("ASK_SHADOW_LOG", "shadow/shadow.jsonl")
+# Budget of the candidate's calls out of the API rate limit shared with live traffic, for the whole
+# server; each worker process gets an equal share
+SHADOW_RATE_PER_MINUTE = float(os.getenv("ASK_SHADOW_RATE_PER_MINUTE", 30))
+# Longest a candidate may take on one question
+SHADOW_TIMEOUT_SECONDS = 120.0
+
+class ShadowLog:
+    """Thread-safe JSONL log of shadowed requests, one record per line"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+class ShadowRunner:
+    """
+    Sends a sample of answered ask requests to a candidate model as well, off the response path.
+
+    `agents` creates the candidate's agents by route name (an AgentRegistry of agents built with `model`).
+    A request is shadowed after its live answer is ready, in a background thread, and only when
+    the sample picks it, a token of the `rate_per_minute` budget is free, fewer than `max_pending`
+    shadow calls are outstanding and the live agent has no queued requests (`busy`). Anything else
+    skips the shadow call instead of waiting, so live requests never wait on it. Each shadowed request
+    is logged with both answers, their latencies and token counts, and the candidate's error if any.
+    """
+    def __init__(self, agents, model: str, log: ShadowLog,
+                 sample: float = SHADOW_SAMPLE, rate_per_minute: float = SHADOW_RATE_PER_MINUTE,
+                 max_pending: int = 4, busy: Callable[[str], bool] = None, processes: int = 1):
+        self.agents = agents
+        self.model = model
+        self.log = log
+        self.sample = sample
+        # Each of the server's `processes` workers runs its own ShadowRunner, so the budget is split
+        # between them; together they stay within `rate_per_minute`. A rate of 0 disables shadowing
+        self.rate_per_minute = max(rate_per_minute, 0.0) / max(processes, 1)
+        self.limiter = RateLimiter(self.rate_per_minute, per=60.0) if self.rate_per_minute > 0 else None
+        self.max_pending = max_pending
+        self.busy = busy
+        self._executor = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {"shadowed": 0, "failed": 0, "skipped_rate": 0, "skipped_pending": 0, "skipped_busy": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.model) and self.sample > 0 and self.limiter is not None
+
+    def _skip(self, reason: str) -> bool:
+        with self._lock:
+            self.stats[f"skipped_{reason}"] += 1
+        return False
+
+    def submit(self, name: str, topics: List[str], question: str, details: str, answer: str, seconds: float) -> bool:
+        """Shadow one answered request if it is sampled and the budget allows; never blocks"""
+        if not self.enabled or name not in self.agents.factories or random.random() >= self.sample:
+            return False
+        if self.busy is not None and self.busy(name):
+            return self._skip("busy")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats["skipped_pending"] += 1
+                return False
+            self._pending += 1
+        if not self.limiter.try_acquire():
+            with self._lock:
+                self._pending -= 1
+            return self._skip("rate")
+        self._executor.submit(self._run, name, topics, question, details, answer, seconds)
+        return True
+
+    def _run(self, name: str, topics: List[str], question: str, details: str, answer: str, seconds: float) -> None:
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "agent": name,
+            "candidate_model": self.model,
+            "question": question,
+            "details": details,
+            "question_tokens": count_tokens(f"{question}\n{details}"),
+            "live": {"answer": answer, "latency_s": round(seconds, 3), "answer_tokens": count_tokens(answer)},
+        }
+        candidate = {"answer": None}
+        started = time.monotonic()
+        try:
+            candidate["answer"] = run_agent(self.agents.get(name), topics, question, details,
+                                            deadline=started + SHADOW_TIMEOUT_SECONDS)
+        except DeadlineExceeded as e:
+            candidate.update(answer=e.partial or None, error=str(e), truncated=True)
+        except AgentException as e:
+            candidate["error"] = str(e)
+        except Exception as e:
+            candidate["error"] = f"{type(e).__name__}: {e}"
+        candidate["latency_s"] = round(time.monotonic() - started, 3)
+        if candidate["answer"]:
+            candidate["answer_tokens"] = count_tokens(candidate["answer"], self.model)
+        record["candidate"] = candidate
+        try:
+            self.log.write(record)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.stats["shadowed"] += 1
+                self.stats["failed"] += "error" in candidate
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"model": self.model, "sample": self.sample, "rate_per_minute": self.rate_per_minute,
+                    "pending": self._pending, **self.stats}
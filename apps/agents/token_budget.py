@@ -0,0 +1,203 @@
+from apps.agents.agent_utils import AgentException
+from collections import deque
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import threading
+
+# Context window of each Groq model, prompt and answer together
+MODEL_CONTEXT_TOKENS = {
+    "llama3-70b-8192": 8192,
+    "llama3-8b-8192": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Llama 3's tokenizer is cl100k_base plus 28k extra tokens, so cl100k counts run slightly high for
+# non-English text and never much low; the margin covers the remaining difference
+MODEL_ENCODINGS = {
+    "llama3-70b-8192": "cl100k_base",
+    "llama3-8b-8192": "cl100k_base",
+}
+SAFETY_MARGIN = 0.05
+# Chat template tokens around each message (header, role, end of turn) and at the start of the prompt
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_PROMPT = 1
+
+class PromptTooLarge(AgentException):
+    """Raised when a question cannot be fitted into the model's context under the agent's policy"""
+    def __init__(self, message: str, prompt_tokens: int, limit: int):
+        super().__init__(message)
+        self.prompt_tokens = prompt_tokens
+        self.limit = limit
+
+class TokenCounter:
+    """
+    Counts tokens locally with tiktoken, or estimates them at four characters per token when
+    tiktoken (an optional dependency) or its encoding file is unavailable.
+    """
+    def __init__(self, encoding: str = "cl100k_base"):
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding)
+        except Exception:
+            self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is None:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def trim(self, text: str, budget: int, keep: str = "middle") -> str:
+        """
+        Cut `text` to about `budget` tokens, keeping its "head", its "tail" or both ends ("middle"
+        is cut out), with a marker where text was removed.
+        """
+        total = self.count(text)
+        if total <= budget:
+            return text
+        if self._encoding is None:
+            pieces, size = list(text), 4
+        else:
+            pieces, size = self._encoding.encode(text, disallowed_special=()), 1
+        join = "".join if self._encoding is None else self._encoding.decode
+        marker = f"\n[... {total - budget} tokens omitted ...]\n"
+        keep_pieces = max(budget * size - self.count(marker) * size, 0)
+        if keep == "head":
+            return join(pieces[:keep_pieces]) + marker
+        if keep == "tail":
+            return marker + join(pieces[len(pieces) - keep_pieces:])
+        head = keep_pieces // 2
+        return join(pieces[:head]) + marker + join(pieces[len(pieces) - (keep_pieces - head):])
+
+@lru_cache(maxsize=None)
+def token_counter(model: str = None) -> TokenCounter:
+    """Shared counter for a model's tokenizer, loaded on first use"""
+    return TokenCounter(MODEL_ENCODINGS.get(model, "cl100k_base"))
+
+def count_tokens(text: str, model: str = None) -> int:
+    return token_counter(model).count(text)
+
+def count_prompt_tokens(prompt, model: str = None) -> int:
+    """Tokens of a rendered chat prompt (a ChatPromptValue or a list of messages)"""
+    counter = token_counter(model)
+    messages = prompt.to_messages() if hasattr(prompt, "to_messages") else prompt
+    return TOKENS_PER_PROMPT + sum(TOKENS_PER_MESSAGE + counter.count(str(m.content)) for m in messages)
+
+def reported_prompt_tokens(message) -> Optional[int]:
+    """Prompt tokens the provider billed, from a response message or the last streamed chunk"""
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("input_tokens"):
+        return usage["input_tokens"]
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens")
+
+class BudgetPolicy:
+    """
+    How an agent handles long details.
+
+    Details over `max_detail_tokens` are trimmed (keeping `keep`: "head", "tail" or both ends with
+    "middle"); details over `reject_detail_tokens` are refused instead, if that is set. Answers
+    get at most `max_answer_tokens` and the question is refused if fewer than
+    `min_answer_tokens` would fit in the context.
+    """
+    def __init__(self, max_detail_tokens: int = 1500, reject_detail_tokens: int = None, keep: str = "middle",
+                 max_answer_tokens: int = 2048, min_answer_tokens: int = 256):
+        self.max_detail_tokens = max_detail_tokens
+        self.reject_detail_tokens = reject_detail_tokens
+        self.keep = keep
+        self.max_answer_tokens = max_answer_tokens
+        self.min_answer_tokens = min_answer_tokens
+
+class UsageMetrics:
+    """Thread-safe record of predicted against billed prompt tokens, and of trimmed and refused prompts"""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._counts = {"prompts": 0, "trimmed": 0, "rejected": 0, "reported": 0}
+        self._tokens = {"predicted": 0, "actual": 0, "trimmed_away": 0}
+        self._errors = deque(maxlen=window)
+
+    def record(self, predicted: int, actual: int = None, trimmed_tokens: int = 0) -> None:
+        with self._lock:
+            self._counts["prompts"] += 1
+            self._tokens["predicted"] += predicted
+            if trimmed_tokens:
+                self._counts["trimmed"] += 1
+                self._tokens["trimmed_away"] += trimmed_tokens
+            if actual:
+                self._counts["reported"] += 1
+                self._tokens["actual"] += actual
+                self._errors.append((predicted - actual) / actual)
+
+    def record_rejected(self) -> None:
+        with self._lock:
+            self._counts["rejected"] += 1
+
+    def snapshot(self) -> dict:
+        """Counts, token totals and the relative error of the local count against the billed one"""
+        with self._lock:
+            counts, tokens, errors = dict(self._counts), dict(self._tokens), sorted(self._errors)
+        accuracy = None
+        if errors:
+            accuracy = {
+                "mean_error": round(sum(errors) / len(errors), 4),
+                "max_abs_error": round(max(abs(e) for e in errors), 4),
+                "p50_error": round(errors[len(errors) // 2], 4),
+            }
+        return {"counts": counts, "tokens": tokens, "prediction": accuracy, "exact_tokenizer": token_counter().exact}
+
+usage_metrics = UsageMetrics()
+
+class PromptBudget:
+    """
+    Pre-flight check of one agent's prompts against its model's context window.
+
+    prepare() renders the prompt, trims or refuses oversized details per the policy and binds
+    `max_tokens` to what is left of the context; record() compares the prediction with the
+    usage the provider reports.
+    """
+    def __init__(self, model: str, policy: BudgetPolicy = None, metrics: UsageMetrics = None):
+        self.model = model
+        self.policy = policy or BudgetPolicy()
+        self.metrics = metrics or usage_metrics
+        self.context_tokens = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+    def _reject(self, message: str, prompt_tokens: int, limit: int):
+        self.metrics.record_rejected()
+        raise PromptTooLarge(message, prompt_tokens, limit)
+
+    def prepare(self, template, llm, inputs: dict) -> Tuple[object, object, int, int]:
+        """Returns the rendered prompt, the model bound with max_tokens, the predicted prompt tokens and the tokens trimmed"""
+        counter = token_counter(self.model)
+        policy = self.policy
+        details = inputs.get("details") or ""
+        detail_tokens = counter.count(details)
+        trimmed = 0
+        if policy.reject_detail_tokens is not None and detail_tokens > policy.reject_detail_tokens:
+            self._reject(f"The additional details are too long ({detail_tokens} tokens, at most "
+                         f"{policy.reject_detail_tokens}). Please shorten them to the relevant part.",
+                         detail_tokens, policy.reject_detail_tokens)
+        if detail_tokens > policy.max_detail_tokens:
+            inputs = {**inputs, "details": counter.trim(details, policy.max_detail_tokens, policy.keep)}
+            trimmed = detail_tokens - policy.max_detail_tokens
+
+        prompt = template.invoke(inputs)
+        predicted = count_prompt_tokens(prompt, self.model)
+        # Room left for the answer, less the margin for tokenizer differences
+        available = int(self.context_tokens * (1 - SAFETY_MARGIN)) - predicted
+        if available < policy.min_answer_tokens:
+            self._reject(f"The question is too long for the model ({predicted} prompt tokens, "
+                         f"context of {self.context_tokens}).", predicted, self.context_tokens - policy.min_answer_tokens)
+        return prompt, llm.bind(max_tokens=min(policy.max_answer_tokens, available)), predicted, trimmed
+
+    def record(self, predicted: int, trimmed: int, messages: List) -> None:
+        """Record usage for a call, given its response message or streamed chunks"""
+        actual = None
+        for message in reversed(messages):
+            actual = reported_prompt_tokens(message)
+            if actual:
+                break
+        self.metrics.record(predicted, actual, trimmed)
@@ -0,0 +1,179 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+# Fraction of requests traced (0 disables tracing), where traces go, and the request duration after
+# which a CPU profile of the process is captured (unset disables profiling)
+TRACE_SAMPLE_RATE = float(os.getenv("ASK_TRACE_SAMPLE", "0"))
+TRACE_DIR = os.getenv("ASK_TRACE_DIR", "traces")
+SLOW_REQUEST_SECONDS = float(os.environ["ASK_SLOW_PROFILE_SECONDS"]) if os.getenv("ASK_SLOW_PROFILE_SECONDS") else None
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 60.0
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_write_lock = threading.Lock()
+
+class _NoSpan:
+    """Shared do-nothing context manager returned by span() when the request is not traced"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+class Trace:
+    """Spans of one sampled request, as Chrome trace events ("X" complete events, microseconds)"""
+    def __init__(self, name: str):
+        self.name = name
+        self.events: List[dict] = []
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.events.append({
+                "name": name, "ph": "X", "ts": start // 1000, "dur": (time.perf_counter_ns() - start) // 1000,
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": args,
+            })
+
+def span(name: str, **args):
+    """Time a block as a span of the current request's trace; nearly free when it is not sampled"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return trace.span(name, **args)
+
+def trace_path(directory: str = None) -> str:
+    """One file per process, so pre-forked workers never interleave writes"""
+    return os.path.join(directory or TRACE_DIR, f"trace-{os.getpid()}.json")
+
+def write_events(events: List[dict], directory: str = None) -> None:
+    """
+    Append events to this process's trace file in Chrome's JSON array format.
+
+    The array is left open, which chrome://tracing and Perfetto accept, so each request is a
+    plain append.
+    """
+    path = trace_path(directory)
+    with _write_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        new = not os.path.exists(path)
+        with open(path, "a", encoding="utf-8") as f:
+            if new:
+                f.write("[\n")
+            for event in events:
+                f.write(json.dumps(event) + ",\n")
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval from a background thread.
+
+    The result is written in the folded-stack format read by flamegraph.pl and speedscope.
+    """
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class _SlowRequestWatch:
+    """Starts a StackSampler on the request's thread once it has run for `threshold` seconds"""
+    def __init__(self, name: str, threshold: float):
+        self.name = name
+        self.sampler = None
+        self._thread_id = threading.get_ident()
+        # The timer may fire while finish() runs; the lock and flag keep a sampler from starting after it
+        self._lock = threading.Lock()
+        self._finished = False
+        self._timer = threading.Timer(threshold, self._start_sampler)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _start_sampler(self) -> None:
+        with self._lock:
+            if self._finished:
+                return
+            self.sampler = StackSampler(self._thread_id)
+            self.sampler.start()
+
+    def finish(self, directory: str = None) -> Optional[str]:
+        """Stop watching; returns the profile path if the request turned out slow"""
+        self._timer.cancel()
+        with self._lock:
+            self._finished = True
+        if self.sampler is None:
+            return None
+        self.sampler.stop()
+        safe_name = "".join(c if c.isalnum() else "_" for c in self.name).strip("_")
+        path = os.path.join(directory or TRACE_DIR, f"profile-{os.getpid()}-{int(time.time() * 1000)}-{safe_name}.folded")
+        self.sampler.write(path)
+        return path
+
+@contextmanager
+def start_trace(name: str, sample_rate: float = None, slow_seconds: float = None, directory: str = None):
+    """
+    Trace one request: sample it at `sample_rate`, and profile it if it outlives `slow_seconds`.
+
+    Defaults come from ASK_TRACE_SAMPLE and ASK_SLOW_PROFILE_SECONDS. With neither enabled this
+    costs one random number.
+    """
+    sample_rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    slow_seconds = SLOW_REQUEST_SECONDS if slow_seconds is None else slow_seconds
+    trace = Trace(name) if sample_rate > 0 and random.random() < sample_rate else None
+    watch = _SlowRequestWatch(name, slow_seconds) if slow_seconds else None
+    if trace is None and watch is None:
+        yield None
+        return
+
+    token = _current_trace.set(trace)
+    try:
+        if trace is None:
+            yield None
+        else:
+            with trace.span(name):
+                yield trace
+    finally:
+        _current_trace.reset(token)
+        profile = watch.finish(directory) if watch else None
+        if trace is not None:
+            if profile:
+                trace.events[-1]["args"]["cpu_profile"] = profile
+            write_events(trace.events, directory)
@@ -1,74 +1,341 @@
-from flask import Flask, Request, request, jsonify
-from typing import List
+from flask import Flask, Request, Response, request, jsonify, stream_with_context
+from typing import Callable, Dict, List
 from flask_cors import CORS
 from apps.agents.math_agent_langchain import MathAgent
 from apps.agents.compsci_agent_langchain import CompSciAgent
 from apps.agents.physics_agent_langchain import PhysicsAgent
-from apps.agents.agent_utils import run_agent
-
-app = Flask(__name__)
-# Enable CORS for all routes
-CORS(app)
-math_agent = MathAgent()
-cs_agent = CompSciAgent()
-phys_agent = PhysicsAgent()
-
-@app.route("/math/ask", methods=["POST"])
-def ask_math() -> jsonify:
-    try:
-        req: Request = request
-        data: dict = req.json
-        
-        question: str = data.get("question", "")
-        topics: List[str] = data.get("topics", [])
-        details: str = data.get("details", "")
-
-        if not question or not topics:
-            return jsonify({"error": f"Missing required fields. Received following request load: {data}"}), 400
-        
-        response = run_agent(math_agent, topics, question, details)
-
-        return jsonify({"answer": response}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-@app.route("/compsci/ask", methods=["POST"])
-def ask_compsci() -> jsonify:
-    try:
-        req: Request = request
-        data: dict = req.json
-        
-        question: str = data.get("question", "")
-        topics: List[str] = data.get("topics", [])
-        details: str = data.get("details", "")
-
-        if not question or not topics:
-            return jsonify({"error": f"Missing required fields. Received following request load: {data}"}), 400
-        
-        response = run_agent(cs_agent, topics, question, details)
-
-        return jsonify({"answer": response}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-@app.route("/physics/ask", methods=["POST"])
-def ask_physics() -> jsonify:
-    try:
-        req: Request = request
-        data: dict = req.json
-        
-        question: str = data.get("question", "")
-        topics: List[str] = data.get("topics", [])
-        details: str = data.get("details", "")
-
-        if not question or not topics:
-            return jsonify({"error": f"Missing required fields. Received following request load: {data}"}), 400
-        
-        response = run_agent(phys_agent, topics, question, details)
-
-        return jsonify({"answer": response}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+from apps.agents.agent_utils import Agent, AgentException, DeadlineExceeded, QuestionProfile, run_agent
+from apps.agents.tracing import span, start_trace
+from apps.agents.sessions import SessionStore
+from apps.agents.token_budget import PromptTooLarge, usage_metrics
+from apps.agents.rendering import render_answer, render_cache
+from apps.agents.fanout import AnswerMerger, agent_deadline, fan_out, merge_results, run_agents
+from apps.agents.circuit_breaker import AnswerCache, CircuitOpen, breaker_states
+from apps.agents.scheduler import AgentScheduler, Saturated, ScheduledAgent, classify
+from apps.agents.shadow import SHADOW_LOG, SHADOW_MODEL, ShadowLog, ShadowRunner
+from apps.agents.search_index import SearchIndexes
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from apps.agents.cascade import DEFAULT_THRESHOLD, CascadeAgent, RoutingMetrics
+import gc
+import json
+import os
+import threading
+import time
+
+# Route prefix -> agent class served at /<prefix>/ask
+AGENT_CLASSES: Dict[str, Callable[[], Agent]] = {
+    "math": MathAgent,
+    "compsci": CompSciAgent,
+    "physics": PhysicsAgent,
+}
+
+class AgentRegistry:
+    """
+    Creates each agent, and with it its LLM client, on first use in the current process.
+
+    Clients hold sockets and connection pools that must not be shared across a fork, so a
+    registry inherited by a forked worker starts empty and builds its own.
+    """
+    def __init__(self, factories: Dict[str, Callable[[], Agent]]):
+        self.factories = factories
+        self._lock = threading.Lock()
+        self._agents: Dict[str, Agent] = {}
+        self._pid = os.getpid()
+
+    def get(self, name: str) -> Agent:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._agents = {}
+                self._pid = os.getpid()
+            if name not in self._agents:
+                self._agents[name] = self.factories[name]()
+            return self._agents[name]
+
+def preload() -> None:
+    """
+    Prepare shared read-only state in the parent of a pre-forking server.
+
+    Prompt templates are built when the agent modules are imported; freezing the heap afterwards
+    keeps the garbage collector from touching (and so copying) those pages in every worker.
+    """
+    gc.collect()
+    gc.freeze()
+
+# Header carrying the client's timeout in seconds; a "timeout" body field works the same way
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+def request_deadline(req: Request, data: dict, default_timeout: float = None):
+    """time.monotonic() deadline from the request's timeout (header first, then body), or None"""
+    timeout = req.headers.get(TIMEOUT_HEADER) or data.get("timeout") or default_timeout
+    if timeout is None:
+        return None
+    timeout = float(timeout)
+    if timeout <= 0:
+        raise ValueError("timeout must be a positive number of seconds")
+    return time.monotonic() + timeout
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+def create_app(agent_classes: Dict[str, Callable[[], Agent]] = None, cascade: bool = None, escalate: bool = None) -> Flask:
+    """
+    Build the ask endpoints app. Agents are created lazily per process by an AgentRegistry.
+
+    With `cascade` (default: ASK_CASCADE, on) easy questions go to the small model; `escalate`
+    (default: ASK_CASCADE_ESCALATE, off) retries answers that fail basic checks on the large one.
+    """
+    app = Flask(__name__)
+    # Enable CORS for all routes
+    CORS(app)
+    agent_classes = agent_classes or AGENT_CLASSES
+    cascade = _env_flag("ASK_CASCADE", True) if cascade is None else cascade
+    escalate = _env_flag("ASK_CASCADE_ESCALATE", False) if escalate is None else escalate
+    threshold = float(os.getenv("ASK_CASCADE_THRESHOLD", DEFAULT_THRESHOLD))
+    # Applies to requests that do not set their own timeout
+    default_timeout = float(os.environ["ASK_DEFAULT_TIMEOUT"]) if os.getenv("ASK_DEFAULT_TIMEOUT") else None
+    routing_metrics = RoutingMetrics()
+    # The candidate model answers with the plain agent classes, without the cascade
+    shadow_agents = AgentRegistry({name: (lambda cls=cls: cls(model=SHADOW_MODEL)) for name, cls in agent_classes.items()})
+    if cascade:
+        agent_classes = {
+            name: (lambda cls=cls: CascadeAgent(cls, threshold=threshold, escalate=escalate, metrics=routing_metrics))
+            for name, cls in agent_classes.items()
+        }
+    registry = AgentRegistry(agent_classes)
+    app.extensions["agent_registry"] = registry
+    sessions = SessionStore(
+        max_sessions=int(os.getenv("ASK_MAX_SESSIONS", 10000)),
+        idle_seconds=float(os.getenv("ASK_SESSION_IDLE_SECONDS", 30 * 60)),
+    )
+    app.extensions["sessions"] = sessions
+    # Per-agent concurrency, queue bound and priority classes for every request of this worker
+    scheduler = AgentScheduler(
+        concurrency=int(os.getenv("ASK_AGENT_CONCURRENCY", 16)),
+        max_queue=int(os.getenv("ASK_QUEUE_LIMIT", 64)),
+        background_share=float(os.getenv("ASK_BACKGROUND_SHARE", 0.5)),
+    )
+    # The shadow rate budget is for the whole server, split between its worker processes
+    shadow = ShadowRunner(shadow_agents, SHADOW_MODEL, ShadowLog(SHADOW_LOG), busy=scheduler.busy,
+                          processes=int(os.getenv("ASK_WORKERS", 1)))
+    app.extensions["shadow"] = shadow
+    # Full-text index of the answers given, per agent, shared with the finetune endpoint's ingest
+    search_indexes = SearchIndexes(os.getenv("ASK_SEARCH_DIR", "search_index"), agents=registry.factories)
+    index_answers = _env_flag("ASK_SEARCH_INDEX_ANSWERS", True)
+    app.extensions["search_indexes"] = search_indexes
+    # Last good answer per question, served with "stale": true while a model's circuit breaker is open
+    answer_cache = AnswerCache(int(os.getenv("ASK_ANSWER_CACHE_SIZE", 10000)))
+
+    def make_view(name: str):
+        def ask() -> jsonify:
+            with start_trace(f"POST /{name}/ask"):
+                return handle()
+
+        def handle() -> jsonify:
+            try:
+                req: Request = request
+                data: dict = req.json
+
+                question: str = data.get("question", "")
+                topics: List[str] = data.get("topics", [])
+                details: str = data.get("details", "")
+
+                # Follow-ups name their session and may leave out the topics
+                session = None
+                if data.get("session_id"):
+                    session = sessions.get(data["session_id"])
+                    if session is None:
+                        return jsonify({"error": "Unknown or expired session", "session_id": data["session_id"]}), 404
+                    topics = topics or session.topics
+
+                if not question or not topics:
+                    return jsonify({"error": f"Missing required fields. Received following request load: {data}"}), 400
+
+                if session is None and data.get("session"):
+                    session = sessions.create(topics)
+                if session is not None:
+                    profile = session.profile(question, topics, details)
+                    topics, details = profile.topics, profile.details
+
+                try:
+                    deadline = request_deadline(req, data, default_timeout)
+                except ValueError as e:
+                    return jsonify({"error": f"Invalid timeout: {str(e)}"}), 400
+
+                extra = {"session_id": session.id} if session is not None else {}
+                # "render": "html" adds the answer as HTML with math as MathML and code highlighted
+                render_html = (data.get("render") or req.args.get("render")) == "html"
+                priority, score = classify(data, req.headers)
+                agent = ScheduledAgent(registry.get(name), scheduler, name, priority, score)
+                started = time.monotonic()
+                try:
+                    response = run_agent(agent, topics, question, details, deadline=deadline)
+                except DeadlineExceeded as e:
+                    if e.partial:
+                        if session is not None:
+                            sessions.record(session, question, e.partial)
+                        if render_html:
+                            with span("render html"):
+                                extra["html"] = render_answer(e.partial)
+                        return jsonify({"answer": e.partial, "truncated": True, **extra}), 200
+                    return jsonify({"error": str(e), "truncated": False, **extra}), 504
+                except PromptTooLarge as e:
+                    return jsonify({"error": str(e), "prompt_tokens": e.prompt_tokens, "limit": e.limit, **extra}), 413
+                except Saturated as e:
+                    return jsonify({"error": str(e), "retry_after": e.retry_after, **extra}), 503, {"Retry-After": str(int(e.retry_after + 0.5))}
+                except CircuitOpen as e:
+                    cached = answer_cache.lookup(name, topics, question, details)
+                    if cached is None:
+                        retry_after = str(int(e.retry_after + 0.5))
+                        return jsonify({"error": str(e), "retry_after": e.retry_after, **extra}), 503, {"Retry-After": retry_after}
+                    answer, stored_at = cached
+                    if render_html:
+                        extra["html"] = render_answer(answer)
+                    return jsonify({
+                        "answer": answer, "stale": True, "age_s": round(time.time() - stored_at),
+                        "cached_at": datetime.fromtimestamp(stored_at, timezone.utc).isoformat(), **extra,
+                    }), 200
+                except AgentException as e:
+                    # The model provider failed or timed out on this request
+                    return jsonify({"error": str(e), **extra}), 502
+
+                if session is not None:
+                    sessions.record(session, question, response)
+                answer_cache.store(name, topics, question, details, response)
+                shadow.submit(name, topics, question, details, response, time.monotonic() - started)
+                if index_answers:
+                    search_indexes.get(name).add(question, response)
+                if render_html:
+                    with span("render html"):
+                        extra["html"] = render_answer(response)
+                with span("encode response"):
+                    return jsonify({"answer": response, **extra}), 200
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        ask.__name__ = f"ask_{name}"
+        return ask
+
+    for name in registry.factories:
+        app.add_url_rule(f"/{name}/ask", view_func=make_view(name), methods=["POST"])
+
+    # Shared by all fan-out requests of a worker; the merger's LLM client is created per process like the agents'
+    fanout_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ASK_FANOUT_THREADS", 32)), thread_name_prefix="fan-out")
+    mergers = AgentRegistry({"merge": AnswerMerger})
+
+    @app.route("/multi/ask", methods=["POST"])
+    def ask_many() -> jsonify:
+        """
+        Ask several agents ("agents": names of the /<name>/ask routes) the same question at once.
+        With "merge", their answers are also combined into one; with "stream", results are sent
+        as newline-delimited JSON as each agent finishes.
+        """
+        with start_trace("POST /multi/ask"):
+            try:
+                req: Request = request
+                data: dict = req.json
+
+                question: str = data.get("question", "")
+                topics: List[str] = data.get("topics", [])
+                details: str = data.get("details", "")
+                names: List[str] = data.get("agents", [])
+
+                if not question or not topics or not names:
+                    return jsonify({"error": f"Missing required fields. Received following request load: {data}"}), 400
+                unknown = [n for n in names if n not in registry.factories]
+                if unknown:
+                    return jsonify({"error": f"Unknown agents: {', '.join(unknown)}. Available: {', '.join(registry.factories)}"}), 400
+
+                try:
+                    deadline = request_deadline(req, data, default_timeout)
+                except ValueError as e:
+                    return jsonify({"error": f"Invalid timeout: {str(e)}"}), 400
+
+                priority, score = classify(data, req.headers)
+                agents = {n: ScheduledAgent(registry.get(n), scheduler, n, priority, score) for n in dict.fromkeys(names)}
+                merger = mergers.get("merge") if data.get("merge") else None
+                if not data.get("stream"):
+                    response = run_agents(agents, topics, question, details, deadline, merger, fanout_executor)
+                    with span("encode response"):
+                        return jsonify(response), 200
+
+                profile = QuestionProfile(topics=topics, question=question, details=details)
+
+                def events():
+                    results = []
+                    for result in fan_out(agents, profile, agent_deadline(deadline, merger is not None), fanout_executor):
+                        results.append(result)
+                        yield json.dumps({"event": "answer", **result.to_dict()}) + "\n"
+                    if merger is not None:
+                        yield json.dumps({"event": "merged", **merge_results(merger, profile, results, deadline)}) + "\n"
+                    yield json.dumps({"event": "done"}) + "\n"
+
+                return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+
+    @app.route("/search", methods=["GET"])
+    def search() -> jsonify:
+        """
+        BM25 search over stored questions and answers: "q" is the query, "agent" (repeatable)
+        limits it to those agents and "k" (default 10, at most 100) is the number of results.
+        """
+        query = request.args.get("q", "")
+        if not query.strip():
+            return jsonify({"error": "Missing query parameter q"}), 400
+        try:
+            k = int(request.args.get("k", 10))
+        except ValueError:
+            return jsonify({"error": "k must be an integer"}), 400
+        if not 1 <= k <= 100:
+            return jsonify({"error": "k must be between 1 and 100"}), 400
+        agents = request.args.getlist("agent")
+        unknown = [agent for agent in agents if not search_indexes.knows(agent)]
+        if unknown:
+            return jsonify({"error": f"Unknown agents: {', '.join(unknown)}. Available: {', '.join(sorted(search_indexes.known | set(search_indexes.agents())))}"}), 400
+        started = time.perf_counter()
+        results = search_indexes.search(query, agents or None, k)
+        return jsonify({"results": results, "took_ms": round((time.perf_counter() - started) * 1000, 2)}), 200
+
+    @app.route("/sessions/<session_id>", methods=["DELETE"])
+    def end_session(session_id: str) -> jsonify:
+        """Forget a conversation before it expires"""
+        if not sessions.delete(session_id):
+            return jsonify({"error": "Unknown or expired session"}), 404
+        return jsonify({"deleted": session_id}), 200
+
+    @app.route("/metrics/routing", methods=["GET"])
+    def routing() -> jsonify:
+        """Cascade routing counts and latency for this worker process"""
+        return jsonify({"cascade": cascade, "escalate": escalate, "threshold": threshold, **routing_metrics.snapshot()}), 200
+
+    @app.route("/metrics/tokens", methods=["GET"])
+    def tokens() -> jsonify:
+        """Locally predicted against billed prompt tokens, and trimmed or refused prompts, for this worker process"""
+        return jsonify(usage_metrics.snapshot()), 200
+
+    @app.route("/metrics/scheduler", methods=["GET"])
+    def scheduling() -> jsonify:
+        """Running and queued requests per agent and class, shed requests and queue waits for this worker"""
+        return jsonify(scheduler.snapshot()), 200
+
+    @app.route("/metrics/shadow", methods=["GET"])
+    def shadowing() -> jsonify:
+        """Candidate model, sample and counts of shadowed, failed and skipped requests for this worker"""
+        return jsonify(shadow.snapshot()), 200
+
+    @app.route("/metrics/breakers", methods=["GET"])
+    def breakers() -> jsonify:
+        """State and counters of this worker's circuit breaker for each model"""
+        return jsonify(breaker_states()), 200
+
+    @app.route("/metrics/render", methods=["GET"])
+    def rendered() -> jsonify:
+        """Size and hit rate of this worker's cache of rendered answers"""
+        return jsonify(render_cache.snapshot()), 200
+
+    return app
 
 if __name__ == "__main__":
+    # Only for the development server; apps.endpoints.serve creates the app once per server
+    app = create_app()
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -1,10 +1,17 @@
 from flask import Flask, request, jsonify
 from collections import defaultdict
 from apps.endpoints.endpoint_utils import *
+from apps.agents.search_index import SearchIndexes
+from apps.agents.dataset_snapshots import SnapshotStore
+from apps.endpoints.ask_endpoints import AGENT_CLASSES
 import json
 import os
 
 app = Flask(__name__)
+# The same indexes the ask endpoints search; pairs of agents they do not serve are stored but not indexed
+search_indexes = SearchIndexes(os.getenv("ASK_SEARCH_DIR", "search_index"), agents=AGENT_CLASSES)
+# Versioned copies of the corpus; a fine-tune run trains on the pairs added since the "finetuned" ref
+snapshots = SnapshotStore(os.getenv("ASK_DATASET_DIR", "datasets"))
 
 def load_agent_data():
     """Load stored agent data from file if it exists."""
@@ -31,6 +38,9 @@ def finetune_all():
 
         # Load existing stored data
         agent_data = load_agent_data()
+        # Pairs new to the corpus, snapshotted by appending to the latest snapshot's last chunks
+        additions = {}
+        known = {}
 
         # Process new entries
         for entry in data["data"]:
@@ -42,11 +52,29 @@ def finetune_all():
                 continue  # Skip invalid entries
 
             agent_data.setdefault(agent_name, []).append({"question": question, "answer": answer})
+            if agent_name not in known:
+                known[agent_name] = {(pair.get("question"), pair.get("answer")) for pair in agent_data[agent_name][:-1]}
+            if (question, answer) not in known[agent_name]:
+                known[agent_name].add((question, answer))
+                additions.setdefault(agent_name, []).append({"question": question, "answer": answer})
+            if search_indexes.knows(agent_name):
+                search_indexes.get(agent_name).add(question, answer, source="finetune")
 
         # Save updated data
         save_agent_data(agent_data)
+        # Written now, so the ask endpoints' processes find the new pairs on their next search
+        search_indexes.flush()
 
-        return jsonify({"status": "Success! In the future, this will represent a succesful fine-tuning operation but for now it is a placeholder.", "errors": None}), 200
+        # Both cost in proportion to the new pairs, not the corpus
+        snapshot = snapshots.append(additions, source="finetune") if snapshots.resolve("latest") else snapshots.commit(agent_data, source="finetune")
+        new_pairs = snapshots.count_new("finetuned", snapshot["id"])
+
+        return jsonify({
+            "status": "Success! In the future, this will represent a succesful fine-tuning operation but for now it is a placeholder.",
+            "errors": None,
+            "snapshot": snapshot["id"],
+            "new_pairs": new_pairs,
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,55 @@
+from apps.endpoints.ask_endpoints import create_app, preload
+import argparse
+import os
+import sys
+
+DEFAULT_BIND = "0.0.0.0:5000"
+DEFAULT_WORKERS = 2
+DEFAULT_THREADS = 4
+DEFAULT_TIMEOUT = 120
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Command line options, each defaulting to an ASK_* environment variable"""
+    parser = argparse.ArgumentParser(description="Run the ask endpoints under a pre-forking multi-process server.")
+    parser.add_argument("--bind", default=os.getenv("ASK_BIND", DEFAULT_BIND))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ASK_WORKERS", DEFAULT_WORKERS)),
+                        help="Worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("ASK_THREADS", DEFAULT_THREADS)),
+                        help="Request threads per worker; LLM calls mostly wait on the network")
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("ASK_TIMEOUT", DEFAULT_TIMEOUT)),
+                        help="Seconds before a silent worker is restarted")
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Load the app in each worker instead of once in the parent")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # create_app reads it to split per-server budgets, such as the shadow rate, between the workers
+    os.environ["ASK_WORKERS"] = str(args.workers)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("gunicorn is required for the production server: pip install gunicorn", file=sys.stderr)
+        return 1
+
+    class AskServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", args.bind)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", args.timeout)
+            # With preload the app, agent modules and prompt templates are built once in the
+            # parent and shared copy-on-write; LLM clients are still created in each worker
+            self.cfg.set("preload_app", not args.no_preload)
+
+        def load(self):
+            app = create_app()
+            preload()
+            return app
+
+    AskServer().run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
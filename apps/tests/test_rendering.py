@@ -0,0 +1,61 @@
+from html.parser import HTMLParser
+import pytest
+
+pytest.importorskip("latex2mathml")
+pytest.importorskip("markdown_it")
+
+from apps.agents.rendering import UnsafeMathML, render_markdown, sanitize_mathml
+
+PAYLOADS = [
+    r"$\text{<img src=x onerror=alert(1)>}$",
+    r'$\text{<img src="x" onerror="alert(1)"/>}$',
+    r"$\text{<img/>}$",
+    r"$\text{<script>alert(1)</script>}$",
+    r"$\href{javascript:alert(1)}{x}$",
+    r"$$\href{javascript:alert(1)}{\frac{1}{2}}$$",
+    r"$\text{<!DOCTYPE x [<!ENTITY a 'b'>]>}$",
+]
+
+class TagCollector(HTMLParser):
+    """The elements and attributes a browser would build from the HTML; escaped text is not among them"""
+    def __init__(self):
+        super().__init__()
+        self.tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.append((tag, dict(attrs)))
+
+    handle_startendtag = handle_starttag
+
+@pytest.mark.parametrize("answer", PAYLOADS)
+def test_math_payloads_do_not_reach_html(answer):
+    collector = TagCollector()
+    collector.feed(render_markdown(answer))
+    for tag, attrs in collector.tags:
+        assert tag not in ("img", "script")
+        assert not [name for name in attrs if name.startswith("on") or name in ("href", "src", "style")]
+
+def test_href_is_dropped_but_math_kept():
+    html = render_markdown(r"$\href{javascript:alert(1)}{x}$")
+    assert "<math" in html and "<mi>x</mi>" in html
+    assert "href" not in html
+
+def test_plain_math_still_renders():
+    html = render_markdown(r"$$x^2 \ne y$$ and $\alpha$")
+    assert html.count("<math") == 2
+    assert "<msup>" in html
+
+def test_sanitizer_rejects_non_mathml():
+    with pytest.raises(UnsafeMathML):
+        sanitize_mathml("<div onclick='x'></div>")
+    with pytest.raises(UnsafeMathML):
+        sanitize_mathml('<math xmlns="http://www.w3.org/1998/Math/MathML"><mtext><img src=x></mtext></math>')
+
+def test_sanitizer_drops_unknown_elements_and_attributes():
+    mathml = sanitize_mathml(
+        '<math xmlns="http://www.w3.org/1998/Math/MathML" display="inline">'
+        '<mrow href="javascript:alert(1)" onclick="x"><mi style="x">a</mi><img src="x" onerror="y"/></mrow></math>'
+    )
+    assert "href" not in mathml and "onclick" not in mathml and "style" not in mathml
+    assert "<img" not in mathml and "onerror" not in mathml
+    assert "<mi>a</mi>" in mathml
@@ -136,7 +136,8 @@ export default function AgentChat() {
   const highlightCode = () => {
     if (window.hljs) {
       try {
-        const codeBlocks = document.querySelectorAll("pre code");
+        // Blocks highlighted by the server are marked data-highlighted
+        const codeBlocks = document.querySelectorAll("pre code:not([data-highlighted])");
         codeBlocks.forEach((block) => {
           (window as any).hljs.highlightElement(block);
         });
@@ -211,6 +212,7 @@ export default function AgentChat() {
         question: userMessage.content,
         topics: [currentAgent.subject],
         details: "",
+        render: "html",
       };
 
       const response = await fetch(fullUrl, {
@@ -222,7 +224,8 @@ export default function AgentChat() {
       const data = await response.json();
 
       const answerContent = data.answer || "No answer provided";
-      const processed = await processMarkdown(answerContent);
+      // Pre-rendered by the server when available; otherwise rendered here
+      const processed = data.html || (await processMarkdown(answerContent));
 
       const agentResponse = {
         role: "assistant",
@@ -0,0 +1,188 @@
+from functools import reduce
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+KW = 1.0e-14  # ion product of water at 25 °C
+
+# Number of H+ / OH- released per formula unit by the strong electrolytes the agent knows
+STRONG_ACIDS = {'HCl': 1, 'HBr': 1, 'HI': 1, 'HNO3': 1, 'HClO4': 1, 'H2SO4': 2}
+STRONG_BASES = {'NaOH': 1, 'KOH': 1, 'LiOH': 1, 'Ca(OH)2': 2, 'Ba(OH)2': 2}
+
+# Dissociation constants at 25 °C
+WEAK_ACIDS = {
+    'CH3COOH': 1.8e-5, 'HCOOH': 1.8e-4, 'HF': 6.8e-4,
+    'HNO2': 4.5e-4, 'HCN': 6.2e-10, 'H2CO3': 4.3e-7
+}
+WEAK_BASES = {'NH3': 1.8e-5, 'CH3NH2': 4.4e-4, 'C5H5N': 1.7e-9}
+
+# Salts that supply the conjugate partner of a weak acid or base in a buffer
+CONJUGATE_SALTS = {
+    'CH3COONa': 'CH3COOH', 'HCOONa': 'HCOOH', 'NaF': 'HF',
+    'NaNO2': 'HNO2', 'NaCN': 'HCN', 'NaHCO3': 'H2CO3',
+    'NH4Cl': 'NH3', 'CH3NH3Cl': 'CH3NH2'
+}
+
+_PH_BRACKET = (-2.0, 16.0)
+_PH_STEPS = 60
+_EXTENT_STEPS = 100
+
+
+def _charge_residual(h, strong_acid, strong_base, weak_acid, ka, weak_base, kb):
+    """Positive minus negative charge for a trial [H+]; increases monotonically with h."""
+    positive = h + strong_base
+    negative = KW / h + strong_acid
+    if ka is not None:
+        negative = negative + weak_acid * ka / (ka + h)
+    if kb is not None:
+        positive = positive + weak_base * h / (h + KW / kb)
+    return positive - negative
+
+
+def solve_ph(strong_acid=0.0, strong_base=0.0, weak_acid=0.0, ka=None, weak_base=0.0, kb=None):
+    """
+    Solve the full charge balance of an aqueous mixture for its pH.
+
+    Every argument may be a scalar or a NumPy array; arrays are broadcast against each other
+    and the whole batch is solved together by bisection on pH, so a thousand-point titration
+    curve costs the same number of array operations as a single point.
+
+    Args:
+        strong_acid: Total concentration of H+ released by strong acids (mol/L)
+        strong_base: Total concentration of OH- released by strong bases (mol/L)
+        weak_acid: Analytical concentration of a weak acid, HA + A- (mol/L)
+        ka: Acid dissociation constant of the weak acid
+        weak_base: Analytical concentration of a weak base, B + BH+ (mol/L)
+        kb: Base dissociation constant of the weak base
+
+    Returns:
+        float or np.ndarray: pH with the broadcast shape of the inputs
+    """
+    inputs = [np.asarray(value, dtype=float) for value in (strong_acid, strong_base, weak_acid, weak_base)]
+    if ka is not None:
+        ka = np.asarray(ka, dtype=float)
+        inputs.append(ka)
+    if kb is not None:
+        kb = np.asarray(kb, dtype=float)
+        inputs.append(kb)
+    shape = np.broadcast_shapes(*(value.shape for value in inputs))
+    strong_acid, strong_base, weak_acid, weak_base = inputs[:4]
+
+    low = np.full(shape, _PH_BRACKET[0])
+    high = np.full(shape, _PH_BRACKET[1])
+    for _ in range(_PH_STEPS):
+        mid = 0.5 * (low + high)
+        residual = _charge_residual(10.0 ** -mid, strong_acid, strong_base, weak_acid, ka, weak_base, kb)
+        # Too much positive charge means [H+] is too high, i.e. the true pH lies above mid
+        too_acidic = residual > 0
+        low = np.where(too_acidic, mid, low)
+        high = np.where(too_acidic, high, mid)
+
+    ph = 0.5 * (low + high)
+    return ph if ph.ndim else float(ph)
+
+
+def ph_strong_acid(concentration, protons=1):
+    """pH of a strong acid solution, including the contribution of water autoionization."""
+    return solve_ph(strong_acid=np.multiply(concentration, protons))
+
+
+def ph_strong_base(concentration, hydroxides=1):
+    """pH of a strong base solution, including the contribution of water autoionization."""
+    return solve_ph(strong_base=np.multiply(concentration, hydroxides))
+
+
+def ph_weak_acid(concentration, ka):
+    """pH of a monoprotic weak acid solution."""
+    return solve_ph(weak_acid=concentration, ka=ka)
+
+
+def ph_weak_base(concentration, kb):
+    """pH of a weak base solution."""
+    return solve_ph(weak_base=concentration, kb=kb)
+
+
+def buffer_ph(pka, acid_concentration, base_concentration):
+    """Henderson–Hasselbalch estimate pH = pKa + log([A-]/[HA]), vectorized over all arguments."""
+    ph = np.asarray(pka, dtype=float) + np.log10(np.divide(base_concentration, acid_concentration, dtype=float))
+    return ph if ph.ndim else float(ph)
+
+
+def equivalence_volume(analyte_concentration, analyte_volume, titrant_concentration, equivalents=1):
+    """Titrant volume (same unit as analyte_volume) needed to reach the equivalence point."""
+    return analyte_concentration * analyte_volume * equivalents / titrant_concentration
+
+
+def titration_curve(analyte, analyte_concentration, analyte_volume, titrant_concentration, titrant_volume, k=None):
+    """
+    pH after each added titrant volume for a titration with a strong acid or strong base.
+
+    Args:
+        analyte (str): One of 'strong_acid', 'weak_acid', 'strong_base', 'weak_base'
+        analyte_concentration (float): Initial analyte concentration (mol/L)
+        analyte_volume (float): Initial analyte volume
+        titrant_concentration (float): Titrant concentration (mol/L)
+        titrant_volume (array-like): Added titrant volumes, same unit as analyte_volume
+        k (float): Ka or Kb of a weak analyte
+
+    Returns:
+        np.ndarray: pH at every titrant volume
+    """
+    titrant_volume = np.asarray(titrant_volume, dtype=float)
+    total_volume = analyte_volume + titrant_volume
+    analyte_total = analyte_concentration * analyte_volume / total_volume
+    titrant_total = titrant_concentration * titrant_volume / total_volume
+
+    if analyte == 'strong_acid':
+        return solve_ph(strong_acid=analyte_total, strong_base=titrant_total)
+    if analyte == 'weak_acid':
+        return solve_ph(weak_acid=analyte_total, ka=k, strong_base=titrant_total)
+    if analyte == 'strong_base':
+        return solve_ph(strong_base=analyte_total, strong_acid=titrant_total)
+    if analyte == 'weak_base':
+        return solve_ph(weak_base=analyte_total, kb=k, strong_acid=titrant_total)
+    raise ValueError(f"Unknown analyte type: {analyte}")
+
+
+def ice_equilibrium(k, initial, coefficients):
+    """
+    Solve an ICE table for the equilibrium composition of a single reaction.
+
+    The reaction extent x is found by vectorized bisection on
+    sum(nu_i * ln(c_i0 + nu_i * x)) = ln K, which is monotonic in x.
+
+    Args:
+        k: Equilibrium constant (scalar or array for a sweep)
+        initial (dict): Species -> initial concentration (scalar or array); missing species start at 0
+        coefficients (dict): Species -> signed stoichiometric coefficient (negative for reactants)
+
+    Returns:
+        tuple: (extent, dict of species -> equilibrium concentration)
+    """
+    log_k = np.log(np.asarray(k, dtype=float))
+    start = {species: np.asarray(initial.get(species, 0.0), dtype=float) for species in coefficients}
+    shape = np.broadcast_shapes(log_k.shape, *(value.shape for value in start.values()))
+
+    reactant_limits = [start[s] / -nu for s, nu in coefficients.items() if nu < 0]
+    product_limits = [start[s] / nu for s, nu in coefficients.items() if nu > 0]
+    if not reactant_limits or not product_limits:
+        raise ValueError("A reaction needs at least one reactant and one product")
+    high = np.broadcast_to(reduce(np.minimum, reactant_limits), shape).astype(float)
+    low = -np.broadcast_to(reduce(np.minimum, product_limits), shape).astype(float)
+    if np.any(high <= low):
+        raise ValueError("Initial concentrations leave no room for the reaction to proceed")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(_EXTENT_STEPS):
+            mid = 0.5 * (low + high)
+            log_q = sum(nu * np.log(start[s] + nu * mid) for s, nu in coefficients.items())
+            past_equilibrium = log_q > log_k
+            high = np.where(past_equilibrium, mid, high)
+            low = np.where(past_equilibrium, low, mid)
+
+    extent = 0.5 * (low + high)
+    equilibrium = {s: np.maximum(start[s] + nu * extent, 0.0) for s, nu in coefficients.items()}
+    if not extent.ndim:
+        return float(extent), {s: float(c) for s, c in equilibrium.items()}
+    return extent, equilibrium
@@ -0,0 +1,304 @@
+import argparse
+import importlib
+import json
+import math
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sympy_pool import SymbolicWorkerPool, SymbolicTimeout, PoolSaturated, SymbolicWorkerError
+
+# agent name -> (module, class) loaded in every worker process
+AGENTS = {
+    'math': ('math_agent', 'MathAgent'),
+    'physics': ('physics_agent', 'PhysicsAgent'),
+    'chemistry': ('chemistry_agent', 'ChemistryAgent'),
+}
+# A short question per agent run once at startup to pull in the code paths real questions use
+WARMUP_QUESTIONS = {
+    'math': ["What is the derivative of x**2*sin(x)?", "Solve x**2 - 4 = 0"],
+    'physics': ["A ball is launched at 20 m/s at 45°. How far does it go?"],
+    'chemistry': ["What is the pH of 0.1 M acetic acid?"],
+}
+DEFAULT_TIMEOUT = 10.0
+# Longest a worker may take to import and warm its agents, and tries before a recycled slot is given up
+WARMUP_TIMEOUT = 120.0
+WARMUP_ATTEMPTS = 3
+MAX_BATCH_SIZE = 64
+
+
+def _agent_worker_main(conn):
+    """Worker loop: import and warm every agent once, then answer (agent, question) tasks"""
+    agents = {}
+    failures = {}
+    for name, (module_name, class_name) in AGENTS.items():
+        try:
+            agents[name] = getattr(importlib.import_module(module_name), class_name)()
+            for question in WARMUP_QUESTIONS.get(name, []):
+                agents[name].process_question(question)
+        except Exception as e:
+            failures[name] = f"{type(e).__name__}: {e}"
+    conn.send(('ready', failures))
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+
+        agent_name, question = task
+        if agent_name in failures:
+            reply = ('error', f"The {agent_name} agent is unavailable: {failures[agent_name]}")
+        elif agent_name not in agents:
+            reply = ('error', f"Unknown agent '{agent_name}'")
+        else:
+            try:
+                reply = ('ok', agents[agent_name].process_question(question))
+            except Exception as e:
+                reply = ('error', f"{type(e).__name__}: {e}")
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send(('error', f"Result could not be returned from the worker: {e}"))
+
+
+class AgentWorkerPool(SymbolicWorkerPool):
+    """
+    Warm processes holding a MathAgent, PhysicsAgent and ChemistryAgent each.
+
+    Agents are imported and exercised once per process, so a question only pays for the work it
+    needs. Deadlines, queue limits and recycling of stuck workers behave as in SymbolicWorkerPool.
+    """
+
+    worker_target = staticmethod(_agent_worker_main)
+
+    def __init__(self, workers=2, deadline=DEFAULT_TIMEOUT, max_queue=32):
+        super().__init__(workers=workers, deadline=deadline, max_queue=max_queue)
+        self._stats['lost'] = 0
+        # Agents that failed to load in the workers, e.g. because a dependency is missing
+        self.unavailable = {}
+        for worker in self._workers:
+            failures = self._wait_ready(worker, WARMUP_TIMEOUT)
+            if failures is None:
+                self.shutdown()
+                raise SymbolicWorkerError(f"An agent worker did not start within {WARMUP_TIMEOUT:g}s")
+            self.unavailable.update(failures)
+
+    def _wait_ready(self, worker, timeout=None):
+        """Wait until a new worker has imported and warmed its agents; returns its load failures, or None if it never got ready"""
+        try:
+            if not worker.conn.poll(timeout):
+                return None
+            _, failures = worker.conn.recv()
+        except (EOFError, OSError):
+            return None
+        return failures
+
+    def _replace(self, worker):
+        # The replacement warms in the background, so the request that timed out returns now;
+        # it takes questions once it is ready
+        replacement = self._recycle(worker)
+        threading.Thread(target=self._warm, args=(replacement,), name='agent-warmup', daemon=True).start()
+
+    def _warm(self, worker):
+        """Put a recycled worker back to work once it is warm, recycling it again if it hangs or dies"""
+        for attempt in range(WARMUP_ATTEMPTS):
+            if attempt:
+                worker = self._recycle(worker)
+            failures = self._wait_ready(worker, WARMUP_TIMEOUT)
+            with self._lock:
+                if worker not in self._workers:
+                    return  # Shut down meanwhile
+                if failures is not None:
+                    self.unavailable.update(failures)
+            if failures is not None:
+                self._idle.put(worker)
+                return
+        # Give the slot up rather than keep restarting a worker that never gets ready
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+                self._stats['lost'] += 1
+
+    def ask(self, agent, question, deadline=None):
+        """Run ``process_question`` on the named agent in a worker and return its response dict"""
+        return self._call((agent, question), f"{agent} question", deadline)
+
+
+def _to_json(value):
+    """json.dumps default for the NumPy and SymPy values agent responses may carry"""
+    # NumPy arrays and scalars both convert with tolist(); anything else is written as text
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def _error_status(error):
+    if isinstance(error, SymbolicTimeout):
+        return 504
+    if isinstance(error, PoolSaturated):
+        return 503
+    return 500
+
+
+class AgentService:
+    """
+    Answers agent questions from a worker pool, one at a time or in batches.
+
+    Every request carries its own timeout (default DEFAULT_TIMEOUT); items of a batch run
+    concurrently across the workers and fail independently.
+    """
+
+    def __init__(self, pool, default_timeout=DEFAULT_TIMEOUT):
+        self.pool = pool
+        self.default_timeout = default_timeout
+        self._batch_executor = ThreadPoolExecutor(max_workers=MAX_BATCH_SIZE, thread_name_prefix='agent-batch')
+
+    def ask(self, item):
+        """
+        Answer one request of the form {'agent': ..., 'question': ..., 'timeout': ...}.
+
+        Returns:
+            tuple: (HTTP status, JSON-serializable body)
+        """
+        agent = item.get('agent')
+        question = item.get('question')
+        if agent not in AGENTS or not isinstance(question, str) or not question.strip():
+            return 400, {'error': f"Expected 'agent' (one of {', '.join(AGENTS)}) and a non-empty 'question'"}
+        try:
+            timeout = float(item.get('timeout') or self.default_timeout)
+        except (TypeError, ValueError):
+            timeout = None
+        if timeout is None or not math.isfinite(timeout) or timeout <= 0:
+            return 400, {'error': "'timeout' must be a positive number of seconds"}
+
+        started = time.monotonic()
+        try:
+            result = self.pool.ask(agent, question, deadline=timeout)
+        except (SymbolicTimeout, PoolSaturated, SymbolicWorkerError) as e:
+            return _error_status(e), {'error': str(e), 'timed_out': isinstance(e, SymbolicTimeout)}
+        return 200, {'agent': agent, 'result': result, 'elapsed_ms': round((time.monotonic() - started) * 1000, 2)}
+
+    def _ask_item(self, item):
+        # One failing item of a batch must not fail the others
+        try:
+            return self.ask(item)
+        except Exception as e:
+            return 500, {'error': f"{type(e).__name__}: {e}"}
+
+    def batch(self, body):
+        """Answer {'requests': [...], 'timeout': ...}; the batch timeout is the default for its items"""
+        items = body.get('requests')
+        if not isinstance(items, list) or not items:
+            return 400, {'error': "Expected a non-empty 'requests' list"}
+        if len(items) > MAX_BATCH_SIZE:
+            return 400, {'error': f"At most {MAX_BATCH_SIZE} requests per batch"}
+        default = body.get('timeout')
+        items = [dict(item, timeout=item.get('timeout') or default) if isinstance(item, dict) else {} for item in items]
+
+        responses = []
+        for status, response in self._batch_executor.map(self._ask_item, items):
+            response['status'] = status
+            responses.append(response)
+        return 200, {'responses': responses}
+
+    def health(self):
+        available = [name for name in AGENTS if name not in self.pool.unavailable]
+        return 200, {'status': 'ok', 'agents': available, 'unavailable': self.pool.unavailable, 'pool': self.pool.stats()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(*self.server.service.health())
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        routes = {'/ask': self.server.service.ask, '/batch': self.server.service.batch}
+        if self.path not in routes:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("The request body must be a JSON object")
+        except ValueError as e:
+            self._reply(400, {'error': f"Invalid JSON: {e}"})
+            return
+        try:
+            status, response = routes[self.path](body)
+        except Exception as e:
+            status, response = 500, {'error': f"{type(e).__name__}: {e}"}
+        self._reply(status, response)
+
+    def _reply(self, status, body):
+        data = json.dumps(body, default=_to_json).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host='127.0.0.1', port=8765, socket_path=None, verbose=False):
+    """HTTP server for the service on a TCP port, or on a Unix socket when socket_path is given"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the symbolic agents from warm worker processes over local JSON/HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help="Listen on this Unix socket path instead of a TCP port")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Default per-request timeout in seconds")
+    parser.add_argument('--max-queue', type=int, default=128, help="Requests allowed to wait for a worker")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+
+    with AgentWorkerPool(workers=args.workers, deadline=args.timeout, max_queue=args.max_queue) as pool:
+        server = make_server(AgentService(pool, args.timeout), args.host, args.port, args.socket, args.verbose)
+        for name, reason in pool.unavailable.items():
+            print(f"The {name} agent is unavailable: {reason}", flush=True)
+        print(f"Agent service listening on {args.socket or f'http://{args.host}:{args.port}'} with {args.workers} workers", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from benchmark_corpus import CORPUS
+
+RESULTS_VERSION = 1
+# A handler regresses when a latency percentile or its peak memory grows by more than this
+# fraction of the baseline and by more than the noise floor below
+DEFAULT_THRESHOLD = 0.25
+MIN_DELTA_MS = 0.5
+MIN_DELTA_KIB = 64.0
+COMPARED_LATENCIES = ('p50_ms', 'p90_ms')
+
+
+def load_agent_class(agent):
+    from agent_service import AGENTS
+    module, name = AGENTS[agent]
+    return getattr(importlib.import_module(module), name)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms):
+    values = sorted(latencies_ms)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'min_ms': round(values[0], 3),
+        'p50_ms': round(percentile(values, 0.50), 3),
+        'p90_ms': round(percentile(values, 0.90), 3),
+        'p99_ms': round(percentile(values, 0.99), 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+class RouteRecorder:
+    """
+    Wraps an agent instance's handler methods to record which one answered a question.
+
+    The outermost handler returning a response counts, so handlers that return None to pass
+    a question on (PhysicsAgent._evaluate_formulas) or call each other are attributed correctly.
+    """
+
+    def __init__(self, agent, handlers):
+        self.handler = None
+        self._depth = 0
+        for name in handlers:
+            setattr(agent, f'_{name}', self._wrap(name, getattr(agent, f'_{name}')))
+
+    def _wrap(self, name, method):
+        def recorded(*args, **kwargs):
+            self._depth += 1
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self._depth -= 1
+            if result is not None and self._depth == 0 and self.handler is None:
+                self.handler = name
+            return result
+        return recorded
+
+    def ask(self, agent, question):
+        self.handler = None
+        response = agent.process_question(question)
+        return response, self.handler
+
+
+def run_single(agent_name, handlers, repeat=5, warm=False):
+    """
+    Time every corpus question of one agent, called directly in this process.
+
+    Each round uses a fresh agent (cold result caches) unless `warm`, after one untimed round that
+    pays for imports and first-use setup. Returns per-handler latencies, the misrouted questions
+    and the sequential throughput.
+    """
+    agent_class = load_agent_class(agent_name)
+    questions = [(handler, question) for handler, items in handlers.items() for question in items]
+
+    def new_agent():
+        agent = agent_class()
+        return agent, RouteRecorder(agent, handlers)
+
+    agent, recorder = new_agent()
+    misrouted = []
+    for handler, question in questions:
+        _, answered_by = recorder.ask(agent, question)
+        if answered_by != handler:
+            misrouted.append({'question': question, 'expected': handler, 'handler': answered_by})
+
+    latencies = defaultdict(list)
+    elapsed = 0.0
+    for _ in range(repeat):
+        if not warm:
+            agent, recorder = new_agent()
+        for handler, question in questions:
+            started = time.perf_counter()
+            agent.process_question(question)
+            seconds = time.perf_counter() - started
+            latencies[handler].append(seconds * 1000)
+            elapsed += seconds
+    throughput = len(questions) * repeat / elapsed if elapsed else None
+    return latencies, misrouted, throughput
+
+
+def peak_memory(agent_name, handlers):
+    """Largest tracemalloc peak, in KiB, of a single cold call per handler"""
+    agent_class = load_agent_class(agent_name)
+    # Warm-up outside tracing, so module imports are not counted against the first question
+    warm = agent_class()
+    for items in handlers.values():
+        for question in items:
+            warm.process_question(question)
+
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for handler, items in handlers.items():
+            peak = 0
+            for question in items:
+                agent = agent_class()
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                agent.process_question(question)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+            peaks[handler] = round(peak / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run_batched(corpus, workers, repeat=1, timeout=30.0):
+    """
+    Answer the whole corpus as batches through an AgentService worker pool.
+
+    Returns the batch throughput in questions per second and the per-item latencies by
+    "agent.handler".
+    """
+    from agent_service import MAX_BATCH_SIZE, AgentService, AgentWorkerPool
+    items = [
+        ({'agent': agent, 'question': question}, f'{agent}.{handler}')
+        for agent, handlers in corpus.items()
+        for handler, questions in handlers.items()
+        for question in questions
+    ]
+    latencies = defaultdict(list)
+    failures = 0
+    # A whole batch may wait for workers; the default queue limit would reject part of it
+    with AgentWorkerPool(workers=workers, deadline=timeout, max_queue=MAX_BATCH_SIZE) as pool:
+        service = AgentService(pool, default_timeout=timeout)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for start in range(0, len(items), MAX_BATCH_SIZE):
+                chunk = items[start:start + MAX_BATCH_SIZE]
+                _, body = service.batch({'requests': [item for item, _ in chunk]})
+                for (_, key), response in zip(chunk, body['responses']):
+                    if response['status'] == 200:
+                        latencies[key].append(response['elapsed_ms'])
+                    else:
+                        failures += 1
+        elapsed = time.perf_counter() - started
+    return len(items) * repeat / elapsed, latencies, failures
+
+
+def run_benchmark(corpus, repeat=5, warm=False, memory=True, batch_workers=0, batch_repeat=1):
+    results = {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'warm': warm,
+        'handlers': {},
+        'throughput': {},
+        'misrouted': [],
+    }
+    for agent_name, handlers in corpus.items():
+        latencies, misrouted, throughput = run_single(agent_name, handlers, repeat, warm)
+        peaks = peak_memory(agent_name, handlers) if memory else {}
+        for handler, values in latencies.items():
+            entry = summarize(values)
+            if handler in peaks:
+                entry['peak_kib'] = peaks[handler]
+            results['handlers'][f'{agent_name}.{handler}'] = entry
+        results['misrouted'] += [dict(item, agent=agent_name) for item in misrouted]
+        results['throughput'][f'{agent_name}.single_qps'] = round(throughput, 2) if throughput else None
+
+    if batch_workers:
+        qps, latencies, failures = run_batched(corpus, batch_workers, batch_repeat)
+        results['throughput']['batch_qps'] = round(qps, 2)
+        results['throughput']['batch_workers'] = batch_workers
+        results['throughput']['batch_failures'] = failures
+        for key, values in latencies.items():
+            if values:
+                results['handlers'][key]['batch'] = summarize(values)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta_ms=MIN_DELTA_MS, min_delta_kib=MIN_DELTA_KIB):
+    """
+    Regressions of `results` against `baseline` (both run_benchmark() output).
+
+    Returns:
+        list: {'metric', 'baseline', 'current', 'change'} for each latency percentile, peak memory
+        or throughput that got worse by more than `threshold` (and the noise floor)
+    """
+    regressions = []
+
+    def check(metric, old, new, floor, higher_is_worse=True):
+        if old is None or new is None or old <= 0:
+            return
+        delta = (new - old) if higher_is_worse else (old - new)
+        if delta > floor and delta / old > threshold:
+            regressions.append({'metric': metric, 'baseline': old, 'current': new, 'change': round((new - old) / old, 3)})
+
+    for key, entry in results['handlers'].items():
+        old = baseline.get('handlers', {}).get(key)
+        if old is None:
+            continue
+        for field in COMPARED_LATENCIES:
+            check(f'{key}.{field}', old.get(field), entry.get(field), min_delta_ms)
+        check(f'{key}.peak_kib', old.get('peak_kib'), entry.get('peak_kib'), min_delta_kib)
+    for key, value in results['throughput'].items():
+        if key.endswith('_qps'):
+            check(f'throughput.{key}', baseline.get('throughput', {}).get(key), value, 0.0, higher_is_worse=False)
+    return regressions
+
+
+def report(results):
+    lines = [f"{'handler':36} {'n':>4} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak KiB':>9}"]
+    for key, entry in sorted(results['handlers'].items()):
+        peak = entry.get('peak_kib')
+        lines.append(
+            f"{key:36} {entry['count']:>4} {entry['p50_ms']:>9.2f} {entry['p90_ms']:>9.2f} {entry['p99_ms']:>9.2f} "
+            f"{entry['max_ms']:>9.2f} {peak if peak is not None else '':>9}"
+        )
+    lines.append("")
+    for key, value in results['throughput'].items():
+        lines.append(f"{key}: {value}")
+    for item in results['misrouted']:
+        lines.append(f"misrouted ({item['agent']}.{item['expected']} -> {item['handler']}): {item['question']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the symbolic agents on the question corpus and compare with a baseline.")
+    parser.add_argument('--agents', nargs='*', default=list(CORPUS), help="Agents to benchmark (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed rounds over the corpus")
+    parser.add_argument('--warm', action='store_true', help="Reuse one agent across rounds, so result caches are warm")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--batch-workers', type=int, default=0, help="Also answer the corpus in batches through this many agent worker processes")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--baseline', help="Results JSON of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Relative slowdown flagged as a regression")
+    parser.add_argument('--check', action='store_true', help="Exit with status 1 on a regression or a misrouted question")
+    args = parser.parse_args(argv)
+
+    corpus = {agent: CORPUS[agent] for agent in args.agents}
+    results = run_benchmark(corpus, args.repeat, args.warm, not args.no_memory, args.batch_workers)
+    print(report(results))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print()
+        for item in regressions:
+            print(f"regression {item['metric']}: {item['baseline']} -> {item['current']} ({item['change']:+.0%})")
+        if not regressions:
+            print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+
+    if args.check and (regressions or results['misrouted']):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
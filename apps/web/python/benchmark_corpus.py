@@ -0,0 +1,117 @@
+"""
+Representative questions for the symbolic agents, grouped by agent and by the handler that
+answers them (the method name without its leading underscore).
+
+The benchmark checks that every question still reaches its handler, so a question that starts
+routing elsewhere shows up as misrouted instead of silently timing another code path.
+"""
+
+CORPUS = {
+    'math': {
+        'solve_equation': [
+            "Solve x**2 - 4 = 0",
+            "Solve the equation 2*x + 3 = 11",
+            "Solve x**3 - 6*x**2 + 11*x - 6 = 0",
+            "Solve the equation sin(x) = 1/2",
+            "Solve exp(x) = 3*x + 2",
+            "Solve x**5 - x - 1 = 0",
+        ],
+        'find_derivative': [
+            "What is the derivative of x**2*sin(x)?",
+            "Find the derivative of exp(x)*cos(x)",
+            "Differentiate log(x)/x",
+            "What is the derivative of (x**2 + 1)**10?",
+            "Find the derivative of atan(x**2) + sqrt(x)",
+        ],
+        'find_integral': [
+            "What is the integral of x**2?",
+            "Find the integral of sin(x)*cos(x)",
+            "Find the integral of x*exp(x)",
+            "What is the integral of 1/(x**2 + 1) from 0 to 1?",
+            "What is the integral of exp(-x**2) from 0 to 2?",
+            "What is the integral of sin(x)/x from 1 to 5?",
+        ],
+        'find_limit': [
+            "What is the limit of sin(x)/x as x approaches 0?",
+            "Find the limit of (1 + 1/x)**x as x approaches oo",
+            "Find the limit of (x**2 - 1)/(x - 1) as x approaches 1",
+            "What is the limit of (cos(x) - 1)/x**2 as x approaches 0?",
+        ],
+        'plot_function': [
+            "Plot sin(x)",
+            "Plot y = x**3 - 3*x from -3 to 3",
+            "Graph of 1/x from -5 to 5",
+            "Sketch exp(-x**2)*cos(4*x) on [-4, 4]",
+        ],
+        'matrix_operations': [
+            "Find the determinant of the matrix [[1, 2], [3, 4]]",
+            "What are the eigenvalues of [[2, 0, 0], [0, 3, 4], [0, 4, 9]]?",
+            "Find the inverse of the matrix [[4, 7], [2, 6]]",
+            "What is the determinant of [[2, -1, 0, 1], [1, 3, 2, 0], [0, 1, 4, 2], [3, 0, 1, 5]]?",
+        ],
+    },
+    'physics': {
+        'evaluate_formulas': [
+            "A ball is launched at 20 m/s at 45°. How far does it go?",
+            "What is the kinetic energy of a 2 kg mass moving at 3 m/s?",
+            "A 1200 kg car accelerates at 2.5 m/s^2. What force is needed?",
+            "What is the momentum of a 0.145 kg baseball at 40 m/s?",
+            "What is the potential energy of a 5 kg mass at a height of 10 m?",
+        ],
+        'mechanics': [
+            "Explain projectile motion",
+            "What are Newton's laws of motion?",
+            "How does friction force work?",
+        ],
+        'energy': [
+            "Explain the conservation of energy",
+            "What is kinetic energy?",
+            "How are work and power related?",
+        ],
+        'electromagnetism': [
+            "Explain Coulomb's law for electric charges",
+            "What is a magnetic field?",
+            "Explain Faraday's law of electromagnetism",
+        ],
+        'quantum_physics': [
+            "Explain the uncertainty principle in quantum mechanics",
+            "What is wave-particle duality?",
+            "What is the Schrödinger equation in quantum physics?",
+        ],
+        'thermodynamics': [
+            "What is the first law of thermodynamics?",
+            "Explain the second law of thermodynamics and entropy",
+            "How does heat flow between two bodies at different temperatures?",
+        ],
+    },
+    'chemistry': {
+        'periodic_table': [
+            "Tell me about the element Sodium",
+            "What is the element with symbol Cl?",
+            "How is the periodic table organized?",
+        ],
+        'acid_base': [
+            "What is the pH of 0.1 M acetic acid?",
+            "What is the pH of 0.01 M HCl?",
+            "What is the pH of 0.05 M NH3 with Kb = 1.8e-5?",
+            "What is the pH of a buffer of 0.1 M acetic acid and 0.1 M sodium acetate?",
+            "What is the pH after adding 10 mL of 0.1 M NaOH to 25 mL of 0.1 M acetic acid?",
+            "What is the difference between an acid and a base?",
+        ],
+        'organic_chemistry': [
+            "What are the common functional groups in organic chemistry?",
+            "What is an organic compound?",
+            "Explain isomers of an organic molecule",
+        ],
+        'chemical_reactions': [
+            "Balance the equation H2 + O2 -> H2O",
+            "For the reaction N2 + 3H2 <=> 2NH3 with Kc = 0.5, [N2] = 1 M and [H2] = 1 M, what are the equilibrium concentrations?",
+            "What types of chemical reaction are there?",
+        ],
+        'chemical_bonding': [
+            "What is a covalent bond?",
+            "Explain ionic bonds",
+            "What is an orbital and how do electrons fill it?",
+        ],
+    },
+}
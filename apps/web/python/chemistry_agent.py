@@ -1,7 +1,19 @@
 import re
-from rdkit import Chem
-from rdkit.Chem import AllChem
-import numpy as np
+from lazy_imports import lazy_import
+from acid_base import (
+    STRONG_ACIDS, STRONG_BASES, WEAK_ACIDS, WEAK_BASES, CONJUGATE_SALTS,
+    solve_ph, buffer_ph, equivalence_volume, titration_curve, ice_equilibrium
+)
+
+# Numbers such as 0.1, 1.8e-5 or 1.8 x 10^-5
+NUMBER_PATTERN = r'(\d+(?:\.\d+)?(?:\s*(?:[x×*]\s*10\s*\^?|[eE])\s*[-−]?\d+)?)'
+CONCENTRATION_PATTERN = NUMBER_PATTERN + r'\s*(mM|M|[Mm]ol/[Ll]|molar)(?![A-Za-z])'
+VOLUME_PATTERN = NUMBER_PATTERN + r'\s*(mL|ml|L)(?![A-Za-z])'
+FORMULA_TERM_PATTERN = r'\d*\s*[A-Z][A-Za-z0-9()]*'
+REACTION_PATTERN = r'((?:{0}\s*\+\s*)*{0})\s*(?:⇌|⇄|<=>|<->|->|→)\s*((?:{0}\s*\+\s*)*{0})'.format(FORMULA_TERM_PATTERN)
+TITRATION_POINTS = 1000
+
+np = lazy_import('numpy')
 
 class ChemistryAgent:
     def __init__(self):
@@ -24,6 +36,14 @@ class ChemistryAgent:
             'KOH': 'Potassium hydroxide',
             'NH3': 'Ammonia'
         }
+
+        # Common names that map onto formulas known to the acid-base engine
+        self.compound_names = {
+            'hydrochloric acid': 'HCl', 'nitric acid': 'HNO3', 'sulfuric acid': 'H2SO4',
+            'acetic acid': 'CH3COOH', 'formic acid': 'HCOOH', 'hydrofluoric acid': 'HF',
+            'sodium hydroxide': 'NaOH', 'potassium hydroxide': 'KOH', 'ammonia': 'NH3',
+            'sodium acetate': 'CH3COONa', 'ammonium chloride': 'NH4Cl'
+        }
         
     def process_question(self, question):
         """
@@ -104,6 +124,11 @@ The periodic table is one of the most important organizing principles in chemist
     def _acid_base(self, question):
         """Handle questions about acids, bases, and pH"""
         question_lower = question.lower()
+
+        # Questions that carry concentrations get a computed answer
+        numeric = self._acid_base_numeric(question)
+        if numeric is not None:
+            return numeric
         
         if 'ph' in question_lower:
             return {
@@ -327,6 +352,11 @@ Each type follows specific patterns that help predict products and reaction beha
                 'confidence': 0.95
             }
         elif 'equilibrium' in question_lower:
+            # Questions that give K and initial concentrations get a solved ICE table
+            numeric = self._equilibrium_numeric(question)
+            if numeric is not None:
+                return numeric
+
             return {
                 'answer': """
 Chemical Equilibrium occurs when forward and reverse reactions proceed at equal rates, resulting in no net change in concentrations.
@@ -444,6 +474,252 @@ Hybridization helps explain both molecular shape and reactivity.
                 'confidence': 0.7
             }
     
+    # Helper methods for numeric acid-base and equilibrium problems
+    def _parse_number(self, text):
+        """Convert a matched number such as '1.8 x 10^-5' into a float"""
+        text = re.sub(r'\s+', '', text).replace('−', '-')
+        return float(re.sub(r'[x×*]10\^?', 'e', text))
+
+    def _find_species(self, question):
+        """Return (position, formula) for every acid, base or conjugate salt mentioned, in order"""
+        formulas = set(STRONG_ACIDS) | set(STRONG_BASES) | set(WEAK_ACIDS) | set(WEAK_BASES) | set(CONJUGATE_SALTS)
+        found = []
+        taken = set()
+        # Longest formulas first so that e.g. CH3COONa is not also read as CH3COOH's fragments
+        for formula in sorted(formulas, key=len, reverse=True):
+            for match in re.finditer(r'(?<![A-Za-z0-9(])' + re.escape(formula) + r'(?![a-z0-9)])', question):
+                if not taken.intersection(range(match.start(), match.end())):
+                    found.append((match.start(), formula))
+                    taken.update(range(match.start(), match.end()))
+        question_lower = question.lower()
+        for name, formula in self.compound_names.items():
+            for match in re.finditer(re.escape(name), question_lower):
+                found.append((match.start(), formula))
+        return sorted(found)
+
+    def _assign_concentrations(self, question, species):
+        """Pair each species mention with the closest unused concentration (mol/L) in the question"""
+        concentrations = []
+        for match in re.finditer(CONCENTRATION_PATTERN, question):
+            value = self._parse_number(match.group(1))
+            if match.group(2) == 'mM':
+                value /= 1000.0
+            concentrations.append((match.start(), match.end(), value))
+
+        assigned = []
+        for position, formula in species:
+            if not concentrations:
+                assigned.append((formula, None))
+                continue
+            closest = min(concentrations, key=lambda c: min(abs(position - c[1]), abs(position - c[0])))
+            concentrations.remove(closest)
+            assigned.append((formula, closest[2]))
+        return assigned
+
+    def _find_dissociation_constants(self, question):
+        """Read Ka, Kb, pKa or pKb values given in the question"""
+        constants = {}
+        for match in re.finditer(r'\b(p?)K([ab])\s*(?:=|is|of|:)?\s*' + NUMBER_PATTERN, question):
+            value = self._parse_number(match.group(3))
+            constants[match.group(2)] = 10.0 ** -value if match.group(1) else value
+        return constants
+
+    def _acid_base_numeric(self, question):
+        """Compute pH, buffer pH or a titration curve when the question provides concentrations"""
+        question_lower = question.lower()
+        constants = self._find_dissociation_constants(question)
+        amounts = [
+            (formula, conc) for formula, conc in self._assign_concentrations(question, self._find_species(question))
+            if conc is not None
+        ]
+
+        if not amounts:
+            # A generic weak acid or base given only by its constant
+            match = re.search(CONCENTRATION_PATTERN, question)
+            if not match:
+                return None
+            conc = self._parse_number(match.group(1)) / (1000.0 if match.group(2) == 'mM' else 1.0)
+            if 'weak acid' in question_lower and 'a' in constants:
+                amounts = [('weak acid', conc)]
+            elif 'weak base' in question_lower and 'b' in constants:
+                amounts = [('weak base', conc)]
+            else:
+                return None
+
+        if 'titrat' in question_lower and len(amounts) >= 2:
+            return self._titration_answer(question, amounts, constants)
+        if 'buffer' in question_lower or any(formula in CONJUGATE_SALTS for formula, _ in amounts):
+            buffer = self._buffer_answer(amounts, constants)
+            if buffer is not None:
+                return buffer
+
+        formula, conc = amounts[0]
+        if formula in STRONG_ACIDS:
+            ph = solve_ph(strong_acid=conc * STRONG_ACIDS[formula])
+            kind = "a strong acid, fully dissociated"
+        elif formula in STRONG_BASES:
+            ph = solve_ph(strong_base=conc * STRONG_BASES[formula])
+            kind = "a strong base, fully dissociated"
+        elif formula in WEAK_ACIDS or formula == 'weak acid':
+            ka = constants.get('a', WEAK_ACIDS.get(formula))
+            ph = solve_ph(weak_acid=conc, ka=ka)
+            kind = f"a weak acid with Ka = {ka:.3g}"
+        elif formula in WEAK_BASES or formula == 'weak base':
+            kb = constants.get('b', WEAK_BASES.get(formula))
+            ph = solve_ph(weak_base=conc, kb=kb)
+            kind = f"a weak base with Kb = {kb:.3g}"
+        else:
+            return None
+
+        return {
+            'answer': f"""
+pH of {conc:g} M {formula}:
+
+The solute is {kind}. Solving the charge balance
+[H⁺] + [cations] = [OH⁻] + [anions], with Kw = 1.0 × 10⁻¹⁴, gives:
+
+- [H⁺] = {10 ** -ph:.3e} M
+- pH = {ph:.2f}
+- pOH = {14 - ph:.2f}
+            """,
+            'confidence': 0.9
+        }
+
+    def _buffer_answer(self, amounts, constants):
+        """Henderson-Hasselbalch pH for a weak acid/base paired with its conjugate salt"""
+        weak = next(((f, c) for f, c in amounts if f in WEAK_ACIDS or f in WEAK_BASES), None)
+        salt = next(((f, c) for f, c in amounts if f in CONJUGATE_SALTS), None)
+        if weak is None or salt is None:
+            return None
+        (formula, weak_conc), (salt_formula, salt_conc) = weak, salt
+
+        if formula in WEAK_ACIDS:
+            ka = constants.get('a', WEAK_ACIDS[formula])
+            pka = -np.log10(ka)
+            ph = buffer_ph(pka, weak_conc, salt_conc)
+            exact = solve_ph(weak_acid=weak_conc + salt_conc, ka=ka, strong_base=salt_conc)
+            ratio = "log([A⁻]/[HA])"
+        else:
+            kb = constants.get('b', WEAK_BASES[formula])
+            pka = 14.0 + np.log10(kb)
+            ph = buffer_ph(pka, salt_conc, weak_conc)
+            exact = solve_ph(weak_base=weak_conc + salt_conc, kb=kb, strong_acid=salt_conc)
+            ratio = "log([B]/[BH⁺])"
+
+        return {
+            'answer': f"""
+Buffer of {weak_conc:g} M {formula} and {salt_conc:g} M {salt_formula}:
+
+Henderson-Hasselbalch equation: pH = pKa + {ratio}
+- pKa = {pka:.2f}
+- pH = {ph:.2f}
+
+Solving the full charge balance (no approximations) gives pH = {exact:.2f}.
+            """,
+            'confidence': 0.9
+        }
+
+    def _titration_answer(self, question, amounts, constants):
+        """Titration curve of an acid or base analyte with a strong titrant"""
+        (analyte, analyte_conc), (titrant, titrant_conc) = amounts[0], amounts[1]
+        volume_match = re.search(VOLUME_PATTERN, question)
+        if volume_match is None:
+            return None
+        analyte_volume = self._parse_number(volume_match.group(1)) * (1000.0 if volume_match.group(2) == 'L' else 1.0)
+
+        if analyte in STRONG_ACIDS and titrant in STRONG_BASES:
+            kind, k = 'strong_acid', None
+            analyte_conc *= STRONG_ACIDS[analyte]
+            titrant_conc *= STRONG_BASES[titrant]
+        elif analyte in WEAK_ACIDS and titrant in STRONG_BASES:
+            kind, k = 'weak_acid', constants.get('a', WEAK_ACIDS[analyte])
+            titrant_conc *= STRONG_BASES[titrant]
+        elif analyte in STRONG_BASES and titrant in STRONG_ACIDS:
+            kind, k = 'strong_base', None
+            analyte_conc *= STRONG_BASES[analyte]
+            titrant_conc *= STRONG_ACIDS[titrant]
+        elif analyte in WEAK_BASES and titrant in STRONG_ACIDS:
+            kind, k = 'weak_base', constants.get('b', WEAK_BASES[analyte])
+            titrant_conc *= STRONG_ACIDS[titrant]
+        else:
+            return None
+
+        # Titrant concentrations are already scaled to equivalents, so equivalence is a plain mole balance
+        v_eq = equivalence_volume(analyte_conc, analyte_volume, titrant_conc)
+        volumes = np.linspace(0.0, 2.0 * v_eq, TITRATION_POINTS)
+        curve = titration_curve(kind, analyte_conc, analyte_volume, titrant_conc, volumes, k=k)
+        checkpoints = titration_curve(kind, analyte_conc, analyte_volume, titrant_conc, [0.0, 0.5 * v_eq, v_eq, 1.5 * v_eq], k=k)
+
+        return {
+            'answer': f"""
+Titration of {analyte_volume:g} mL of {amounts[0][1]:g} M {analyte} with {amounts[1][1]:g} M {titrant}:
+
+- Equivalence point at {v_eq:.2f} mL of titrant
+- Initial pH: {checkpoints[0]:.2f}
+- pH at half-equivalence ({0.5 * v_eq:.2f} mL): {checkpoints[1]:.2f}
+- pH at equivalence: {checkpoints[2]:.2f}
+- pH at 1.5 × equivalence ({1.5 * v_eq:.2f} mL): {checkpoints[3]:.2f}
+
+The full curve ({TITRATION_POINTS} points up to twice the equivalence volume) is included with this answer.
+            """,
+            'titration_curve': {
+                'volume_ml': np.round(volumes, 4).tolist(),
+                'ph': np.round(curve, 3).tolist()
+            },
+            'confidence': 0.9
+        }
+
+    def _equilibrium_numeric(self, question):
+        """Solve the ICE table for a reaction whose K and initial concentrations are given"""
+        k_match = re.search(r'\bK(?:c|eq|p)?\s*(?:=|is|of|:)\s*' + NUMBER_PATTERN, question)
+        reaction_match = re.search(REACTION_PATTERN, question)
+        if not k_match or not reaction_match:
+            return None
+
+        coefficients = {}
+        for side, sign in ((reaction_match.group(1), -1), (reaction_match.group(2), 1)):
+            for term in side.split('+'):
+                term_match = re.match(r'^(\d*)\s*([A-Z][A-Za-z0-9()]*)$', term.strip())
+                if term_match is None:
+                    return None
+                coefficients[term_match.group(2)] = sign * int(term_match.group(1) or 1)
+
+        initial = {}
+        for species in coefficients:
+            escaped = re.escape(species)
+            match = (
+                re.search(r'\[\s*' + escaped + r'\s*\]\s*(?:_?0|initial)?\s*(?:=|is|of|:)\s*' + NUMBER_PATTERN, question)
+                or re.search(NUMBER_PATTERN + r'\s*(?:M|mol/L)\s+(?:of\s+)?' + escaped + r'(?![A-Za-z0-9])', question)
+            )
+            if match:
+                initial[species] = self._parse_number(match.group(1))
+        if not initial:
+            return None
+
+        k = self._parse_number(k_match.group(1))
+        try:
+            extent, equilibrium = ice_equilibrium(k, initial, coefficients)
+        except ValueError as e:
+            return {
+                'answer': f"I couldn't set up an ICE table for this reaction: {str(e)}.",
+                'confidence': 0.4
+            }
+
+        rows = "\n".join(
+            f"- {species}: I = {initial.get(species, 0.0):.4g} M, C = {nu:+d}x, E = {equilibrium[species]:.4g} M"
+            for species, nu in coefficients.items()
+        )
+        return {
+            'answer': f"""
+ICE table for {reaction_match.group(1).strip()} ⇌ {reaction_match.group(2).strip()} with K = {k:g}:
+
+{rows}
+
+Solving K = Π[products]^ν / Π[reactants]^ν for the reaction extent gives x = {extent:.4g} M.
+            """,
+            'confidence': 0.85
+        }
+
     # Helper methods for element information
     def _get_element_type(self, symbol):
         """Return the element type (metal, nonmetal, etc.)"""
@@ -0,0 +1,191 @@
+from functools import lru_cache
+
+from lazy_imports import lazy_import
+
+from quantities import (
+    DIMENSIONLESS, MASS, LENGTH, TIME, ANGLE, VOLUME, VELOCITY, ACCELERATION, FORCE, ENERGY,
+    POWER, PRESSURE, MOMENTUM, SPRING_CONSTANT, FREQUENCY, CHARGE, CURRENT, VOLTAGE, RESISTANCE,
+    TEMPERATURE, AMOUNT, DimensionError, combine, dimension, require_same
+)
+
+np = lazy_import('numpy')
+sp = lazy_import('sympy')
+
+# Physical constants: name -> (SI value, dimension)
+CONSTANTS = {
+    'g': (9.81, ACCELERATION),
+    'k_e': (8.9875517923e9, dimension(M=1, L=3, T=-4, I=-2)),
+    'R_gas': (8.314462618, dimension(M=1, L=2, T=-2, K=-1, N=-1)),
+}
+
+
+def expression_dimension(expr, dimensions):
+    """
+    Dimension of a SymPy expression given the dimension of each of its symbols.
+
+    Sums must add like dimensions, and function arguments (sin, cos, exp, ...) must be
+    dimensionless or plane angles; anything else raises DimensionError.
+    """
+    if expr.is_Symbol:
+        return dimensions[expr.name]
+    if expr.is_Number:
+        return DIMENSIONLESS
+    if expr.is_Mul:
+        return combine(*(expression_dimension(arg, dimensions) for arg in expr.args))
+    if expr.is_Pow:
+        base, exponent = expr.args
+        if not exponent.is_number:
+            require_same(expression_dimension(exponent, dimensions), DIMENSIONLESS, "Exponent")
+            require_same(expression_dimension(base, dimensions), DIMENSIONLESS, "Base of a symbolic power")
+            return DIMENSIONLESS
+        return combine(expression_dimension(base, dimensions), powers=[sp.Rational(exponent)])
+    if expr.is_Add:
+        first, *rest = [expression_dimension(arg, dimensions) for arg in expr.args]
+        for other in rest:
+            require_same(other, first, f"Terms of {expr}")
+        return first
+    if isinstance(expr, sp.Function):
+        for arg in expr.args:
+            if expression_dimension(arg, dimensions) not in (DIMENSIONLESS, ANGLE):
+                raise DimensionError(f"Argument of {expr.func} must be dimensionless or an angle")
+        return DIMENSIONLESS
+    raise DimensionError(f"Cannot determine the dimension of {expr}")
+
+
+class Formula:
+    """
+    A named physics formula, dimension-checked and compiled to a NumPy function when it is defined.
+
+    ``evaluate`` takes SI values for the inputs as scalars or arrays, so the same compiled
+    function serves single questions and batch or sweep evaluation.
+    """
+
+    def __init__(self, name, description, output, output_dimension, expression, inputs, keywords, constants=()):
+        self.name = name
+        self.description = description
+        self.output = output
+        self.output_dimension = output_dimension
+        self.inputs = inputs
+        self.keywords = keywords
+        self.constants = list(constants)
+
+        names = [input_name for input_name, _ in inputs] + self.constants
+        symbols = {n: sp.Symbol(n) for n in names}
+        # Explicit locals keep names such as E, I or N from turning into SymPy built-ins
+        self.expression = sp.sympify(expression, locals=symbols)
+
+        dimensions = dict(inputs)
+        dimensions.update({c: CONSTANTS[c][1] for c in self.constants})
+        require_same(expression_dimension(self.expression, dimensions), output_dimension, f"Formula '{name}'")
+
+        self._function = sp.lambdify([symbols[n] for n in names], self.expression, modules='numpy')
+
+    def evaluate(self, constants=None, **values):
+        """
+        Evaluate the formula on SI inputs (scalars or broadcastable arrays).
+
+        Args:
+            constants (dict): Optional overrides for constant values, e.g. {'g': 1.62}
+            **values: One SI value or array per input name
+
+        Returns:
+            float or np.ndarray: The output in SI units
+        """
+        constants = constants or {}
+        args = [values[name] for name, _ in self.inputs]
+        args += [constants.get(c, CONSTANTS[c][0]) for c in self.constants]
+        with np.errstate(all='ignore'):
+            result = self._function(*args)
+        return float(result) if np.ndim(result) == 0 else result
+
+
+@lru_cache(maxsize=None)
+def registered_formulas():
+    """Every formula, built (parsed, checked and compiled) the first time one is needed"""
+    return [
+        Formula('projectile_range', "Horizontal range", 'R', LENGTH, 'v**2*sin(2*theta)/g',
+                [('v', VELOCITY), ('theta', ANGLE)], ['projectile', 'range', 'thrown', 'launched', 'how far'], ['g']),
+        Formula('projectile_height', "Maximum height", 'H', LENGTH, 'v**2*sin(theta)**2/(2*g)',
+                [('v', VELOCITY), ('theta', ANGLE)], ['projectile', 'height', 'thrown', 'launched', 'how high'], ['g']),
+        Formula('projectile_time', "Time of flight", 'T', TIME, '2*v*sin(theta)/g',
+                [('v', VELOCITY), ('theta', ANGLE)], ['projectile', 'time of flight', 'thrown', 'launched', 'how long'], ['g']),
+        Formula('kinetic_energy', "Kinetic energy", 'KE', ENERGY, 'm*v**2/2',
+                [('m', MASS), ('v', VELOCITY)], ['kinetic']),
+        Formula('potential_energy', "Gravitational potential energy", 'PE', ENERGY, 'm*g*h',
+                [('m', MASS), ('h', LENGTH)], ['potential energy', 'gravitational potential'], ['g']),
+        Formula('spring_energy', "Elastic potential energy", 'PE', ENERGY, 'k*x**2/2',
+                [('k', SPRING_CONSTANT), ('x', LENGTH)], ['spring', 'elastic']),
+        Formula('momentum', "Momentum", 'p', MOMENTUM, 'm*v',
+                [('m', MASS), ('v', VELOCITY)], ['momentum']),
+        Formula('newton_second_law', "Net force", 'F', FORCE, 'm*a',
+                [('m', MASS), ('a', ACCELERATION)], ['force', 'newton']),
+        Formula('weight', "Weight", 'W', FORCE, 'm*g',
+                [('m', MASS)], ['weight', 'weigh'], ['g']),
+        Formula('free_fall_distance', "Distance fallen from rest", 'd', LENGTH, 'g*t**2/2',
+                [('t', TIME)], ['free fall', 'dropped', 'falls'], ['g']),
+        Formula('free_fall_speed', "Speed after falling from rest", 'v', VELOCITY, 'g*t',
+                [('t', TIME)], ['free fall', 'dropped', 'falls'], ['g']),
+        Formula('work', "Work done", 'W', ENERGY, 'F*d',
+                [('F', FORCE), ('d', LENGTH)], ['work']),
+        Formula('mechanical_power', "Power", 'P', POWER, 'E/t',
+                [('E', ENERGY), ('t', TIME)], ['power']),
+        Formula('coulomb_force', "Electrostatic force", 'F', FORCE, 'k_e*q1*q2/r**2',
+                [('q1', CHARGE), ('q2', CHARGE), ('r', LENGTH)], ['coulomb', 'electric force', 'electrostatic', 'charges'], ['k_e']),
+        Formula('ohm_voltage', "Voltage", 'V', VOLTAGE, 'I*R',
+                [('I', CURRENT), ('R', RESISTANCE)], ['ohm', 'voltage']),
+        Formula('ohm_current', "Current", 'I', CURRENT, 'V/R',
+                [('V', VOLTAGE), ('R', RESISTANCE)], ['ohm', 'current']),
+        Formula('electrical_power', "Electrical power", 'P', POWER, 'V*I',
+                [('V', VOLTAGE), ('I', CURRENT)], ['power']),
+        Formula('ideal_gas_pressure', "Pressure (ideal gas law)", 'P', PRESSURE, 'n*R_gas*T/V',
+                [('n', AMOUNT), ('T', TEMPERATURE), ('V', VOLUME)], ['ideal gas', 'gas', 'pressure'], ['R_gas']),
+        Formula('ideal_gas_volume', "Volume (ideal gas law)", 'V', VOLUME, 'n*R_gas*T/P',
+                [('n', AMOUNT), ('T', TEMPERATURE), ('P', PRESSURE)], ['ideal gas', 'gas', 'volume'], ['R_gas']),
+        Formula('ideal_gas_temperature', "Temperature (ideal gas law)", 'T', TEMPERATURE, 'P*V/(n*R_gas)',
+                [('P', PRESSURE), ('V', VOLUME), ('n', AMOUNT)], ['ideal gas', 'gas', 'temperature'], ['R_gas']),
+        Formula('wavelength', "Wavelength", 'λ', LENGTH, 'v/f',
+                [('v', VELOCITY), ('f', FREQUENCY)], ['wavelength', 'wave']),
+    ]
+
+
+def __getattr__(name):
+    # FORMULAS stays importable without compiling the registry at import time
+    if name == 'FORMULAS':
+        return registered_formulas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def assign_inputs(formula, quantities):
+    """Map each formula input to the next unused quantity of the same dimension, or None if one is missing"""
+    remaining = list(quantities)
+    assignment = {}
+    for name, dim in formula.inputs:
+        match = next((q for q in remaining if q.dimension == dim), None)
+        if match is None:
+            return None
+        assignment[name] = match
+        remaining.remove(match)
+    return assignment
+
+
+def match_formulas(question, quantities):
+    """
+    Formulas the question asks about that can be evaluated from its quantities.
+
+    A formula qualifies when at least one of its keywords appears in the question and every input
+    can be filled by an extracted quantity of the right dimension.
+
+    Returns:
+        list: (Formula, {input name: Quantity}) pairs, best keyword match first
+    """
+    question_lower = question.lower()
+    candidates = []
+    for formula in registered_formulas():
+        score = sum(keyword in question_lower for keyword in formula.keywords)
+        if not score:
+            continue
+        assignment = assign_inputs(formula, quantities)
+        if assignment is not None:
+            candidates.append((score, len(formula.inputs), formula, assignment))
+    candidates.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [(formula, assignment) for _, _, formula, assignment in candidates]
@@ -0,0 +1,94 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Cold import budget per agent module in milliseconds, measured in a fresh interpreter
+IMPORT_BUDGETS_MS = {
+    'math_agent': 100.0,
+    'physics_agent': 60.0,
+    'chemistry_agent': 60.0,
+}
+IMPORT_TIME_PATTERN = r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)'
+
+
+def profile_import(module, repeat=3):
+    """
+    Import a module in fresh interpreters under ``-X importtime``.
+
+    Returns:
+        tuple: (median wall-clock import time in ms, {imported module: (self ms, cumulative ms)}
+        from the run closest to the median)
+    """
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=HERE, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+        modules = {}
+        total = None
+        for match in re.finditer(IMPORT_TIME_PATTERN, result.stderr, re.MULTILINE):
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+            if name == module and len(indent) == 1:
+                total = int(cumulative_us) / 1000
+        if total is None:
+            # Already imported during interpreter startup
+            total = modules.get(module, (0.0, 0.0))[1]
+        runs.append((total, modules))
+    runs.sort(key=lambda run: run[0])
+    return runs[len(runs) // 2]
+
+
+def by_package(modules):
+    """Self time summed over each top-level package (numpy, sympy, ...), interpreter startup included"""
+    totals = defaultdict(float)
+    for name, (self_ms, _) in modules.items():
+        totals[name.split('.')[0]] += self_ms
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def report(module, total, modules, top=10):
+    lines = [f"{module}: {total:.1f} ms cold import"]
+    for package, self_ms in by_package(modules)[:top]:
+        lines.append(f"  {self_ms:9.1f} ms  {package}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report per-package import cost of the agent modules and check it against a budget.")
+    parser.add_argument('modules', nargs='*', default=list(IMPORT_BUDGETS_MS), help="Modules to profile (default: the agents)")
+    parser.add_argument('--repeat', type=int, default=3, help="Fresh interpreters per module; the median run is reported")
+    parser.add_argument('--top', type=int, default=10, help="Packages listed per module")
+    parser.add_argument('--check', action='store_true', help="Exit with status 1 if a module exceeds its budget")
+    parser.add_argument('--budget-ms', type=float, help="Budget for every module, overriding IMPORT_BUDGETS_MS")
+    args = parser.parse_args(argv)
+
+    over_budget = []
+    for module in args.modules:
+        total, modules = profile_import(module, args.repeat)
+        print(report(module, total, modules, args.top))
+        budget = args.budget_ms or IMPORT_BUDGETS_MS.get(module)
+        if budget is not None:
+            status = 'over budget' if total > budget else 'ok'
+            print(f"  budget {budget:.0f} ms: {status}")
+            if total > budget:
+                over_budget.append(module)
+        print()
+
+    if args.check and over_budget:
+        print(f"Cold import over budget: {', '.join(over_budget)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Return module ``name`` without executing it until one of its attributes is first used.
+
+    Agent modules bind NumPy and SymPy this way so that importing them (in a worker, a test or a
+    script that only needs one code path) does not pay for libraries a question may never touch.
+    A module that is already imported is returned as is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazySymbols:
+    """
+    Mixin that creates the SymPy symbols named in ``SYMBOL_NAMES`` as attributes on first access.
+
+    Agents keep ``self.x`` and friends without importing SymPy when they are constructed.
+    """
+
+    SYMBOL_NAMES = ()
+
+    def __getattr__(self, name):
+        if name in type(self).SYMBOL_NAMES:
+            symbol = lazy_import('sympy').Symbol(name)
+            setattr(self, name, symbol)
+            return symbol
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
@@ -1,12 +1,38 @@
-import numpy as np
-import sympy as sp
-from sympy.parsing.sympy_parser import parse_expr
 import re
+from lazy_imports import LazySymbols, lazy_import
+from sympy_cache import SymbolicCache
+from sympy_pool import SymbolicTimeout, PoolSaturated, SymbolicWorkerError
+from numeric_fallback import compile_expression, find_roots, integrate_definite, estimate_limit
+from plot_sampling import DEFAULT_PIXELS, plot_payload
+from matrix_engine import EXACT_SIZE_LIMIT, parse_matrices, requested_operations, analyze_matrix
 
-class MathAgent:
-    def __init__(self):
-        self.x, self.y, self.z = sp.symbols('x y z')
-        self.t = sp.symbols('t')
+PLOT_PATTERN = r'(?:plot|graph|sketch)(?:\s+of|\s+the\s+function)?\s+(?:y\s*=\s*|f\(x\)\s*=\s*)?(.+?)(?:\s+(?:from|for|on|over)\s+(?:x\s*(?:=|in)\s*)?\[?\s*(-?[\w.]+)\s*(?:to|,)\s*(-?[\w.]+)\s*\]?)?\s*[?.]?$'
+# A plot request starts with the command, so 'graph' or 'plot' elsewhere in a question does not trigger it
+PLOT_COMMAND_PATTERN = r'\s*(?:(?:please|can you|could you)\s+)?(?:plot|graph|sketch)\b'
+DEFAULT_PLOT_DOMAIN = (-10, 10)
+
+np = lazy_import('numpy')
+sp = lazy_import('sympy')
+
+# Failures of symbolic work that are answered numerically instead
+FALLBACK_ERRORS = (SymbolicTimeout, PoolSaturated, SymbolicWorkerError, NotImplementedError)
+
+
+def _is_finite(result):
+    """Whether a SymPy result is free of nan, complex infinity and infinities"""
+    return not result.has(sp.nan, sp.zoo, sp.oo, -sp.oo)
+
+
+class MathAgent(LazySymbols):
+    # Created on first use so that constructing the agent does not import SymPy
+    SYMBOL_NAMES = ('x', 'y', 'z', 't')
+
+    def __init__(self, cache_size=1024, cache_path=None, pool=None, exact_matrix_size=EXACT_SIZE_LIMIT):
+        # Memoizes parsing and solve/diff/integrate/limit results; cache_path enables the on-disk tier
+        # When a SymbolicWorkerPool is given, cache misses run in it under the pool's deadline
+        self.cache = SymbolicCache(maxsize=cache_size, path=cache_path, runner=pool.run if pool else None)
+        # Integer/fraction matrices up to this size are solved exactly; larger ones use NumPy
+        self.exact_matrix_size = exact_matrix_size
         
     def process_question(self, question):
         """
@@ -21,7 +47,9 @@ class MathAgent:
         question_lower = question.lower()
         
         # Check for different types of math problems
-        if any(keyword in question_lower for keyword in ['solve', 'equation']):
+        if re.match(PLOT_COMMAND_PATTERN, question_lower):
+            return self._plot_function(question)
+        elif any(keyword in question_lower for keyword in ['solve', 'equation']):
             return self._solve_equation(question)
         elif any(keyword in question_lower for keyword in ['derivative', 'differentiate']):
             return self._find_derivative(question)
@@ -29,7 +57,7 @@ class MathAgent:
             return self._find_integral(question)
         elif any(keyword in question_lower for keyword in ['limit']):
             return self._find_limit(question)
-        elif any(keyword in question_lower for keyword in ['matrix']):
+        elif any(keyword in question_lower for keyword in ['matrix', 'determinant', 'eigen']):
             return self._matrix_operations(question)
         else:
             # General math explanation
@@ -38,6 +66,49 @@ class MathAgent:
                 'confidence': 0.3
             }
     
+    def cache_stats(self):
+        """Return hit/miss statistics of the symbolic result cache"""
+        return self.cache.stats()
+
+    def plot_data(self, expression, low=DEFAULT_PLOT_DOMAIN[0], high=DEFAULT_PLOT_DOMAIN[1], variable=None, pixels=DEFAULT_PIXELS):
+        """
+        Plot-ready samples of a single-variable expression.
+
+        Args:
+            expression (str or sp.Expr): The function to plot
+            low, high (float): Domain of the plot
+            variable (str): Independent variable; inferred when the expression has only one
+            pixels (int): Width in pixels the output is downsampled for
+
+        Returns:
+            dict: plot_payload data plus the parsed 'expression' and 'variable' as strings
+        """
+        function = self.cache.parse(expression) if isinstance(expression, str) else expression
+        free = sorted(function.free_symbols, key=str)
+        if variable is not None:
+            var = sp.Symbol(variable)
+        elif len(free) <= 1:
+            var = free[0] if free else self.x
+        else:
+            raise ValueError(f"{function} has several variables ({', '.join(map(str, free))}); say which one to plot against")
+        if set(free) - {var}:
+            raise ValueError(f"{function} depends on {', '.join(str(s) for s in free if s != var)} besides {var}")
+        if not low < high:
+            raise ValueError("The start of the plot range must be below its end")
+
+        payload = plot_payload(compile_expression(function, var), low, high, pixels)
+        payload['expression'] = str(function)
+        payload['variable'] = str(var)
+        return payload
+
+    def _deadline_response(self, error):
+        """Answer returned when symbolic work overran its deadline or the worker pool was full"""
+        return {
+            'answer': f"This problem could not be solved symbolically in the time available ({str(error)}). Try simplifying the expression or splitting it into smaller steps.",
+            'confidence': 0.2,
+            'timed_out': isinstance(error, SymbolicTimeout)
+        }
+
     def _solve_equation(self, question):
         """Attempt to solve an equation from the question"""
         try:
@@ -47,10 +118,18 @@ class MathAgent:
                 equation_str = equation_match.group(1)
                 sides = equation_str.split('=')
                 if len(sides) == 2:
-                    left_side = parse_expr(sides[0].strip())
-                    right_side = parse_expr(sides[1].strip())
+                    # Drop leading prose such as "Solve the equation" before the left-hand side
+                    left_str = re.sub(r'^.*\b(?:solve|equation)\b\s*:?', '', sides[0], flags=re.IGNORECASE)
+                    left_side = self.cache.parse(left_str.strip())
+                    right_side = self.cache.parse(sides[1].strip())
                     equation = sp.Eq(left_side, right_side)
-                    solution = sp.solve(equation)
+                    try:
+                        solution = self.cache.compute('solve', equation)
+                    except FALLBACK_ERRORS as e:
+                        fallback = self._numeric_roots(left_side - right_side, e)
+                        if fallback is None:
+                            raise
+                        return fallback
                     return {
                         'answer': f"The solution to the equation {equation} is {solution}",
                         'confidence': 0.9
@@ -60,6 +139,8 @@ class MathAgent:
                 'answer': "I couldn't identify a clear equation to solve. Please format your equation as 'expression = expression'.",
                 'confidence': 0.5
             }
+        except (SymbolicTimeout, PoolSaturated) as e:
+            return self._deadline_response(e)
         except Exception as e:
             return {
                 'answer': f"I encountered an error while trying to solve this equation: {str(e)}. Please check the format and try again.",
@@ -73,7 +154,7 @@ class MathAgent:
             function_match = re.search(r'derivative of ([^.?]+)', question)
             if function_match:
                 function_str = function_match.group(1).strip()
-                function = parse_expr(function_str)
+                function = self.cache.parse(function_str)
                 
                 # Determine the variable to differentiate with respect to
                 if 'with respect to' in question:
@@ -86,7 +167,7 @@ class MathAgent:
                 else:
                     var = self.x  # Default to x
                 
-                derivative = sp.diff(function, var)
+                derivative = self.cache.compute('diff', function, var)
                 return {
                     'answer': f"The derivative of {function} with respect to {var} is {derivative}",
                     'confidence': 0.9
@@ -96,6 +177,8 @@ class MathAgent:
                 'answer': "I couldn't identify a clear function to differentiate. Please specify the function after 'derivative of'.",
                 'confidence': 0.5
             }
+        except (SymbolicTimeout, PoolSaturated) as e:
+            return self._deadline_response(e)
         except Exception as e:
             return {
                 'answer': f"I encountered an error while finding the derivative: {str(e)}. Please check the format and try again.",
@@ -106,10 +189,14 @@ class MathAgent:
         """Find the integral of an expression"""
         try:
             # Try to extract a function from the question
-            function_match = re.search(r'integral of ([^.?]+)', question)
+            function_match = re.search(r'integral of (.+?)(?:\?|\.(?!\d)|$)', question)
             if function_match:
                 function_str = function_match.group(1).strip()
-                function = parse_expr(function_str)
+                # Definite integrals are written as '<function> from <a> to <b>'
+                bounds_match = re.search(r'^(.*?)\s+from\s+(\S+)\s+to\s+(\S+)', function_str)
+                if bounds_match:
+                    function_str = bounds_match.group(1)
+                function = self.cache.parse(function_str)
                 
                 # Determine the variable to integrate with respect to
                 if 'with respect to' in question:
@@ -122,7 +209,15 @@ class MathAgent:
                 else:
                     var = self.x  # Default to x
                 
-                integral = sp.integrate(function, var)
+                if bounds_match:
+                    return self._definite_integral(function, var, bounds_match.group(2), bounds_match.group(3))
+
+                integral = self.cache.compute('integrate', function, var)
+                if not _is_finite(integral):
+                    return {
+                        'answer': f"I couldn't find a finite antiderivative of {function} with respect to {var} (SymPy gives {integral}). Please check that the function is defined.",
+                        'confidence': 0.4
+                    }
                 return {
                     'answer': f"The integral of {function} with respect to {var} is {integral} + C",
                     'confidence': 0.9
@@ -132,6 +227,8 @@ class MathAgent:
                 'answer': "I couldn't identify a clear function to integrate. Please specify the function after 'integral of'.",
                 'confidence': 0.5
             }
+        except (SymbolicTimeout, PoolSaturated) as e:
+            return self._deadline_response(e)
         except Exception as e:
             return {
                 'answer': f"I encountered an error while finding the integral: {str(e)}. Please check the format and try again.",
@@ -148,11 +245,16 @@ class MathAgent:
                 var_str = function_match.group(2).strip()
                 point_str = function_match.group(3).strip()
                 
-                function = parse_expr(function_str)
+                function = self.cache.parse(function_str)
                 var = sp.Symbol(var_str)
-                point = parse_expr(point_str)
+                point = self.cache.parse(point_str)
                 
-                limit = sp.limit(function, var, point)
+                try:
+                    limit = self.cache.compute('limit', function, var, point)
+                    if limit.has(sp.Limit):
+                        raise NotImplementedError("SymPy returned the limit unevaluated")
+                except FALLBACK_ERRORS as e:
+                    return self._numeric_limit(function, var, point, e)
                 return {
                     'answer': f"The limit of {function} as {var} approaches {point} is {limit}",
                     'confidence': 0.9
@@ -162,15 +264,158 @@ class MathAgent:
                 'answer': "I couldn't identify a clear limit problem. Please format as 'limit of [function] as [variable] approaches [value]'.",
                 'confidence': 0.5
             }
+        except (SymbolicTimeout, PoolSaturated) as e:
+            return self._deadline_response(e)
         except Exception as e:
             return {
                 'answer': f"I encountered an error while finding the limit: {str(e)}. Please check the format and try again.",
                 'confidence': 0.3
             }
     
+    def _plot_function(self, question):
+        """Sample a function named in the question for the frontend to draw"""
+        match = re.search(PLOT_PATTERN, question.strip(), re.IGNORECASE)
+        if not match:
+            return {
+                'answer': "I couldn't identify the function to plot. Try something like 'plot sin(x)/x from -10 to 10'.",
+                'confidence': 0.4
+            }
+        try:
+            low, high = DEFAULT_PLOT_DOMAIN
+            if match.group(2):
+                low = float(self.cache.parse(match.group(2)))
+                high = float(self.cache.parse(match.group(3)))
+            plot = self.plot_data(match.group(1).strip(), low, high)
+        except (SymbolicTimeout, PoolSaturated) as e:
+            return self._deadline_response(e)
+        except Exception as e:
+            return {
+                'answer': f"I encountered an error while preparing the plot: {str(e)}. Please check the format and try again.",
+                'confidence': 0.3
+            }
+        if plot['length'] == 0:
+            return {
+                'answer': f"{plot['expression']} is not defined for any real {plot['variable']} from {low:g} to {high:g}, so there is nothing to plot. Try another range.",
+                'confidence': 0.8
+            }
+        return {
+            'answer': f"Here is the graph of {plot['expression']} for {plot['variable']} from {low:g} to {high:g}.",
+            'confidence': 0.9,
+            'plot': plot
+        }
+
+    def _definite_integral(self, function, var, lower_str, upper_str):
+        """Evaluate a definite integral symbolically, falling back to quadrature"""
+        lower = self.cache.parse(lower_str)
+        upper = self.cache.parse(upper_str)
+        try:
+            integral = self.cache.compute('integrate', function, (var, lower, upper))
+            if integral.has(sp.Integral):
+                raise NotImplementedError("no closed form was found")
+            if integral in (sp.oo, -sp.oo):
+                return {
+                    'answer': f"The definite integral of {function} with respect to {var} from {lower} to {upper} diverges to {integral}",
+                    'confidence': 0.9
+                }
+            if not _is_finite(integral):
+                # e.g. nan for an integrand with a pole inside the interval
+                raise NotImplementedError(f"the symbolic result {integral} is not finite")
+        except FALLBACK_ERRORS as e:
+            result = integrate_definite(function, var, lower, upper)
+            if result is None:
+                return {
+                    'answer': f"The integral of {function} from {lower} to {upper} could not be evaluated symbolically ({str(e)}) and does not converge numerically.",
+                    'confidence': 0.4
+                }
+            return self._numeric_response(
+                f"The definite integral of {function} with respect to {var} from {lower} to {upper} is approximately {result['value']:.10g}",
+                result, "Symbolic integration", e
+            )
+        return {
+            'answer': f"The definite integral of {function} with respect to {var} from {lower} to {upper} is {integral}",
+            'confidence': 0.9
+        }
+
+    def _numeric_roots(self, expression, error):
+        """Numeric roots of expression = 0 for single-variable equations, or None"""
+        if len(expression.free_symbols) != 1:
+            return None
+        var = next(iter(expression.free_symbols))
+        result = find_roots(expression, var)
+        if not result['value']:
+            return {
+                'answer': f"The equation {expression} = 0 could not be solved symbolically ({str(error)}) and no real roots were found numerically in [-100, 100].",
+                'confidence': 0.4,
+                'numeric': True
+            }
+        roots = ", ".join(f"{root:.10g}" for root in result['value'])
+        return self._numeric_response(f"The real solutions of {expression} = 0 are approximately {var} = {roots}", result, "Symbolic solving", error)
+
+    def _numeric_limit(self, function, var, point, error):
+        """Numeric estimate of a limit whose symbolic evaluation failed"""
+        result = estimate_limit(function, var, point)
+        if result['value'] is None and any(np.isnan(value) for value in result['sides'].values()):
+            return {
+                'answer': f"The limit of {function} as {var} approaches {point} could not be evaluated symbolically ({str(error)}), "
+                          f"and could not be determined numerically because the function cannot be evaluated reliably near {point}.",
+                'confidence': 0.3,
+                'numeric': True
+            }
+        if result['value'] is None:
+            sides = ", ".join(f"from the {'right' if side == '+' else 'left'} ≈ {value:.10g}" for side, value in result['sides'].items())
+            return {
+                'answer': f"The limit of {function} as {var} approaches {point} could not be evaluated symbolically ({str(error)}). Numerically the one-sided values disagree ({sides}), so the limit does not appear to exist.",
+                'confidence': 0.5,
+                'numeric': True
+            }
+        return self._numeric_response(
+            f"The limit of {function} as {var} approaches {point} is approximately {result['value']:.10g}",
+            result, "Symbolic evaluation of the limit", error
+        )
+
+    def _numeric_response(self, statement, result, attempted, error):
+        """Label a numeric fallback answer with its method and error estimate"""
+        reason = " ".join(str(error).split())
+        return {
+            'answer': f"{statement} (numeric result, estimated error {result['error']:.2g}). {attempted} did not succeed ({reason}), so this was computed with {result['method']}.",
+            'confidence': 0.75,
+            'numeric': True,
+            'value': result['value'],
+            'error_estimate': result['error']
+        }
+
     def _matrix_operations(self, question):
         """Perform matrix operations"""
-        # This is a simplified implementation
+        try:
+            matrices = parse_matrices(question)
+        except ValueError as e:
+            return {
+                'answer': f"I couldn't read the matrix in your question: {str(e)}. Please write it as [[1, 2], [3, 4]], [1 2; 3 4] or a LaTeX pmatrix.",
+                'confidence': 0.4
+            }
+
+        if matrices:
+            operations = requested_operations(question)
+            if not operations:
+                operations = ['determinant', 'rank', 'eigen'] if len(matrices[0]) == len(matrices[0][0]) else ['rank']
+
+            sections = []
+            for index, rows in enumerate(matrices):
+                try:
+                    exact, results = analyze_matrix(rows, operations, self.exact_matrix_size)
+                except Exception as e:
+                    return {
+                        'answer': f"I encountered an error while working on matrix {index + 1}: {str(e)}. Please check the matrix and try again.",
+                        'confidence': 0.3
+                    }
+                arithmetic = "exact arithmetic" if exact else "floating point"
+                lines = "\n".join(f"- {label}: {value}" for label, value in results)
+                sections.append(f"Matrix {index + 1} ({len(rows)}×{len(rows[0])}, {arithmetic}):\n{lines or '- The requested operations need a square matrix'}")
+            return {
+                'answer': "\n\n".join(sections),
+                'confidence': 0.9
+            }
+
         return {
             'answer': "For matrix operations, I would need the specific matrices and the operation you want to perform (addition, multiplication, determinant, inverse, etc.). Please provide these details.",
             'confidence': 0.7
@@ -0,0 +1,204 @@
+import re
+from fractions import Fraction
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+sp = lazy_import('sympy')
+
+# Matrices whose larger dimension is at most this size, with integer or fraction entries, are
+# computed exactly with SymPy; anything else goes through NumPy/LAPACK in floating point
+EXACT_SIZE_LIMIT = 6
+# Exact eigenvalues beyond cubics are CRootOf objects that take seconds and cannot be read, so
+# larger matrices get floating-point eigenvalues even when the rest is exact
+EXACT_EIGEN_SIZE_LIMIT = 3
+# Singular values come from the symmetric Gram matrix, whose three real roots already need complex
+# cube roots to write exactly, so only up to 2 singular values are kept exact
+EXACT_SVD_SIZE_LIMIT = 2
+
+OPERATION_PATTERNS = {
+    'determinant': r'\bdet(?:erminant)?\b',
+    'inverse': r'\binver(?:se|t|ted|sion)\b',
+    'rank': r'\brank\b',
+    'eigen': r'\beigen',
+    'lu': r'\blu\b',
+    'qr': r'\bqr\b',
+    'svd': r'\bsvd\b|singular value',
+}
+
+LATEX_MATRIX_PATTERN = r'\\begin\{([pbvBV]?matrix)\}(.*?)\\end\{\1\}'
+NESTED_MATRIX_PATTERN = r'\[\s*(\[[^\[\]]*\](?:\s*,?\s*\[[^\[\]]*\])*)\s*\]'
+ROW_LIST_MATRIX_PATTERN = r'\[([^\[\]]*;[^\[\]]*)\]'
+
+
+def _parse_entry(text):
+    """Parse one matrix entry, keeping integers and fractions exact"""
+    text = text.strip().replace('−', '-')
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    if '\\' in text:
+        text = re.sub(r'\\frac\{([-+]?\d+)\}\{(\d+)\}', r'\1/\2', text)
+    if re.fullmatch(r'[-+]?\d+/\d+', text):
+        return Fraction(text)
+    return float(text)
+
+
+def _parse_rows(rows, cell_separator):
+    matrix = []
+    for row in rows:
+        cells = [cell for cell in re.split(cell_separator, row.strip()) if cell.strip()]
+        if cells:
+            matrix.append([_parse_entry(cell) for cell in cells])
+    if not matrix or any(len(row) != len(matrix[0]) for row in matrix):
+        raise ValueError("Matrix rows have different lengths")
+    return matrix
+
+
+def parse_matrices(text):
+    """
+    Find every matrix written in the text, in order of appearance.
+
+    Supported notations are LaTeX (``\\begin{pmatrix} 1 & 2 \\\\ 3 & 4 \\end{pmatrix}``, also
+    bmatrix/vmatrix/matrix), nested brackets (``[[1, 2], [3, 4]]``) and row lists
+    (``[1 2; 3 4]``).
+
+    Returns:
+        list: Each matrix as a list of rows of ints, Fractions or floats
+    """
+    found = []
+    for match in re.finditer(LATEX_MATRIX_PATTERN, text, re.DOTALL):
+        found.append((match.start(), _parse_rows(re.split(r'\\\\', match.group(2)), r'&')))
+    # Blank out LaTeX matches so their contents are not read again as bracket notation
+    text = re.sub(LATEX_MATRIX_PATTERN, lambda m: ' ' * len(m.group(0)), text, flags=re.DOTALL)
+
+    for match in re.finditer(NESTED_MATRIX_PATTERN, text):
+        found.append((match.start(), _parse_rows(re.findall(r'\[([^\[\]]*)\]', match.group(1)), r'[,\s]+')))
+    text = re.sub(NESTED_MATRIX_PATTERN, lambda m: ' ' * len(m.group(0)), text)
+
+    for match in re.finditer(ROW_LIST_MATRIX_PATTERN, text):
+        found.append((match.start(), _parse_rows(match.group(1).split(';'), r'[,\s]+')))
+
+    return [matrix for _, matrix in sorted(found, key=lambda item: item[0])]
+
+
+def requested_operations(text):
+    """Operations named in the text, in a fixed order"""
+    text = text.lower()
+    return [name for name, pattern in OPERATION_PATTERNS.items() if re.search(pattern, text)]
+
+
+def is_exact(rows, exact_size_limit=EXACT_SIZE_LIMIT):
+    """Whether a matrix qualifies for exact SymPy arithmetic"""
+    small = max(len(rows), len(rows[0])) <= exact_size_limit
+    return small and all(isinstance(entry, (int, Fraction)) for row in rows for entry in row)
+
+
+def _format(matrix):
+    if isinstance(matrix, np.ndarray):
+        return np.array2string(matrix, precision=6, suppress_small=True, threshold=64, edgeitems=3, max_line_width=120)
+    return str(matrix.tolist())
+
+
+def _lu_numeric(a):
+    """Doolittle LU with partial pivoting: returns P, L, U with P @ a = L @ U"""
+    n = a.shape[0]
+    u = a.copy()
+    l = np.eye(n)
+    perm = np.arange(n)
+    for k in range(n - 1):
+        pivot = k + int(np.argmax(np.abs(u[k:, k])))
+        if pivot != k:
+            u[[k, pivot], :] = u[[pivot, k], :]
+            l[[k, pivot], :k] = l[[pivot, k], :k]
+            perm[[k, pivot]] = perm[[pivot, k]]
+        if u[k, k] == 0:
+            continue
+        factors = u[k + 1:, k] / u[k, k]
+        l[k + 1:, k] = factors
+        # Rank-one update of the trailing block, one BLAS call per column
+        u[k + 1:, k:] -= np.outer(factors, u[k, k:])
+    return np.eye(n)[perm], l, u
+
+
+def _exact_results(m, operations):
+    results = []
+    square = m.rows == m.cols
+    for operation in operations:
+        if operation == 'determinant' and square:
+            results.append(("Determinant", str(m.det())))
+        elif operation == 'inverse' and square:
+            results.append(("Inverse", "The matrix is singular, so it has no inverse" if m.det() == 0 else _format(m.inv())))
+        elif operation == 'rank':
+            results.append(("Rank", str(m.rank())))
+        elif operation == 'eigen' and square and m.rows > EXACT_EIGEN_SIZE_LIMIT:
+            for label, value in _numeric_results(np.array(m.tolist(), dtype=float), ['eigen']):
+                results.append((f"{label} (floating point)", value))
+        elif operation == 'eigen' and square:
+            for value, multiplicity, vectors in m.eigenvects():
+                basis = ", ".join(str(list(v)) for v in vectors)
+                results.append((f"Eigenvalue {value} (multiplicity {multiplicity})", f"eigenvectors {basis}"))
+        elif operation == 'lu' and square:
+            l, u, swaps = m.LUdecomposition()
+            results.append(("LU decomposition", f"L = {_format(l)}, U = {_format(u)}, row swaps = {swaps}"))
+        elif operation == 'qr':
+            q, r = m.QRdecomposition()
+            results.append(("QR decomposition", f"Q = {_format(q)}, R = {_format(r)}"))
+        elif operation == 'svd' and min(m.rows, m.cols) > EXACT_SVD_SIZE_LIMIT:
+            for label, value in _numeric_results(np.array(m.tolist(), dtype=float), ['svd']):
+                results.append((f"{label} (floating point)", value))
+        elif operation == 'svd':
+            # Exact SVD factors are unwieldy radicals, so only the singular values are kept exact
+            results.append(("Singular values", str(m.singular_values())))
+    return results
+
+
+def _numeric_results(a, operations):
+    results = []
+    square = a.shape[0] == a.shape[1]
+    for operation in operations:
+        if operation == 'determinant' and square:
+            sign, log_det = np.linalg.slogdet(a)
+            results.append(("Determinant", f"{sign * np.exp(log_det):.10g}"))
+        elif operation == 'inverse' and square:
+            if np.linalg.cond(a) > 1.0 / np.finfo(float).eps:
+                results.append(("Inverse", "The matrix is singular to working precision, so it has no inverse"))
+            else:
+                results.append(("Inverse", _format(np.linalg.inv(a))))
+        elif operation == 'rank':
+            results.append(("Rank", str(np.linalg.matrix_rank(a))))
+        elif operation == 'eigen' and square:
+            if np.allclose(a, a.T):
+                values, vectors = np.linalg.eigh(a)
+            else:
+                values, vectors = np.linalg.eig(a)
+            results.append(("Eigenvalues", _format(values)))
+            results.append(("Eigenvectors (columns)", _format(vectors)))
+        elif operation == 'lu' and square:
+            p, l, u = _lu_numeric(a)
+            results.append(("LU decomposition (P·A = L·U)", f"P = {_format(p)}, L = {_format(l)}, U = {_format(u)}"))
+        elif operation == 'qr':
+            q, r = np.linalg.qr(a)
+            results.append(("QR decomposition", f"Q = {_format(q)}, R = {_format(r)}"))
+        elif operation == 'svd':
+            u, s, vt = np.linalg.svd(a)
+            results.append(("SVD (A = U·Σ·Vᵀ)", f"singular values = {_format(s)}, U = {_format(u)}, Vᵀ = {_format(vt)}"))
+    return results
+
+
+def analyze_matrix(rows, operations, exact_size_limit=EXACT_SIZE_LIMIT):
+    """
+    Run the requested operations on one matrix.
+
+    Args:
+        rows (list): Matrix rows as returned by parse_matrices
+        operations (list): Names from OPERATION_PATTERNS
+        exact_size_limit (int): Largest dimension computed exactly with SymPy
+
+    Returns:
+        tuple: (whether exact arithmetic was used, list of (label, formatted result))
+    """
+    if is_exact(rows, exact_size_limit):
+        return True, _exact_results(sp.Matrix(rows), operations)
+    return False, _numeric_results(np.array(rows, dtype=float), operations)
@@ -1,17 +1,17 @@
-import numpy as np
-import sympy as sp
 import re
+from lazy_imports import LazySymbols, lazy_import
+from quantities import SI_UNITS, extract_quantities, format_quantity
+from formulas import match_formulas
+from simulation import DEFAULT_MAX_POINTS, simulate
+
+np = lazy_import('numpy')
+
+class PhysicsAgent(LazySymbols):
+    # Common symbols used in physics (time, position, velocity, acceleration, mass, force, energy),
+    # created on first use so that constructing the agent does not import SymPy
+    SYMBOL_NAMES = ('t', 'x', 'y', 'z', 'v', 'a', 'm', 'F', 'E')
 
-class PhysicsAgent:
     def __init__(self):
-        # Define common symbols used in physics
-        self.t = sp.Symbol('t')  # time
-        self.x, self.y, self.z = sp.symbols('x y z')  # position
-        self.v = sp.Symbol('v')  # velocity
-        self.a = sp.Symbol('a')  # acceleration
-        self.m = sp.Symbol('m')  # mass
-        self.F = sp.Symbol('F')  # force
-        self.E = sp.Symbol('E')  # energy
         self.g = 9.81  # acceleration due to gravity (m/s^2)
         
     def process_question(self, question):
@@ -25,6 +25,11 @@ class PhysicsAgent:
             dict: Response containing answer and confidence
         """
         question_lower = question.lower()
+
+        # Questions that carry quantities with units are evaluated numerically when a formula applies
+        computed = self._evaluate_formulas(question)
+        if computed is not None:
+            return computed
         
         # Check for different types of physics problems
         if any(keyword in question_lower for keyword in ['newton', 'force', 'motion']):
@@ -44,6 +49,51 @@ class PhysicsAgent:
                 'confidence': 0.3
             }
     
+    def simulate(self, system, initial_state, t_end, params=None, method='rk45', max_points=DEFAULT_MAX_POINTS):
+        """
+        Integrate a batch of trajectories and return them ready to plot.
+
+        Args:
+            system (str): 'projectile', 'oscillator' or 'pendulum'
+            initial_state (list): One state or a list of states, in SI units
+            t_end (float): Duration in seconds
+            params (dict): Scalars, or one value per trajectory for a parameter sweep
+            method (str): 'rk45' (adaptive) or 'rk4' (fixed step)
+            max_points (int): Samples per trajectory sent to the frontend
+
+        Returns:
+            dict: JSON-serializable times, labels and trajectories (batch x points x state)
+        """
+        params = dict(params or {})
+        if system in ('projectile', 'pendulum'):
+            params.setdefault('g', self.g)
+        result = simulate(system, initial_state, t_end, params=params, method=method, max_points=max_points)
+        return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in result.items()}
+
+    def _evaluate_formulas(self, question):
+        """Evaluate every registered formula the question asks for, using the quantities it gives"""
+        quantities = extract_quantities(question)
+        if not quantities:
+            return None
+        matches = match_formulas(question, quantities)
+        if not matches:
+            return None
+
+        given = ", ".join(format_quantity(q) for q in quantities)
+        lines = []
+        values = {}
+        for formula, assignment in matches:
+            value = formula.evaluate(constants={'g': self.g}, **{name: q.si_value for name, q in assignment.items()})
+            inputs = ", ".join(f"{name} = {format_quantity(q)}" for name, q in assignment.items())
+            lines.append(f"- {formula.description}: {formula.output} = {formula.expression} with {inputs} gives {formula.output} = {value:.4g} {SI_UNITS[formula.output_dimension]}")
+            values[formula.name] = value
+
+        return {
+            'answer': "Given: " + given + " (converted to SI units)\n\n" + "\n".join(lines),
+            'values': values,
+            'confidence': 0.85
+        }
+
     def _mechanics(self, question):
         """Handle mechanics-related questions"""
         question_lower = question.lower()
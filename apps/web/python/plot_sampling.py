@@ -0,0 +1,143 @@
+import base64
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_PIXELS = 800
+INITIAL_SAMPLES = 1025
+MAX_SAMPLES = 50000
+REFINEMENT_ROUNDS = 12
+# Midpoints further than this fraction of the plotted y-range from the chord get refined
+FLATNESS_TOLERANCE = 1e-3
+
+
+def _robust_range(y):
+    """y-limits that ignore the spikes next to poles so the rest of the curve stays readable"""
+    finite = y[np.isfinite(y)]
+    if not finite.size:
+        return -1.0, 1.0
+    low, high = finite.min(), finite.max()
+    core_low, core_high = np.percentile(finite, [2, 98])
+    # Only trim to the central values when the extremes dwarf them
+    if high - low > 10 * (core_high - core_low):
+        low, high = core_low, core_high
+    if high - low < 1e-12:
+        low, high = low - 1.0, high + 1.0
+    pad = 0.1 * (high - low)
+    return float(low - pad), float(high + pad)
+
+
+def sample_adaptive(f, low, high, initial=INITIAL_SAMPLES, max_samples=MAX_SAMPLES, rounds=REFINEMENT_ROUNDS):
+    """
+    Sample a vectorized function on [low, high], refining where a uniform grid would misdraw it.
+
+    Each round evaluates the midpoints of every interval that needs it in one array call: intervals
+    whose midpoint leaves the chord by more than a fraction of the plotted range (steep or curved
+    regions) and intervals with one finite and one undefined end (edges of the domain, poles).
+
+    Returns:
+        tuple: (x, y) sorted arrays; undefined points are NaN
+    """
+    x = np.linspace(low, high, initial)
+    y = f(x)
+    for _ in range(rounds):
+        y_low, y_high = _robust_range(y)
+        tolerance = FLATNESS_TOLERANCE * (y_high - y_low)
+        mid = 0.5 * (x[:-1] + x[1:])
+        finite = np.isfinite(y)
+        edge = finite[:-1] != finite[1:]
+        candidates = edge | (finite[:-1] & finite[1:])
+        # Stop splitting intervals that have reached floating-point resolution
+        candidates &= (x[1:] - x[:-1]) > 1e-9 * (high - low)
+        if not candidates.any() or x.size >= max_samples:
+            break
+        mid = mid[candidates]
+        y_mid = f(mid)
+        chord = 0.5 * (y[:-1] + y[1:])[candidates]
+        refine = edge[candidates] | (np.abs(y_mid - chord) > tolerance)
+        refine &= np.isfinite(y_mid) | edge[candidates]
+        if not refine.any():
+            break
+        budget = max_samples - x.size
+        keep = np.flatnonzero(refine)[:budget]
+        order = np.argsort(np.concatenate([x, mid[keep]]), kind='stable')
+        x = np.concatenate([x, mid[keep]])[order]
+        y = np.concatenate([y, y_mid[keep]])[order]
+    return x, y
+
+
+def break_at_poles(x, y):
+    """
+    Insert NaN between neighbouring samples that straddle a pole so the plot does not join them.
+
+    A pole shows up as a sign change whose jump is far larger than the plotted range.
+    """
+    y_low, y_high = _robust_range(y)
+    span = y_high - y_low
+    jump = np.abs(np.diff(y))
+    pole = (np.sign(y[:-1]) != np.sign(y[1:])) & (jump > 2 * span) & np.isfinite(jump)
+    if not pole.any():
+        return x, y
+    where = np.flatnonzero(pole) + 1
+    return np.insert(x, where, 0.5 * (x[where - 1] + x[where])), np.insert(y, where, np.nan)
+
+
+def downsample_m4(x, y, pixels=DEFAULT_PIXELS):
+    """
+    Reduce a sampled curve to at most four points per pixel column (M4 aggregation).
+
+    Keeping the first, last, minimum and maximum sample of every column reproduces the rasterized
+    line exactly at that width. Runs of defined values are bucketed separately so gaps survive.
+
+    Returns:
+        tuple: (x, y) with NaN separating disconnected pieces
+    """
+    finite = np.isfinite(y)
+    if not finite.any():
+        return x[:0], y[:0]
+    # Every run of finite samples is its own segment
+    segment = np.cumsum(np.concatenate([[True], finite[1:] & ~finite[:-1]]))
+    xf, yf, segment = x[finite], y[finite], segment[finite]
+    column = np.clip(((xf - x[0]) / (x[-1] - x[0]) * pixels).astype(int), 0, pixels - 1)
+    bucket = segment * (pixels + 1) + column
+
+    starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    ends = np.concatenate([starts[1:], [bucket.size]]) - 1
+    # Sorting by (bucket, y) puts each bucket's minimum first and maximum last
+    by_value = np.lexsort((yf, bucket))
+    minima = by_value[starts]
+    maxima = by_value[ends]
+    chosen = np.unique(np.concatenate([starts, ends, minima, maxima]))
+
+    xs, ys, segments = xf[chosen], yf[chosen], segment[chosen]
+    breaks = np.flatnonzero(segments[1:] != segments[:-1]) + 1
+    return np.insert(xs, breaks, 0.5 * (xs[breaks - 1] + xs[breaks])), np.insert(ys, breaks, np.nan)
+
+
+def encode_array(values, dtype='<f4'):
+    """Base64 of a little-endian typed array, readable in the browser as a Float32Array"""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def plot_payload(f, low, high, pixels=DEFAULT_PIXELS):
+    """
+    Sample, break at poles, downsample and encode a function for plotting.
+
+    Returns:
+        dict: 'x' and 'y' as base64 float32 arrays of 'length' points (NaN marks gaps),
+        'x_range' and a 'y_range' that ignores spikes near poles, and 'samples' evaluated
+    """
+    x, y = sample_adaptive(f, float(low), float(high))
+    samples = x.size
+    x, y = break_at_poles(x, y)
+    x, y = downsample_m4(x, y, pixels)
+    return {
+        'x': encode_array(x),
+        'y': encode_array(y),
+        'dtype': 'float32',
+        'length': int(x.size),
+        'x_range': [float(low), float(high)],
+        'y_range': list(_robust_range(y)),
+        'samples': int(samples),
+    }
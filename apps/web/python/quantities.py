@@ -0,0 +1,150 @@
+import math
+import re
+from collections import namedtuple
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+
+def dimension(M=0, L=0, T=0, I=0, K=0, N=0, A=0):
+    """Exponents of mass, length, time, current, temperature, amount and plane angle"""
+    return (M, L, T, I, K, N, A)
+
+
+DIMENSIONLESS = dimension()
+MASS = dimension(M=1)
+LENGTH = dimension(L=1)
+TIME = dimension(T=1)
+ANGLE = dimension(A=1)
+AREA = dimension(L=2)
+VOLUME = dimension(L=3)
+VELOCITY = dimension(L=1, T=-1)
+ACCELERATION = dimension(L=1, T=-2)
+FORCE = dimension(M=1, L=1, T=-2)
+ENERGY = dimension(M=1, L=2, T=-2)
+POWER = dimension(M=1, L=2, T=-3)
+PRESSURE = dimension(M=1, L=-1, T=-2)
+MOMENTUM = dimension(M=1, L=1, T=-1)
+SPRING_CONSTANT = dimension(M=1, T=-2)
+FREQUENCY = dimension(T=-1)
+CHARGE = dimension(T=1, I=1)
+CURRENT = dimension(I=1)
+VOLTAGE = dimension(M=1, L=2, T=-3, I=-1)
+RESISTANCE = dimension(M=1, L=2, T=-3, I=-2)
+TEMPERATURE = dimension(K=1)
+AMOUNT = dimension(N=1)
+
+DIMENSION_NAMES = {
+    DIMENSIONLESS: 'dimensionless', MASS: 'mass', LENGTH: 'length', TIME: 'time', ANGLE: 'angle',
+    AREA: 'area', VOLUME: 'volume', VELOCITY: 'velocity', ACCELERATION: 'acceleration',
+    FORCE: 'force', ENERGY: 'energy', POWER: 'power', PRESSURE: 'pressure', MOMENTUM: 'momentum',
+    SPRING_CONSTANT: 'spring constant', FREQUENCY: 'frequency', CHARGE: 'charge', CURRENT: 'current',
+    VOLTAGE: 'voltage', RESISTANCE: 'resistance', TEMPERATURE: 'temperature', AMOUNT: 'amount of substance'
+}
+
+# SI unit written out for each dimension the formulas produce
+SI_UNITS = {
+    MASS: 'kg', LENGTH: 'm', TIME: 's', ANGLE: 'rad', AREA: 'm²', VOLUME: 'm³', VELOCITY: 'm/s',
+    ACCELERATION: 'm/s²', FORCE: 'N', ENERGY: 'J', POWER: 'W', PRESSURE: 'Pa', MOMENTUM: 'kg·m/s',
+    SPRING_CONSTANT: 'N/m', FREQUENCY: 'Hz', CHARGE: 'C', CURRENT: 'A', VOLTAGE: 'V',
+    RESISTANCE: 'Ω', TEMPERATURE: 'K', AMOUNT: 'mol', DIMENSIONLESS: ''
+}
+
+# unit -> (scale to SI, offset added after scaling, dimension)
+UNITS = {
+    'kg': (1.0, 0.0, MASS), 'g': (1e-3, 0.0, MASS), 'mg': (1e-6, 0.0, MASS),
+    'kilograms': (1.0, 0.0, MASS), 'kilogram': (1.0, 0.0, MASS), 'grams': (1e-3, 0.0, MASS),
+    'm': (1.0, 0.0, LENGTH), 'cm': (1e-2, 0.0, LENGTH), 'mm': (1e-3, 0.0, LENGTH), 'km': (1e3, 0.0, LENGTH),
+    'nm': (1e-9, 0.0, LENGTH), 'meters': (1.0, 0.0, LENGTH), 'metres': (1.0, 0.0, LENGTH),
+    'meter': (1.0, 0.0, LENGTH), 'metre': (1.0, 0.0, LENGTH),
+    's': (1.0, 0.0, TIME), 'ms': (1e-3, 0.0, TIME), 'sec': (1.0, 0.0, TIME), 'seconds': (1.0, 0.0, TIME),
+    'second': (1.0, 0.0, TIME), 'min': (60.0, 0.0, TIME), 'minutes': (60.0, 0.0, TIME),
+    'h': (3600.0, 0.0, TIME), 'hr': (3600.0, 0.0, TIME), 'hours': (3600.0, 0.0, TIME),
+    'm/s': (1.0, 0.0, VELOCITY), 'km/h': (1 / 3.6, 0.0, VELOCITY), 'kmh': (1 / 3.6, 0.0, VELOCITY),
+    'cm/s': (1e-2, 0.0, VELOCITY), 'mph': (0.44704, 0.0, VELOCITY),
+    'm/s^2': (1.0, 0.0, ACCELERATION), 'm/s²': (1.0, 0.0, ACCELERATION), 'm/s2': (1.0, 0.0, ACCELERATION),
+    'N': (1.0, 0.0, FORCE), 'kN': (1e3, 0.0, FORCE), 'newtons': (1.0, 0.0, FORCE),
+    'J': (1.0, 0.0, ENERGY), 'kJ': (1e3, 0.0, ENERGY), 'eV': (1.602176634e-19, 0.0, ENERGY),
+    'joules': (1.0, 0.0, ENERGY), 'cal': (4.184, 0.0, ENERGY), 'kcal': (4184.0, 0.0, ENERGY),
+    'W': (1.0, 0.0, POWER), 'kW': (1e3, 0.0, POWER), 'watts': (1.0, 0.0, POWER),
+    'Pa': (1.0, 0.0, PRESSURE), 'kPa': (1e3, 0.0, PRESSURE), 'atm': (101325.0, 0.0, PRESSURE),
+    'bar': (1e5, 0.0, PRESSURE),
+    'N/m': (1.0, 0.0, SPRING_CONSTANT), 'Hz': (1.0, 0.0, FREQUENCY), 'kHz': (1e3, 0.0, FREQUENCY),
+    'C': (1.0, 0.0, CHARGE), 'mC': (1e-3, 0.0, CHARGE), 'μC': (1e-6, 0.0, CHARGE), 'uC': (1e-6, 0.0, CHARGE),
+    'nC': (1e-9, 0.0, CHARGE), 'coulombs': (1.0, 0.0, CHARGE),
+    'A': (1.0, 0.0, CURRENT), 'mA': (1e-3, 0.0, CURRENT), 'amps': (1.0, 0.0, CURRENT),
+    'V': (1.0, 0.0, VOLTAGE), 'kV': (1e3, 0.0, VOLTAGE), 'volts': (1.0, 0.0, VOLTAGE),
+    'Ω': (1.0, 0.0, RESISTANCE), 'ohm': (1.0, 0.0, RESISTANCE), 'ohms': (1.0, 0.0, RESISTANCE),
+    'kΩ': (1e3, 0.0, RESISTANCE),
+    'K': (1.0, 0.0, TEMPERATURE), 'kelvin': (1.0, 0.0, TEMPERATURE),
+    '°C': (1.0, 273.15, TEMPERATURE), 'degC': (1.0, 273.15, TEMPERATURE),
+    'L': (1e-3, 0.0, VOLUME), 'mL': (1e-6, 0.0, VOLUME), 'liters': (1e-3, 0.0, VOLUME),
+    'litres': (1e-3, 0.0, VOLUME), 'm^3': (1.0, 0.0, VOLUME), 'm³': (1.0, 0.0, VOLUME),
+    'mol': (1.0, 0.0, AMOUNT), 'moles': (1.0, 0.0, AMOUNT),
+    '°': (math.pi / 180, 0.0, ANGLE), 'deg': (math.pi / 180, 0.0, ANGLE), 'degrees': (math.pi / 180, 0.0, ANGLE),
+    'rad': (1.0, 0.0, ANGLE), 'radians': (1.0, 0.0, ANGLE),
+}
+
+NUMBER_PATTERN = r'(?<![\w.])([-+−]?\d+(?:\.\d+)?(?:\s*(?:[x×*]\s*10\s*\^?|[eE])\s*[-+−]?\d+)?)'
+# Longest units first so that 'm/s' wins over 'm' and '°C' over '°'
+UNIT_PATTERN = '|'.join(re.escape(unit) for unit in sorted(UNITS, key=len, reverse=True))
+QUANTITY_PATTERN = NUMBER_PATTERN + r'\s*(' + UNIT_PATTERN + r')(?![A-Za-z0-9²³/^])'
+
+Quantity = namedtuple('Quantity', ['value', 'unit', 'si_value', 'dimension', 'position'])
+
+
+class DimensionError(Exception):
+    """Raised when quantities or formulas combine incompatible dimensions."""
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def parse_number(text):
+    """Convert '1.6 x 10^-19', '3e8' or '−2' into a float"""
+    text = re.sub(r'\s+', '', text).replace('−', '-')
+    return float(re.sub(r'[x×*]10\^?', 'e', text))
+
+
+def to_si(value, unit):
+    """Convert a value (scalar or array) in the given unit to SI, returning (si_value, dimension)"""
+    scale, offset, dim = UNITS[unit]
+    if np.ndim(value):
+        value = np.asarray(value, dtype=float)
+    return value * scale + offset, dim
+
+
+def extract_quantities(text):
+    """
+    Pull every number-with-unit out of the text, normalized to SI.
+
+    Returns:
+        list: Quantity tuples in order of appearance
+    """
+    quantities = []
+    for match in re.finditer(QUANTITY_PATTERN, text):
+        value = parse_number(match.group(1))
+        unit = match.group(2)
+        si_value, dim = to_si(value, unit)
+        quantities.append(Quantity(value, unit, si_value, dim, match.start()))
+    return quantities
+
+
+def format_quantity(quantity):
+    """Write a quantity the way it appeared in the question, e.g. '15 m/s' or '30°'"""
+    separator = '' if quantity.unit == '°' else ' '
+    return f"{quantity.value:g}{separator}{quantity.unit}"
+
+
+def combine(*dimensions, powers=None):
+    """Dimension of a product of quantities raised to the given powers (default 1 each)"""
+    powers = powers or [1] * len(dimensions)
+    return tuple(sum(p * d[i] for d, p in zip(dimensions, powers)) for i in range(len(DIMENSIONLESS)))
+
+
+def require_same(first, second, context):
+    """Raise DimensionError unless two dimensions match"""
+    if first != second:
+        raise DimensionError(
+            f"{context}: {DIMENSION_NAMES.get(first, first)} is not compatible with {DIMENSION_NAMES.get(second, second)}"
+        )
@@ -0,0 +1,223 @@
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_MAX_POINTS = 200
+MAX_STEPS = 100000
+
+# Dormand-Prince 5(4) tableau
+_C = (0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0, 1.0)
+_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+# Difference between the 5th and embedded 4th order weights
+_E = (71 / 57600, 0.0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def _projectile(t, y, p):
+    """Point mass under gravity with quadratic drag: state [x, y, vx, vy]"""
+    vx, vy = y[:, 2], y[:, 3]
+    speed = np.hypot(vx, vy)
+    return np.stack([vx, vy, -p['drag'] * speed * vx, -p['g'] - p['drag'] * speed * vy], axis=1)
+
+
+def _oscillator(t, y, p):
+    """Damped, driven harmonic oscillator per unit mass: state [x, v]"""
+    x, v = y[:, 0], y[:, 1]
+    accel = -2 * p['zeta'] * p['omega0'] * v - p['omega0'] ** 2 * x + p['force'] * np.cos(p['drive_omega'] * t)
+    return np.stack([v, accel], axis=1)
+
+
+def _pendulum(t, y, p):
+    """Nonlinear pendulum with linear damping and optional drive: state [theta, omega]"""
+    theta, omega = y[:, 0], y[:, 1]
+    alpha = -(p['g'] / p['length']) * np.sin(theta) - p['damping'] * omega + p['drive'] * np.cos(p['drive_omega'] * t)
+    return np.stack([omega, alpha], axis=1)
+
+
+# name -> right-hand side, state labels, parameter defaults, index of a coordinate that ends
+# the trajectory when it drops below zero (e.g. hitting the ground), or None
+SYSTEMS = {
+    'projectile': {
+        'rhs': _projectile,
+        'labels': ['x', 'y', 'vx', 'vy'],
+        'defaults': {'g': 9.81, 'drag': 0.0},
+        'ground_index': 1,
+    },
+    'oscillator': {
+        'rhs': _oscillator,
+        'labels': ['x', 'v'],
+        'defaults': {'omega0': 1.0, 'zeta': 0.0, 'force': 0.0, 'drive_omega': 0.0},
+        'ground_index': None,
+    },
+    'pendulum': {
+        'rhs': _pendulum,
+        'labels': ['theta', 'omega'],
+        'defaults': {'g': 9.81, 'length': 1.0, 'damping': 0.0, 'drive': 0.0, 'drive_omega': 0.0},
+        'ground_index': None,
+    },
+}
+
+
+def _hermite(t0, y0, f0, t1, y1, f1, times):
+    """Cubic Hermite interpolation of a step at the given times: returns (len(times), batch, dim)"""
+    h = t1 - t0
+    s = ((times - t0) / h)[:, None, None]
+    h00 = 2 * s ** 3 - 3 * s ** 2 + 1
+    h10 = s ** 3 - 2 * s ** 2 + s
+    h01 = -2 * s ** 3 + 3 * s ** 2
+    h11 = s ** 3 - s ** 2
+    return h00 * y0 + h10 * h * f0 + h01 * y1 + h11 * h * f1
+
+
+def _hermite_rows(step, s):
+    """Cubic Hermite interpolation of each row of a step at its own fraction s in [0, 1]"""
+    y0, dy0, y1, dy1 = step
+    s = s[:, None]
+    return (2 * s ** 3 - 3 * s ** 2 + 1) * y0 + (s ** 3 - 2 * s ** 2 + s) * dy0 + (-2 * s ** 3 + 3 * s ** 2) * y1 + (s ** 3 - s ** 2) * dy1
+
+
+def _crossing(step, index, iterations=40):
+    """Fraction of the step at which coordinate `index` of each row falls through zero, by bisection"""
+    lo = np.zeros(len(step[0]))
+    hi = np.ones(len(step[0]))
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        above = _hermite_rows(step, mid)[:, index] >= 0
+        lo = np.where(above, mid, lo)
+        hi = np.where(above, hi, mid)
+    return 0.5 * (lo + hi)
+
+
+class _Recorder:
+    """Collects the solution on a fixed output grid while the integrator steps"""
+
+    def __init__(self, t_end, y0, max_points):
+        self.times = np.linspace(0.0, t_end, max_points)
+        self.states = np.empty((max_points,) + y0.shape)
+        self.states[0] = y0
+        self.next = 1
+
+    def record(self, t0, y0, f0, t1, y1, f1):
+        end = np.searchsorted(self.times, t1, side='right')
+        if end > self.next:
+            self.states[self.next:end] = _hermite(t0, y0, f0, t1, y1, f1, self.times[self.next:end])
+            self.next = end
+
+    def finish(self, y):
+        # Trajectories that all ended early hold their final state for the rest of the grid
+        self.states[self.next:] = y
+        return self.times, self.states
+
+
+def _rk4_step(rhs, t, y, f, h, p):
+    k2 = rhs(t + h / 2, y + h / 2 * f, p)
+    k3 = rhs(t + h / 2, y + h / 2 * k2, p)
+    k4 = rhs(t + h, y + h * k3, p)
+    return y + h / 6 * (f + 2 * k2 + 2 * k3 + k4)
+
+
+def _dopri_step(rhs, t, y, f, h, p):
+    """One Dormand-Prince step: returns (y_new, f_new, error estimate)"""
+    k = [f]
+    for stage in range(1, 7):
+        y_stage = y + h * sum(a * k_i for a, k_i in zip(_A[stage], k) if a)
+        k.append(rhs(t + _C[stage] * h, y_stage, p))
+    y_new = y + h * sum(a * k_i for a, k_i in zip(_A[6], k) if a)
+    # k[6] was evaluated at y_new, so it is the derivative for the next step (FSAL)
+    error = h * sum(e * k_i for e, k_i in zip(_E, k) if e)
+    return y_new, k[6], error
+
+
+def simulate(system, initial_state, t_end, params=None, method='rk45', dt=None, rtol=1e-6, atol=1e-9, max_points=DEFAULT_MAX_POINTS):
+    """
+    Integrate a batch of trajectories of one system as a single array computation.
+
+    Args:
+        system (str): Key of SYSTEMS ('projectile', 'oscillator', 'pendulum')
+        initial_state (array-like): (batch, dim) initial conditions, or a single (dim,) state
+        t_end (float): Final time in seconds
+        params (dict): Parameter values, each a scalar or a (batch,) array for sweeps
+        method (str): 'rk45' for adaptive Dormand-Prince or 'rk4' for fixed steps of size dt
+        dt (float): Step size for 'rk4' (default t_end / 1000)
+        rtol, atol (float): Tolerances for 'rk45'; the step is shared and sized by the worst trajectory
+        max_points (int): Number of output samples per trajectory
+
+    Returns:
+        dict: 'times' (max_points,), 'states' (batch, max_points, dim), 'labels', and for
+        systems with a ground coordinate, 'end_times' and 'end_states' where each trajectory stopped
+    """
+    spec = SYSTEMS[system]
+    rhs = spec['rhs']
+    y = np.atleast_2d(np.asarray(initial_state, dtype=float)).copy()
+    batch = y.shape[0]
+    p = dict(spec['defaults'])
+    p.update(params or {})
+    p = {name: np.broadcast_to(np.asarray(value, dtype=float), (batch,)) for name, value in p.items()}
+
+    ground = spec['ground_index']
+    active = np.ones(batch, dtype=bool)
+    t_end = float(t_end)
+    end_times = np.full(batch, t_end)
+    end_states = np.full_like(y, np.nan)
+
+    def masked_rhs(t, state, params):
+        # Trajectories that have stopped stay frozen in place
+        return rhs(t, state, params) * active[:, None]
+
+    recorder = _Recorder(t_end, y, max_points)
+    t = 0.0
+    f = masked_rhs(t, y, p)
+    h = (dt or t_end / 1000) if method == 'rk4' else t_end / 100
+
+    for _ in range(MAX_STEPS):
+        if t >= t_end or not active.any():
+            break
+        h = min(h, t_end - t)
+
+        if method == 'rk4':
+            y_new = _rk4_step(masked_rhs, t, y, f, h, p)
+        else:
+            y_new, f_new, error = _dopri_step(masked_rhs, t, y, f, h, p)
+            scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+            norm = np.max(np.sqrt(np.mean((error / scale) ** 2, axis=1)))
+            factor = 0.9 * norm ** -0.2 if norm > 0 else 5.0
+            if norm > 1.0:
+                h *= max(0.2, factor)
+                continue
+
+        f_next = masked_rhs(t + h, y_new, p) if method == 'rk4' else f_new
+        if ground is not None:
+            landed = active & (y_new[:, ground] < 0)
+            if landed.any():
+                step = (y[landed], f[landed] * h, y_new[landed], f_next[landed] * h)
+                fraction = _crossing(step, ground)
+                end_times[landed] = t + fraction * h
+                end_states[landed] = _hermite_rows(step, fraction)
+                y_new[landed] = end_states[landed]
+                f_next[landed] = 0.0
+                active &= ~landed
+
+        recorder.record(t, y, f, t + h, y_new, f_next)
+        t, y, f = t + h, y_new, f_next
+        if method != 'rk4':
+            h *= min(5.0, factor)
+
+    times, states = recorder.finish(y)
+    end_states[active] = y[active]
+    result = {
+        'system': system,
+        'labels': spec['labels'],
+        'times': times,
+        'states': np.transpose(states, (1, 0, 2)),
+    }
+    if ground is not None:
+        result['end_times'] = end_times
+        result['end_states'] = end_states
+    return result
@@ -0,0 +1,145 @@
+import hashlib
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from lazy_imports import lazy_import
+
+sp = lazy_import('sympy')
+
+# Symbolic operations the cache knows how to run, keyed by the name used in cache keys
+OPERATIONS = {
+    'solve': lambda expr, *args: sp.solve(expr, *args),
+    'diff': lambda expr, *args: sp.diff(expr, *args),
+    'integrate': lambda expr, *args: sp.integrate(expr, *args),
+    'limit': lambda expr, *args: sp.limit(expr, *args),
+}
+
+
+def canonical_key(operation, expr, *args):
+    """
+    Build a cache key from the canonical form of a parsed expression plus the operation and its arguments.
+
+    SymPy orders the arguments of Add and Mul on construction, so ``x**2 + 2*x`` and
+    ``2*x + x**2`` share the same ``srepr`` and therefore the same key.
+    """
+    parts = [operation, sp.srepr(expr)] + [sp.srepr(arg) for arg in args]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class SymbolicCache:
+    """
+    Bounded LRU cache for SymPy parsing and symbolic results, with an optional SQLite tier on disk.
+
+    The in-memory tier holds at most ``maxsize`` results and evicts the least recently used one.
+    When ``path`` is given, every computed result is also written to a SQLite file so it survives
+    restarts; a memory miss consults the file before computing. ``runner`` replaces the in-process
+    call on a miss, e.g. ``SymbolicWorkerPool.run`` to compute under a deadline.
+    """
+
+    def __init__(self, maxsize=1024, path=None, runner=None):
+        self.maxsize = maxsize
+        self.runner = runner
+        self._results = OrderedDict()
+        self._parsed = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'parse_hits': 0, 'parse_misses': 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB)")
+            self._db.commit()
+
+    def parse(self, text):
+        """Memoized ``parse_expr`` keyed on the stripped input string"""
+        text = text.strip()
+        with self._lock:
+            if text in self._parsed:
+                self._parsed.move_to_end(text)
+                self._stats['parse_hits'] += 1
+                return self._parsed[text]
+            self._stats['parse_misses'] += 1
+
+        expr = sp.parse_expr(text)
+        with self._lock:
+            self._remember(self._parsed, text, expr)
+        return expr
+
+    def compute(self, operation, expr, *args):
+        """
+        Return ``OPERATIONS[operation](expr, *args)``, computing it only on a cache miss.
+
+        Args:
+            operation (str): One of 'solve', 'diff', 'integrate', 'limit'
+            expr: Parsed SymPy expression or equation
+            *args: Extra positional arguments for the operation (variable, limit point, ...)
+
+        Returns:
+            The SymPy result of the operation
+        """
+        key = canonical_key(operation, expr, *args)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._results[key]
+
+        stored = self._load(key)
+        if stored is not None:
+            with self._lock:
+                self._stats['disk_hits'] += 1
+                self._remember(self._results, key, stored)
+            return stored
+
+        if self.runner is not None:
+            result = self.runner(operation, expr, *args)
+        else:
+            result = OPERATIONS[operation](expr, *args)
+        with self._lock:
+            self._stats['misses'] += 1
+            self._remember(self._results, key, result)
+        self._store(key, result)
+        return result
+
+    def stats(self):
+        """Hit and miss counters plus the overall hit rate across both tiers"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._results)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drop the in-memory tier; the disk tier is left untouched"""
+        with self._lock:
+            self._results.clear()
+            self._parsed.clear()
+
+    def _remember(self, table, key, value):
+        """Insert into an LRU table, evicting the oldest entry when full. Caller holds the lock."""
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.maxsize:
+            table.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _load(self, key):
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _store(self, key, value):
+        if self._db is None:
+            return
+        try:
+            blob = pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return  # Unpicklable results simply stay memory-only
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)", (key, blob))
+            self._db.commit()
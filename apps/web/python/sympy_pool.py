@@ -0,0 +1,210 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+from lazy_imports import lazy_import
+from sympy_cache import OPERATIONS
+
+sp = lazy_import('sympy')
+
+
+class SymbolicTimeout(Exception):
+    """Raised when a symbolic operation runs past its wall-clock deadline."""
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class PoolSaturated(Exception):
+    """Raised when the pool's wait queue is already at its maximum depth."""
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class SymbolicWorkerError(Exception):
+    """Raised when a symbolic operation fails inside a worker process."""
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def _worker_main(conn):
+    """Worker loop: warm SymPy once, then run (operation, expr, args) tasks until told to stop."""
+    x = sp.Symbol('x')
+    sp.integrate(sp.sin(x) * x, x)  # Pull in the integration and simplification machinery up front
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+
+        operation, expr, args = task
+        try:
+            reply = ('ok', OPERATIONS[operation](expr, *args))
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}")
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send(('error', f"Result could not be returned from the worker: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, target):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=target, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.busy_seconds = 0.0
+
+    def stop(self, timeout=1.0):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SymbolicWorkerPool:
+    """
+    Pool of warm worker processes that run SymPy operations under a hard wall-clock deadline.
+
+    A call that overruns its deadline has its worker killed and replaced, and the caller gets a
+    SymbolicTimeout instead of blocking. Callers waiting for a free worker are limited to
+    ``max_queue``; beyond that, PoolSaturated is raised immediately.
+    """
+
+    # Function each worker process runs; subclasses serve other kinds of task
+    worker_target = staticmethod(_worker_main)
+
+    def __init__(self, workers=2, deadline=10.0, max_queue=32):
+        self.deadline = deadline
+        self.max_queue = max_queue
+        self._context = multiprocessing.get_context()
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._waiting = 0
+        self._started = time.monotonic()
+        self._stats = {'completed': 0, 'errors': 0, 'timeouts': 0, 'recycled': 0, 'rejected': 0}
+        self._retired_busy_seconds = 0.0
+
+        for _ in range(workers):
+            worker = _Worker(self._context, self.worker_target)
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def run(self, operation, expr, *args, deadline=None):
+        """
+        Run ``OPERATIONS[operation](expr, *args)`` in a worker process.
+
+        Args:
+            operation (str): One of 'solve', 'diff', 'integrate', 'limit'
+            expr: Parsed SymPy expression or equation
+            *args: Extra positional arguments for the operation
+            deadline (float): Seconds allowed, including time spent waiting for a worker
+
+        Returns:
+            The SymPy result of the operation
+        """
+        return self._call((operation, expr, args), operation, deadline)
+
+    def _call(self, task, label, deadline=None):
+        """Send one task to a free worker and wait for its reply under the deadline"""
+        deadline = self.deadline if deadline is None else deadline
+        started = time.monotonic()
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise PoolSaturated(f"Symbolic worker queue is full ({self.max_queue} waiting)")
+            self._waiting += 1
+        try:
+            worker = self._idle.get(timeout=deadline)
+        except queue.Empty:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise SymbolicTimeout(f"No symbolic worker became free within {deadline:g}s")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        remaining = max(deadline - (time.monotonic() - started), 0.0)
+        run_started = time.monotonic()
+        stuck = False
+        try:
+            worker.conn.send(task)
+            if not worker.conn.poll(remaining):
+                stuck = True
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise SymbolicTimeout(f"{label} did not finish within {deadline:g}s")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            stuck = True
+            with self._lock:
+                self._stats['errors'] += 1
+            raise SymbolicWorkerError(f"Symbolic worker died while running {label}: {e}") from e
+        finally:
+            # Credited before recycling, so the time counts for the worker that spent it
+            worker.busy_seconds += time.monotonic() - run_started
+            if stuck:
+                self._replace(worker)
+            else:
+                self._idle.put(worker)
+
+        with self._lock:
+            self._stats['completed' if status == 'ok' else 'errors'] += 1
+        if status != 'ok':
+            raise SymbolicWorkerError(payload)
+        return payload
+
+    def stats(self):
+        """Counters plus the current and lifetime utilization of the workers"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['waiting'] = self._waiting
+            busy_seconds = self._retired_busy_seconds + sum(w.busy_seconds for w in self._workers)
+        stats['workers'] = len(self._workers)
+        stats['busy'] = len(self._workers) - self._idle.qsize()
+        elapsed = time.monotonic() - self._started
+        stats['utilization'] = busy_seconds / (elapsed * len(self._workers)) if elapsed and self._workers else 0.0
+        return stats
+
+    def shutdown(self):
+        """Stop every worker process"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _replace(self, worker):
+        """Recycle a stuck or dead worker and make its replacement available"""
+        self._idle.put(self._recycle(worker))
+
+    def _recycle(self, worker):
+        """Kill a stuck or dead worker and return a fresh one in its place"""
+        worker.kill()
+        replacement = _Worker(self._context, self.worker_target)
+        with self._lock:
+            self._retired_busy_seconds += worker.busy_seconds
+            self._workers[self._workers.index(worker)] = replacement
+            self._stats['recycled'] += 1
+        return replacement